@@ -22,48 +22,148 @@ def gen_cnot_pairs(code: BBCode):
         z_cnot_pairs.append(z_pair_k)
     return x_cnot_pairs, z_cnot_pairs
 
-def gen_circ(code: BBCode, sround, seed=0):
 
-    # 1. generate a sequence of X(0)/Z(1) and polynomial term
+# the X stabilizer CNOTs term by term, then the Z stabilizer CNOTs, one term per layer
+SERIAL_SCHEDULE = [[(i, j)] for i in [0, 1] for j in range(6)]
+
+
+def append_gate(circuit: stim.Circuit, name, targets):
+    """
+    Append a gate acting on many qubits.
+
+    Circuit.append converts the targets one by one, parsing a single line of circuit text is much
+    faster for the long target lists of large codes (consecutive identical gates are fused either way).
+    """
+    if len(targets) == 0:
+        circuit.append(name, targets)
+        return
+    circuit += stim.Circuit(f"{name} " + " ".join(str(int(q)) for q in targets))
+
+
+def append_qubit_coords(circuit: stim.Circuit, code: BBCode):
+    """
+    Annotate the coordinates of all qubits of the 2*code.l x 2*code.m lattice.
+    """
+    lines = [f"QUBIT_COORDS({i}, {j}) {code.qubit_label(i, j)}" for i in range(2*code.l) for j in range(2*code.m)]
+    circuit += stim.Circuit("\n".join(lines))
+
+
+def round_records(code: BBCode, offsets):
+    """
+    Record offsets of the detectors of one round of n/2 ancillas: detector i compares the records offsets[j] + i.
+
+    Returns:
+        np.ndarray: Array of shape (n/2, len(offsets))
+    """
+    return np.arange(code.n // 2)[:, None] + np.asarray(offsets, dtype=np.int64)[None, :]
+
+
+def append_detectors(circuit: stim.Circuit, code: BBCode, ancilla_labels, records, t=0):
+    """
+    Append one DETECTOR per ancilla, located at the ancilla with time coordinate t.
+
+    The detectors are built as one block of circuit text instead of one append call per detector.
+
+    Args:
+        circuit (stim.Circuit): Circuit to append to
+        code (BBCode): The code
+        ancilla_labels (list): Qubit label of the ancilla of every detector
+        records (np.ndarray): records[i] are the (negative) measurement record offsets of detector i
+        t (int): Time coordinate of the detectors
+    """
+    lines = [
+        f"DETECTOR({a//int(code.l*2)}, {a%int(code.l*2)}, {t}) " + " ".join(f"rec[{int(r)}]" for r in row)
+        for a, row in zip(ancilla_labels, records)
+    ]
+    circuit += stim.Circuit("\n".join(lines))
+
+
+def final_z_detector_records(code: BBCode):
+    """
+    Precompute the measurement record offsets of the final Z detectors.
+
+    After the last MR of the Z ancillas and the final M of the data qubits, the record of Z ancilla
+    i is at offset -3n/2 + i and the record of a data qubit is at its position in
+    code.data_qubits_set minus n (data qubits come first in code.qubit_index).
+
+    Returns:
+        tuple: (ancilla_records, data_records), arrays of shape (n/2,) and (n/2, 6)
+    """
+    n_half = code.n // 2
+    ancilla_records = np.arange(n_half) - 3 * n_half
+    data_records = code.qubit_index[code.z_stabilizer_table].astype(np.int64) - code.n
+    return ancilla_records, data_records
+
+
+def append_final_z_detectors(circuit: stim.Circuit, code: BBCode):
+    """
+    Append the detectors comparing the last Z stabilizer measurements with the final data qubit measurements.
+    """
+    ancilla_records, data_records = final_z_detector_records(code)
+    append_detectors(circuit, code, code.z_ancilla_labels, np.hstack((ancilla_records[:, None], data_records)), t=1)
+
+
+def append_z_observables(circuit: stim.Circuit, code: BBCode):
+    """
+    Append one OBSERVABLE_INCLUDE per logical Z operator of get_logical_ops_css, measured on the final data qubit records.
+    """
+    logical_ops = get_logical_ops_css(code.qcode.lz, code.k, code.m, code.n)
+    lines = []
+    for i in range(code.k):
+        records = code.qubit_index[logical_ops[i]].astype(np.int64) - code.n
+        lines.append(f"OBSERVABLE_INCLUDE({i}) " + " ".join(f"rec[{int(r)}]" for r in records))
+    circuit += stim.Circuit("\n".join(lines))
+
+def gen_circ(code: BBCode, sround, seed=0, schedule=None):
+    """
+    Generate the circuit of sround syndrome rounds of the code.
+
+    Args:
+        code (BBCode): The code
+        sround (int): Number of syndrome rounds
+        seed (int): Seed of the global numpy generator
+        schedule (list): CNOT layers, a layer is a list of terms (i, j) for the j-th CNOT of the X (i=0)
+            or Z (i=1) stabilizers (default: SERIAL_SCHEDULE, see circ_gen.cnot_scheduler for interleaved ones)
+    """
+
+    # 1. the CNOT layers, each a list of X(0)/Z(1) and polynomial terms
     np.random.seed(seed)
-    seq = [(i,j) for i in [0, 1] for j in range(6)]
-    # np.random.shuffle(seq)
+    if schedule is None:
+        schedule = SERIAL_SCHEDULE
     circuit = stim.Circuit()
 
     # annotate qubit coordinates
-    for i in range(2*code.l):
-        for j in range(2*code.m):
-            circuit.append("QUBIT_COORDS", code.qubit_label(i, j), [i, j])
+    append_qubit_coords(circuit, code)
 
     circuit.append("TICK")
 
     #reset data qubits
-    circuit.append("R", code.data_qubits_set)
+    append_gate(circuit, "R", code.data_qubits_set)
 
     circuit.append("TICK")
     
     # reset ancilla qubits
-    circuit.append("RX", code.x_ancilla_labels)
-    circuit.append("R", code.z_ancilla_labels)
+    append_gate(circuit, "RX", code.x_ancilla_labels)
+    append_gate(circuit, "R", code.z_ancilla_labels)
 
     circuit.append("TICK")
 
     x_cnot_pairs, z_cnot_pairs = gen_cnot_pairs(code)
 
-    for i, j in seq:
-        if i == 0:
-            circuit.append("CNOT", x_cnot_pairs[j])
-        else:
-            circuit.append("CNOT", z_cnot_pairs[j])
-        
+    for layer in schedule:
+        for i, j in layer:
+            if i == 0:
+                append_gate(circuit, "CNOT", x_cnot_pairs[j])
+            else:
+                append_gate(circuit, "CNOT", z_cnot_pairs[j])
+
         circuit.append("TICK")
 
     # measure
-    circuit.append("MRX", code.x_ancilla_labels)
-    circuit.append("MR", code.z_ancilla_labels)
+    append_gate(circuit, "MRX", code.x_ancilla_labels)
+    append_gate(circuit, "MR", code.z_ancilla_labels)
 
-    for i in range(int(code.n/2)):
-        circuit.append("DETECTOR", stim.target_rec(-int(code.n/2)+i), [code.z_ancilla_labels[i]//int(code.l*2),code.z_ancilla_labels[i]%int(code.l*2), 0])
+    append_detectors(circuit, code, code.z_ancilla_labels, round_records(code, [-int(code.n/2)]))
     
 
     circuit.append("TICK")
@@ -71,24 +171,23 @@ def gen_circ(code: BBCode, sround, seed=0):
     # define loop body circuit
     loop_body_circuit = stim.Circuit()
         
-    for i, j in seq:
-        if i == 0:
-            loop_body_circuit.append("CNOT", x_cnot_pairs[j])
-        else:
-            loop_body_circuit.append("CNOT", z_cnot_pairs[j])
-        
+    for layer in schedule:
+        for i, j in layer:
+            if i == 0:
+                append_gate(loop_body_circuit, "CNOT", x_cnot_pairs[j])
+            else:
+                append_gate(loop_body_circuit, "CNOT", z_cnot_pairs[j])
+
         loop_body_circuit.append("TICK")
 
     loop_body_circuit.append("SHIFT_COORDS", [], [0,0,1])
     # measure and reset stabilizers
-    loop_body_circuit.append("MRX", code.x_ancilla_labels)
-    for i in range(int(code.n/2)):
-        loop_body_circuit.append("DETECTOR", [stim.target_rec(-int(code.n/2)+i), stim.target_rec(-int(code.n+code.n/2)+i)], [code.x_ancilla_labels[i]//int(code.l*2),code.x_ancilla_labels[i]%int(code.l*2), 0])
+    append_gate(loop_body_circuit, "MRX", code.x_ancilla_labels)
+    append_detectors(loop_body_circuit, code, code.x_ancilla_labels, round_records(code, [-int(code.n/2), -int(code.n+code.n/2)]))
 
 
-    loop_body_circuit.append("MR", code.z_ancilla_labels)
-    for i in range(int(code.n/2)):
-        loop_body_circuit.append("DETECTOR", [stim.target_rec(-int(code.n/2)+i), stim.target_rec(-int(code.n+code.n/2)+i)], [code.z_ancilla_labels[i]//int(code.l*2),code.z_ancilla_labels[i]%int(code.l*2), 0])
+    append_gate(loop_body_circuit, "MR", code.z_ancilla_labels)
+    append_detectors(loop_body_circuit, code, code.z_ancilla_labels, round_records(code, [-int(code.n/2), -int(code.n+code.n/2)]))
     loop_body_circuit.append("TICK")
 
     
@@ -98,20 +197,14 @@ def gen_circ(code: BBCode, sround, seed=0):
     repeat_count=sround))
 
     # final measurements and detector setting
-    circuit.append("M", code.data_qubits_set)
+    append_gate(circuit, "M", code.data_qubits_set)
 
-    for i in code.z_ancilla_labels:
-        ii = code.z_ancilla_labels.index(i)
-        data_qubits_stb = [value for (key1, key2), value in code.z_stabilizers.items() if key1 == i]
-        circuit.append("DETECTOR", [stim.target_rec(-int(code.n*3/2)+ii), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[0])), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[1])), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[2])), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[3])), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[4])), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[5]))], [code.z_ancilla_labels[ii]//int(code.l*2),code.z_ancilla_labels[ii]%int(code.l*2), 1])
+    append_final_z_detectors(circuit, code)
 
 
 
     # adding observable measurement to the circuit
-    for i in range(code.k):
-        logical_ops = get_logical_ops_css(code.qcode.lz, code.k, code.m, code.n)
-        circuit.append("OBSERVABLE_INCLUDE", [stim.target_rec(code.data_qubits_set.index(idx)-code.n) for idx in logical_ops[i]], [i])
-        # print("z_random_logical: ", code.z_random_logical)
+    append_z_observables(circuit, code)
     # circuit.append("OBSERVABLE_INCLUDE", [stim.target_rec(code.data_qubits_set.index(idx)-code.n) for idx in code.z_random_logical], [0])
 
 
@@ -119,48 +212,56 @@ def gen_circ(code: BBCode, sround, seed=0):
 
 
 
-def gen_circ_only_z_detectors(code: BBCode, sround, seed=0):
+def gen_circ_only_z_detectors(code: BBCode, sround, seed=0, schedule=None):
+    """
+    Generate the circuit of sround syndrome rounds of the code with Z detectors only.
+
+    Args:
+        code (BBCode): The code
+        sround (int): Number of syndrome rounds
+        seed (int): Seed of the global numpy generator
+        schedule (list): CNOT layers, a layer is a list of terms (i, j) for the j-th CNOT of the X (i=0)
+            or Z (i=1) stabilizers (default: SERIAL_SCHEDULE, see circ_gen.cnot_scheduler for interleaved ones)
+    """
 
-    # 1. generate a sequence of X(0)/Z(1) and polynomial term
+    # 1. the CNOT layers, each a list of X(0)/Z(1) and polynomial terms
     np.random.seed(seed)
-    seq = [(i,j) for i in [0, 1] for j in range(6)]
-    # np.random.shuffle(seq)
+    if schedule is None:
+        schedule = SERIAL_SCHEDULE
     circuit = stim.Circuit()
 
     # annotate qubit coordinates
-    for i in range(2*code.l):
-        for j in range(2*code.m):
-            circuit.append("QUBIT_COORDS", code.qubit_label(i, j), [i, j])
+    append_qubit_coords(circuit, code)
 
     circuit.append("TICK")
 
     #reset data qubits
-    circuit.append("R", code.data_qubits_set)
+    append_gate(circuit, "R", code.data_qubits_set)
 
     circuit.append("TICK")
     
     # reset ancilla qubits
-    circuit.append("RX", code.x_ancilla_labels)
-    circuit.append("R", code.z_ancilla_labels)
+    append_gate(circuit, "RX", code.x_ancilla_labels)
+    append_gate(circuit, "R", code.z_ancilla_labels)
 
     circuit.append("TICK")
 
     x_cnot_pairs, z_cnot_pairs = gen_cnot_pairs(code)
 
-    for i, j in seq:
-        if i == 0:
-            circuit.append("CNOT", x_cnot_pairs[j])
-        else:
-            circuit.append("CNOT", z_cnot_pairs[j])
-        
+    for layer in schedule:
+        for i, j in layer:
+            if i == 0:
+                append_gate(circuit, "CNOT", x_cnot_pairs[j])
+            else:
+                append_gate(circuit, "CNOT", z_cnot_pairs[j])
+
         circuit.append("TICK")
 
     # measure
-    circuit.append("MRX", code.x_ancilla_labels)
-    circuit.append("MR", code.z_ancilla_labels)
+    append_gate(circuit, "MRX", code.x_ancilla_labels)
+    append_gate(circuit, "MR", code.z_ancilla_labels)
 
-    for i in range(int(code.n/2)):
-        circuit.append("DETECTOR", stim.target_rec(-int(code.n/2)+i), [code.z_ancilla_labels[i]//int(code.l*2),code.z_ancilla_labels[i]%int(code.l*2), 0])
+    append_detectors(circuit, code, code.z_ancilla_labels, round_records(code, [-int(code.n/2)]))
     
 
     circuit.append("TICK")
@@ -168,22 +269,22 @@ def gen_circ_only_z_detectors(code: BBCode, sround, seed=0):
     # define loop body circuit
     loop_body_circuit = stim.Circuit()
         
-    for i, j in seq:
-        if i == 0:
-            loop_body_circuit.append("CNOT", x_cnot_pairs[j])
-        else:
-            loop_body_circuit.append("CNOT", z_cnot_pairs[j])
-        
+    for layer in schedule:
+        for i, j in layer:
+            if i == 0:
+                append_gate(loop_body_circuit, "CNOT", x_cnot_pairs[j])
+            else:
+                append_gate(loop_body_circuit, "CNOT", z_cnot_pairs[j])
+
         loop_body_circuit.append("TICK")
 
     loop_body_circuit.append("SHIFT_COORDS", [], [0,0,1])
     # measure and reset stabilizers
-    loop_body_circuit.append("MRX", code.x_ancilla_labels)
+    append_gate(loop_body_circuit, "MRX", code.x_ancilla_labels)
 
 
-    loop_body_circuit.append("MR", code.z_ancilla_labels)
-    for i in range(int(code.n/2)):
-        loop_body_circuit.append("DETECTOR", [stim.target_rec(-int(code.n/2)+i), stim.target_rec(-int(code.n+code.n/2)+i)], [code.z_ancilla_labels[i]//int(code.l*2),code.z_ancilla_labels[i]%int(code.l*2), 0])
+    append_gate(loop_body_circuit, "MR", code.z_ancilla_labels)
+    append_detectors(loop_body_circuit, code, code.z_ancilla_labels, round_records(code, [-int(code.n/2), -int(code.n+code.n/2)]))
     loop_body_circuit.append("TICK")
 
     
@@ -193,20 +294,14 @@ def gen_circ_only_z_detectors(code: BBCode, sround, seed=0):
     repeat_count=sround))
 
     # final measurements and detector setting
-    circuit.append("M", code.data_qubits_set)
+    append_gate(circuit, "M", code.data_qubits_set)
 
-    for i in code.z_ancilla_labels:
-        ii = code.z_ancilla_labels.index(i)
-        data_qubits_stb = [value for (key1, key2), value in code.z_stabilizers.items() if key1 == i]
-        circuit.append("DETECTOR", [stim.target_rec(-int(code.n*3/2)+ii), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[0])), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[1])), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[2])), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[3])), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[4])), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[5]))], [code.z_ancilla_labels[ii]//int(code.l*2),code.z_ancilla_labels[ii]%int(code.l*2), 1])
+    append_final_z_detectors(circuit, code)
 
 
 
     # adding observable measurement to the circuit
-    for i in range(code.k):
-        logical_ops = get_logical_ops_css(code.qcode.lz, code.k, code.m, code.n)
-        circuit.append("OBSERVABLE_INCLUDE", [stim.target_rec(code.data_qubits_set.index(idx)-code.n) for idx in logical_ops[i]], [i])
-        # print("z_random_logical: ", code.z_random_logical)
+    append_z_observables(circuit, code)
 
 
     return circuit
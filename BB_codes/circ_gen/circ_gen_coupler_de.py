@@ -1,9 +1,10 @@
 import numpy as np
 from src.bb_code import BBCode
 import stim
-from src.bb_code_parameters import get_logical_ops_css, transform_dictionary
-from src.coupler_dropout_methods import apply_z_coupler_dropout, apply_x_coupler_dropout, apply_z_coupler_dropout_fixed
+from src.bb_code_parameters import transform_dictionary
+from src.coupler_dropout_methods import apply_z_coupler_dropout, apply_x_coupler_dropout, apply_z_coupler_dropout_fixed, coupler_dropout_flag_arrays
 from src.coupler_dropout_methods_50per import apply_x_coupler_dropout_fixed_50per, apply_z_coupler_dropout_fixed_50per
+from circ_gen.circ_gen import append_gate, append_qubit_coords, append_detectors, round_records, append_final_z_detectors, append_z_observables
 
 def gen_fixed_coupler_defect_50per(code: BBCode):
     """
@@ -63,7 +64,7 @@ def gen_fixed_coupler_defect(code: BBCode):
     return z_stb_with_def, x_stb_with_def
 
 
-def gen_random_coupler_defect(code: BBCode, error_rate):
+def gen_random_coupler_defect(code: BBCode, error_rate, rng=None):
     """
     Generate a random coupler defect on the code stabilizers based on the error rate.
 
@@ -75,447 +76,251 @@ def gen_random_coupler_defect(code: BBCode, error_rate):
         Input stabilizers: {(12): [0, 13, 24, 23, 93, 198], (14): [2, 15, 26, 13, 95, 200]}, error_rate=0.5
         Output might be: {(12,-1): [0, 13, 24, 23, 93, 198], (14,-2): [2, 15, 26, 13, 95, 200]}
         (element 198 was removed from first stabilizer and 95 from second, note that we only record the coupler that broken, like in the case (12,-1): [0, 13, 24, 23, 93, 198], the coupler that connect 12 to 198 is broken. and in the case (14,-2): [2, 15, 26, 13, 95, 200], the coupler that connect 14 to 95 is broken.)
+
+    The random numbers are drawn from rng (np.random.Generator or RandomState), by default from the
+    module-global generator of src.coupler_dropout_methods.
     """
     # generate a random coupler defect on the code
     # the coupler defect is a random pair of x and z stabilizers
     # the coupler defect is a random pair of x and z stabilizers
     trasfered_x_stabilizers = transform_dictionary(code.x_stabilizers)
     trasfered_z_stabilizers = transform_dictionary(code.z_stabilizers)
-    z_stb_with_def, z_keys_with_defect = apply_z_coupler_dropout(trasfered_z_stabilizers, error_rate)
-    x_stb_with_def, x_keys_with_defect = apply_x_coupler_dropout(trasfered_x_stabilizers, z_keys_with_defect, code.x_ancilla_labels, code.corresponding_z_ancillas, error_rate)
+    z_stb_with_def, z_keys_with_defect = apply_z_coupler_dropout(trasfered_z_stabilizers, error_rate, rng)
+    x_stb_with_def, x_keys_with_defect = apply_x_coupler_dropout(trasfered_x_stabilizers, z_keys_with_defect, code.x_ancilla_labels, code.corresponding_z_ancillas, error_rate, rng)
 
     return z_stb_with_def, x_stb_with_def
 
-def gen_cnot_pairs_with_defect(code: BBCode, z_stb_with_de, x_stb_with_de):
-    """
-    Construct a list of cnot pairs between ancilla qubits and data qubits
-    the short range cnot gates are labeled as 0,1,2,3, with relative position [[-1,0], [0,1], [1,0], [0,-1]], so qubits in the same row in the 2d layout can be labeled by even (0,2, [-1,0] and [1,0]) or odd (1,3, [0,1] and [0,-1]). The long range couplers for z ancilla has relative position [-c1,-d1] and [-a1,-b1], we have the convention that [-c1,-d1] is even and [-a1,-b1] is odd for z stabilizer setup, while [-c1,-d1] is odd and [-a1,-b1] is even for x stabilizer setup.
 
-    We label the long range couplers as even and odd to make sure that we can arrange those cnot gates in the process of applying short range cnot gates. for example, each z stabilizer has two long range couplers, we label them as even and odd, and we can apply the short range cnot gates in the order of [0,1,2,3], then the long range cnot can be coupled as [0,1+even,2+odd,3] (+ means apply the two cnot gates in parallel).
+# CNOT schedules for stabilizers with a broken long range coupler.
+#
+# Every stabilizer carries a dropout flag b: 0 if all couplers work, -1 if the coupler to its last
+# data qubit elements[5] is broken and -2 if the coupler to elements[4] is broken. A broken coupler
+# is bridged through the corresponding ancilla of the other type (code.corresponding_x_ancillas for
+# Z stabilizers, code.corresponding_z_ancillas for X stabilizers, or their _50per variants).
+#
+# A schedule is a list of CNOT layers, a layer is a list of terms (flags, control, target): for
+# every stabilizer whose flag is in flags, the CNOT control -> target is applied, where control and
+# target are "a" (the ancilla itself), "p" (its corresponding ancilla) or k (the data qubit
+# elements[k]). Within a layer the CNOTs are ordered by stabilizer, then by term.
+ALL_FLAGS = (0, -1, -2)
+
+DEFECT_Z_SCHEDULE = [
+    [(ALL_FLAGS, 0, "a")],
+    [(ALL_FLAGS, 1, "a"), ((-2,), 4, "p")],
+    [(ALL_FLAGS, 2, "a"), ((-1,), 5, "p")],
+    [(ALL_FLAGS, 3, "a")],
+    [((0,), 4, "a")],
+    [((0,), 5, "a")],
+    [((-1,), "p", 4), ((-2,), "p", 5)],
+    [((-1,), 4, "a"), ((-2,), 5, "a")],
+    [((-1,), "p", 4), ((-2,), "p", 5)],
+    [((-1,), 5, "p"), ((-2,), 4, "p")],
+]
+
+DEFECT_X_SCHEDULE = [
+    [(ALL_FLAGS, "a", 0)],
+    [(ALL_FLAGS, "a", 1), ((-1,), "p", 5)],
+    [(ALL_FLAGS, "a", 2), ((-2,), "p", 4)],
+    [(ALL_FLAGS, "a", 3)],
+    [((0,), "a", 4)],
+    [((0,), "a", 5)],
+    [((-1,), 4, "p"), ((-2,), 5, "p")],
+    [((-1,), "a", 4), ((-2,), "a", 5)],
+    [((-1,), 4, "p"), ((-2,), 5, "p")],
+    [((-1,), "p", 5), ((-2,), "p", 4)],
+]
+
+Z_SCHEDULE_75PER = [
+    [(ALL_FLAGS, 0, "a")],
+    [((-2,), 1, "a"), ((-2,), 4, "p")],
+    [(ALL_FLAGS, 2, "a")],
+    [(ALL_FLAGS, 3, "a")],
+    [((-2,), "p", 5)],
+    [((-2,), 5, "a")],
+    [((-2,), "p", 5)],
+    [((-2,), 4, "p")],
+]
+
+X_SCHEDULE_75PER = [[(ALL_FLAGS, "a", k)] for k in range(6)]
+
+Z_SCHEDULE_50PER = [
+    [(ALL_FLAGS, 0, "a")],
+    [((-2,), 1, "a"), ((-2,), 4, "p")],
+    [((-2,), 2, "a")],
+    [((-2,), 3, "a")],
+    [((-2,), "p", 5)],
+    [((-2,), 5, "a")],
+    [((-2,), "p", 5)],
+    [((-2,), 4, "p")],
+]
+
+X_SCHEDULE_50PER = [
+    [(ALL_FLAGS, "a", 0)],
+    [((-2,), "a", 1)],
+    [((-2,), "a", 2), ((-2,), "p", 4)],
+    [((-2,), "a", 3)],
+    [((-2,), 5, "p")],
+    [((-2,), "a", 5)],
+    [((-2,), 5, "p")],
+    [((-2,), "p", 4)],
+]
+
+
+def coupler_dropout_flags(code: BBCode, z_stb_with_de, x_stb_with_de):
     """
+    Get the dropout flags of the stabilizers with defect as arrays.
 
-    x_cnot_pairs = []
-    z_cnot_pairs = []
-    
-    # first cnot pairs
-    z_pair_0 = []
-    for (a,b), elements in z_stb_with_de.items():
-        z_pair_0 += [elements[0], a]
-    z_cnot_pairs.append(z_pair_0)
-
-    x_pair_0 = []
-    for (a,b), elements in x_stb_with_de.items():
-        x_pair_0 += [a, elements[0]]
-    x_cnot_pairs.append(x_pair_0)
-
-
-    # second cnot pairs
-    z_pair_1 = []
-    for (a,b), elements in z_stb_with_de.items():
-        if b == 0:
-            z_pair_1 += [elements[1], a]
-        elif b == -1:
-            z_pair_1 += [elements[1], a]
-        elif b == -2:
-            z_pair_1 += [elements[1], a]
-            z_pair_1 += [elements[4], code.corresponding_x_ancillas[code.z_ancilla_labels.index(a)]]
-    z_cnot_pairs.append(z_pair_1)
-
-    x_pair_1 = []
-    for (a,b), elements in x_stb_with_de.items():
-        if b == 0:
-            x_pair_1 += [a, elements[1]]
-        elif b == -1:
-            x_pair_1 += [a, elements[1]]
-            x_pair_1 += [code.corresponding_z_ancillas[code.x_ancilla_labels.index(a)], elements[5]]
-        elif b == -2:
-            x_pair_1 += [a, elements[1]]
-    x_cnot_pairs.append(x_pair_1)
-
-    # third cnot pairs
-    z_pair_2 = []
-    for (a,b), elements in z_stb_with_de.items():
-        if b == 0:
-            z_pair_2 += [elements[2], a]
-        elif b == -1:
-            z_pair_2 += [elements[2], a]
-            z_pair_2 += [elements[5], code.corresponding_x_ancillas[code.z_ancilla_labels.index(a)]]
-        elif b == -2:
-            z_pair_2 += [elements[2], a]
-    z_cnot_pairs.append(z_pair_2)
-
-    x_pair_2 = []
-    for (a,b), elements in x_stb_with_de.items():
-        if b == 0:
-            x_pair_2 += [a, elements[2]]
-        elif b == -1:
-            x_pair_2 += [a, elements[2]]
-        elif b == -2:
-            x_pair_2 += [a, elements[2]]
-            x_pair_2 += [code.corresponding_z_ancillas[code.x_ancilla_labels.index(a)], elements[4]]
-    x_cnot_pairs.append(x_pair_2)
-
-    # fourth cnot pairs
-    z_pair_3 = []
-    for (a,b), elements in z_stb_with_de.items():
-        if b == 0:
-            z_pair_3 += [elements[3], a]    
-        elif b == -1:
-            z_pair_3 += [elements[3], a]
-        elif b == -2:
-            z_pair_3 += [elements[3], a]
-    z_cnot_pairs.append(z_pair_3)
-
-    x_pair_3 = []
-    for (a,b), elements in x_stb_with_de.items():
-        if b == 0:
-            x_pair_3 += [a, elements[3]]
-        elif b == -1:
-            x_pair_3 += [a, elements[3]]
-        elif b == -2:
-            x_pair_3 += [a, elements[3]]
-    x_cnot_pairs.append(x_pair_3)
-
-
-    # fifth cnot pairs
-    z_pair_4 = []
-    for (a,b), elements in z_stb_with_de.items():
-        if b == 0:
-            z_pair_4 += [elements[4], a]
-    z_cnot_pairs.append(z_pair_4)
-
-    x_pair_4 = []
-    for (a,b), elements in x_stb_with_de.items():
-        if b == 0:
-            x_pair_4 += [a, elements[4]]
-    x_cnot_pairs.append(x_pair_4)   
-
-
-    # sixth cnot pairs
-    z_pair_5 = []
-    for (a,b), elements in z_stb_with_de.items():
-        if b == 0:
-            z_pair_5 += [elements[5], a]    
-    z_cnot_pairs.append(z_pair_5)
+    Returns:
+        tuple: (z_flags, x_flags), z_flags[r] is the flag b of the key (code.z_ancilla_labels[r], b) of z_stb_with_de (same for X)
+    """
+    z_flags = np.zeros(len(code.z_ancilla_labels), dtype=np.int8)
+    for a, b in z_stb_with_de:
+        z_flags[code.z_ancilla_index[a]] = b
+    x_flags = np.zeros(len(code.x_ancilla_labels), dtype=np.int8)
+    for a, b in x_stb_with_de:
+        x_flags[code.x_ancilla_index[a]] = b
+    return z_flags, x_flags
 
-    x_pair_5 = []
-    for (a,b), elements in x_stb_with_de.items():
-        if b == 0:
-            x_pair_5 += [a, elements[5]]
-    x_cnot_pairs.append(x_pair_5)
 
+def sample_coupler_dropout_flags(code: BBCode, error_rate, size=None, rng=None):
+    """
+    Draw random coupler defect patterns as dropout flags, the vectorized counterpart of
+    gen_random_coupler_defect followed by coupler_dropout_flags (same distribution, other random stream).
+
+    Args:
+        code (BBCode): The code
+        error_rate (float): Dropout probability of every stabilizer (1 means 1/4 coupler dropout)
+        size (int): Number of patterns (default: a single pattern)
+        rng (np.random.Generator): Random generator (default: fresh entropy)
+
+    Returns:
+        tuple: (z_flags, x_flags) in the order of code.z_ancilla_labels and code.x_ancilla_labels,
+               with a leading axis of length size if size is given
+    """
+    x_partner_index = code.z_ancilla_index[np.asarray(code.corresponding_z_ancillas)]
+    return coupler_dropout_flag_arrays(len(code.z_ancilla_labels), x_partner_index, error_rate, size, rng)
 
-    # seventh cnot pairs
-    z_pair_6 = []
-    for (a,b), elements in z_stb_with_de.items():
-        if b == -1:
-            z_pair_6 += [code.corresponding_x_ancillas[code.z_ancilla_labels.index(a)], elements[4]]
-        elif b == -2:
-            z_pair_6 += [code.corresponding_x_ancillas[code.z_ancilla_labels.index(a)], elements[5]]
-    z_cnot_pairs.append(z_pair_6)
 
-    x_pair_6 = []
-    for (a,b), elements in x_stb_with_de.items():
-        if b == -1:
-            x_pair_6 += [elements[4], code.corresponding_z_ancillas[code.x_ancilla_labels.index(a)]]
-        elif b == -2:
-            x_pair_6 += [elements[5], code.corresponding_z_ancillas[code.x_ancilla_labels.index(a)]]
-    x_cnot_pairs.append(x_pair_6)
-
-    # eighth cnot pairs
-    z_pair_7 = []
-    for (a,b), elements in z_stb_with_de.items():
-        if b == -1:
-            z_pair_7 += [elements[4], a]
-        elif b == -2:
-            z_pair_7 += [elements[5], a]
-    z_cnot_pairs.append(z_pair_7) 
+def compile_cnot_schedule(schedule):
+    """
+    Compile a CNOT schedule into index arrays.
 
-    x_pair_7 = []
-    for (a,b), elements in x_stb_with_de.items():
-        if b == -1:
-            x_pair_7 += [a, elements[4]]
-        elif b == -2:
-            x_pair_7 += [a, elements[5]]
-    x_cnot_pairs.append(x_pair_7)
+    The sources of the cnot targets are the columns of [ancillas, partners, table], i.e. "a" -> 0,
+    "p" -> 1 and the data qubit elements[k] -> k+2.
 
+    Args:
+        schedule (list): CNOT layers, see DEFECT_Z_SCHEDULE
 
+    Returns:
+        list: (columns, allowed) for every layer, columns has shape (terms, 2) and allowed[t, -b] tells if term t applies to flag b
+    """
+    source = {"a": 0, "p": 1}
+    compiled = []
+    for layer in schedule:
+        columns = np.array([[source[q] if q in source else q + 2 for q in (control, target)]
+                            for _, control, target in layer], dtype=np.intp).reshape(-1, 2)
+        allowed = np.array([[b in term_flags for b in (0, -1, -2)] for term_flags, _, _ in layer],
+                           dtype=bool).reshape(-1, 3)
+        compiled.append((columns, allowed))
+    return compiled
+
+
+def run_cnot_schedule(table, ancillas, partners, flags, compiled_schedule):
+    """
+    Get the flat [control, target, control, target, ...] list of every layer of a compiled CNOT schedule.
 
-    # ninth cnot pairs
-    z_pair_8 = []
-    for (a,b), elements in z_stb_with_de.items():
-        if b == -1:
-            z_pair_8 += [code.corresponding_x_ancillas[code.z_ancilla_labels.index(a)], elements[4]]   
-        elif b == -2:
-            z_pair_8 += [code.corresponding_x_ancillas[code.z_ancilla_labels.index(a)], elements[5]]
-    z_cnot_pairs.append(z_pair_8)
+    Args:
+        table (np.ndarray): Stabilizer table, row r holds the data qubits of the stabilizer of ancillas[r]
+        ancillas (np.ndarray): Ancilla labels
+        partners (np.ndarray): partners[r] is the corresponding ancilla of ancillas[r]
+        flags (np.ndarray): Dropout flag (0, -1 or -2) of every stabilizer
+        compiled_schedule (list): Output of compile_cnot_schedule
 
+    Returns:
+        list: The cnot pairs of every layer
+    """
+    sources = np.column_stack((ancillas, partners, table))
+    flag_index = -np.asarray(flags, dtype=np.intp)
+    layers = []
+    for columns, allowed in compiled_schedule:
+        # pairs[r, t] is the cnot of term t for stabilizer r, kept where mask[r, t]
+        pairs = sources[:, columns]
+        mask = allowed[:, flag_index].T
+        layers.append(pairs[mask].ravel().tolist())
+    return layers
 
-    x_pair_8 = []
-    for (a,b), elements in x_stb_with_de.items():
-        if b == -1:
-            x_pair_8 += [elements[4], code.corresponding_z_ancillas[code.x_ancilla_labels.index(a)]]
-        elif b == -2:
-            x_pair_8 += [elements[5], code.corresponding_z_ancillas[code.x_ancilla_labels.index(a)]]
-    x_cnot_pairs.append(x_pair_8)
 
+_DEFECT_SCHEDULES = (compile_cnot_schedule(DEFECT_Z_SCHEDULE), compile_cnot_schedule(DEFECT_X_SCHEDULE))
+_SCHEDULES_75PER = (compile_cnot_schedule(Z_SCHEDULE_75PER), compile_cnot_schedule(X_SCHEDULE_75PER))
+_SCHEDULES_50PER = (compile_cnot_schedule(Z_SCHEDULE_50PER), compile_cnot_schedule(X_SCHEDULE_50PER))
 
-    # tenth cnot pairs
-    z_pair_9 = []
-    for (a,b), elements in z_stb_with_de.items():
-        if b == -1:
-            z_pair_9 += [elements[5], code.corresponding_x_ancillas[code.z_ancilla_labels.index(a)]]
-        elif b == -2:
-            z_pair_9 += [elements[4], code.corresponding_x_ancillas[code.z_ancilla_labels.index(a)]]
-    z_cnot_pairs.append(z_pair_9)
 
-    x_pair_9 = []
-    for (a,b), elements in x_stb_with_de.items():
-        if b == -1:
-            x_pair_9 += [code.corresponding_z_ancillas[code.x_ancilla_labels.index(a)], elements[5]]
-        elif b == -2:
-            x_pair_9 += [code.corresponding_z_ancillas[code.x_ancilla_labels.index(a)], elements[4]]
-    x_cnot_pairs.append(x_pair_9)
-    
+def gen_cnot_pairs_from_flags(code: BBCode, z_flags, x_flags, z_schedule, x_schedule, use_50per_partners=False):
+    """
+    Construct the cnot pairs of the stabilizers with defect from their dropout flags.
+
+    Args:
+        code (BBCode): The code
+        z_flags (np.ndarray): Dropout flag of every Z stabilizer, in the order of code.z_ancilla_labels
+        x_flags (np.ndarray): Dropout flag of every X stabilizer, in the order of code.x_ancilla_labels
+        z_schedule (list): Compiled CNOT layers of the Z stabilizers, e.g. compile_cnot_schedule(DEFECT_Z_SCHEDULE)
+        x_schedule (list): Compiled CNOT layers of the X stabilizers, e.g. compile_cnot_schedule(DEFECT_X_SCHEDULE)
+        use_50per_partners (bool): Bridge broken couplers through the corresponding ancillas of the 50% coupler layout
+
+    Returns:
+        tuple: (x_cnot_pairs, z_cnot_pairs)
+    """
+    if use_50per_partners:
+        x_partners, z_partners = code.corresponding_x_ancillas_50per, code.corresponding_z_ancillas_50per
+    else:
+        x_partners, z_partners = code.corresponding_x_ancillas, code.corresponding_z_ancillas
+    z_cnot_pairs = run_cnot_schedule(code.z_stabilizer_table, code.z_ancilla_labels, x_partners, z_flags, z_schedule)
+    x_cnot_pairs = run_cnot_schedule(code.x_stabilizer_table, code.x_ancilla_labels, z_partners, x_flags, x_schedule)
     return x_cnot_pairs, z_cnot_pairs
 
-    
 
-def gen_cnot_pairs_75per_coupler(code: BBCode, z_stb_with_de, x_stb_with_de):
+def gen_cnot_pairs_with_defect(code: BBCode, z_stb_with_de, x_stb_with_de):
     """
     Construct a list of cnot pairs between ancilla qubits and data qubits
     the short range cnot gates are labeled as 0,1,2,3, with relative position [[-1,0], [0,1], [1,0], [0,-1]], so qubits in the same row in the 2d layout can be labeled by even (0,2, [-1,0] and [1,0]) or odd (1,3, [0,1] and [0,-1]). The long range couplers for z ancilla has relative position [-c1,-d1] and [-a1,-b1], we have the convention that [-c1,-d1] is even and [-a1,-b1] is odd for z stabilizer setup, while [-c1,-d1] is odd and [-a1,-b1] is even for x stabilizer setup.
 
     We label the long range couplers as even and odd to make sure that we can arrange those cnot gates in the process of applying short range cnot gates. for example, each z stabilizer has two long range couplers, we label them as even and odd, and we can apply the short range cnot gates in the order of [0,1,2,3], then the long range cnot can be coupled as [0,1+even,2+odd,3] (+ means apply the two cnot gates in parallel).
-    """
-
-    x_cnot_pairs = []
-    z_cnot_pairs = []
-    
-    # first cnot pairs
-    z_pair_0 = []
-    for (a,b), elements in z_stb_with_de.items():
-        z_pair_0 += [elements[0], a]
-    z_cnot_pairs.append(z_pair_0)
-
-    x_pair_0 = []
-    for (a,b), elements in x_stb_with_de.items():
-        x_pair_0 += [a, elements[0]]
-    x_cnot_pairs.append(x_pair_0)
-
-
-    # second cnot pairs
-    z_pair_1 = []
-    for (a,b), elements in z_stb_with_de.items():
-        if b == -2:
-            z_pair_1 += [elements[1], a]
-            z_pair_1 += [elements[4], code.corresponding_x_ancillas[code.z_ancilla_labels.index(a)]]
-    z_cnot_pairs.append(z_pair_1)
-
-    x_pair_1 = []
-    for (a,b), elements in x_stb_with_de.items():
-        x_pair_1 += [a, elements[1]]
-    x_cnot_pairs.append(x_pair_1)
-
-    # third cnot pairs
-    z_pair_2 = []
-    for (a,b), elements in z_stb_with_de.items():
-        z_pair_2 += [elements[2], a]
-    z_cnot_pairs.append(z_pair_2)
-
-    x_pair_2 = []
-    for (a,b), elements in x_stb_with_de.items():
-        x_pair_2 += [a, elements[2]]
-    x_cnot_pairs.append(x_pair_2)
-
-    # fourth cnot pairs
-    z_pair_3 = []
-    for (a,b), elements in z_stb_with_de.items():
-        z_pair_3 += [elements[3], a]
-    z_cnot_pairs.append(z_pair_3)
 
-    x_pair_3 = []
-    for (a,b), elements in x_stb_with_de.items():
-        x_pair_3 += [a, elements[3]]
-    x_cnot_pairs.append(x_pair_3)
-
-
-    # fifth cnot pairs
-
-    z_pair_4 = []
-    for (a,b), elements in z_stb_with_de.items():
-        if b == -2:
-            z_pair_4 += [code.corresponding_x_ancillas[code.z_ancilla_labels.index(a)], elements[5]]
-    z_cnot_pairs.append(z_pair_4)
-
-    x_pair_4 = []
-    for (a,b), elements in x_stb_with_de.items():
-        x_pair_4 += [a, elements[4]]
-    x_cnot_pairs.append(x_pair_4)   
-
-
-    # sixth cnot pairs
-
-    z_pair_5 = []
-    for (a,b), elements in z_stb_with_de.items():
-        if b == -2:
-            z_pair_5 += [elements[5], a]
-    z_cnot_pairs.append(z_pair_5) 
-
-    x_pair_5 = []
-    for (a,b), elements in x_stb_with_de.items():
-        x_pair_5 += [a, elements[5]]
-    x_cnot_pairs.append(x_pair_5)
+    The ten layers are given by DEFECT_Z_SCHEDULE and DEFECT_X_SCHEDULE.
+    """
+    z_flags, x_flags = coupler_dropout_flags(code, z_stb_with_de, x_stb_with_de)
+    return gen_cnot_pairs_from_flags(code, z_flags, x_flags, *_DEFECT_SCHEDULES)
 
 
-    # seventh cnot pairs
+def gen_cnot_pairs_75per_coupler(code: BBCode, z_stb_with_de, x_stb_with_de):
+    """
+    Construct a list of cnot pairs between ancilla qubits and data qubits for the 75% coupler layout,
+    see gen_cnot_pairs_with_defect. The layers are given by Z_SCHEDULE_75PER and X_SCHEDULE_75PER.
+    """
+    z_flags, x_flags = coupler_dropout_flags(code, z_stb_with_de, x_stb_with_de)
+    return gen_cnot_pairs_from_flags(code, z_flags, x_flags, *_SCHEDULES_75PER)
 
-    z_pair_6 = []
-    for (a,b), elements in z_stb_with_de.items():
-        if b == -2:
-            z_pair_6 += [code.corresponding_x_ancillas[code.z_ancilla_labels.index(a)], elements[5]]
-    z_cnot_pairs.append(z_pair_6)
-
-    # eighth cnot pairs
-    z_pair_7 = []
-    for (a,b), elements in z_stb_with_de.items():
-        if b == -2:
-            z_pair_7 += [elements[4], code.corresponding_x_ancillas[code.z_ancilla_labels.index(a)]]
-    z_cnot_pairs.append(z_pair_7)
-    
-    return x_cnot_pairs, z_cnot_pairs
 
 def gen_cnot_pairs_50per_coupler(code: BBCode, z_stb_with_de, x_stb_with_de):
     """
-    Construct a list of cnot pairs between ancilla qubits and data qubits
-    the short range cnot gates are labeled as 0,1,2,3, with relative position [[-1,0], [0,1], [1,0], [0,-1]], so qubits in the same row in the 2d layout can be labeled by even (0,2, [-1,0] and [1,0]) or odd (1,3, [0,1] and [0,-1]). The long range couplers for z ancilla has relative position [-c1,-d1] and [-a1,-b1], we have the convention that [-c1,-d1] is even and [-a1,-b1] is odd for z stabilizer setup, while [-c1,-d1] is odd and [-a1,-b1] is even for x stabilizer setup.
-
-    We label the long range couplers as even and odd to make sure that we can arrange those cnot gates in the process of applying short range cnot gates. for example, each z stabilizer has two long range couplers, we label them as even and odd, and we can apply the short range cnot gates in the order of [0,1,2,3], then the long range cnot can be coupled as [0,1+even,2+odd,3] (+ means apply the two cnot gates in parallel).
+    Construct a list of cnot pairs between ancilla qubits and data qubits for the 50% coupler layout,
+    see gen_cnot_pairs_with_defect. The layers are given by Z_SCHEDULE_50PER and X_SCHEDULE_50PER.
     """
+    z_flags, x_flags = coupler_dropout_flags(code, z_stb_with_de, x_stb_with_de)
+    return gen_cnot_pairs_from_flags(code, z_flags, x_flags, *_SCHEDULES_50PER, use_50per_partners=True)
 
-    x_cnot_pairs = []
-    z_cnot_pairs = []
-    
-    # first cnot pairs
-    z_pair_0 = []
-    for (a,b), elements in z_stb_with_de.items():
-        z_pair_0 += [elements[0], a]
-    z_cnot_pairs.append(z_pair_0)
-
-    x_pair_0 = []
-    for (a,b), elements in x_stb_with_de.items():
-        x_pair_0 += [a, elements[0]]
-    x_cnot_pairs.append(x_pair_0)
-
-
-    # second cnot pairs
-    z_pair_1 = []
-    for (a,b), elements in z_stb_with_de.items():
-        if b == -2:
-            z_pair_1 += [elements[1], a]
-            z_pair_1 += [elements[4], code.corresponding_x_ancillas_50per[code.z_ancilla_labels.index(a)]]
-    z_cnot_pairs.append(z_pair_1)
-
-    x_pair_1 = []
-    for (a,b), elements in x_stb_with_de.items():
-        if b == -2:
-            x_pair_1 += [a, elements[1]]
-    x_cnot_pairs.append(x_pair_1)
-
-    # third cnot pairs
-    z_pair_2 = []
-    for (a,b), elements in z_stb_with_de.items():
-        if b == -2:
-            z_pair_2 += [elements[2], a]
-    z_cnot_pairs.append(z_pair_2)
-
-    x_pair_2 = []
-    for (a,b), elements in x_stb_with_de.items():
-        if b == -2:
-            x_pair_2 += [a, elements[2]]
-            x_pair_2 += [code.corresponding_z_ancillas_50per[code.x_ancilla_labels.index(a)], elements[4]]
-    x_cnot_pairs.append(x_pair_2)
-
-    # fourth cnot pairs
-    z_pair_3 = []
-    for (a,b), elements in z_stb_with_de.items():
-        if b == -2:
-            z_pair_3 += [elements[3], a]
-    z_cnot_pairs.append(z_pair_3)
-
-    x_pair_3 = []
-    for (a,b), elements in x_stb_with_de.items():
-        if b == -2:
-            x_pair_3 += [a, elements[3]]
-    x_cnot_pairs.append(x_pair_3)
 
+def gen_circ_coupler_defect(code: BBCode, sround, rng=None):
+    """
+    Generate the circuit of a random coupler defect pattern, see gen_random_coupler_defect.
 
-    # fifth cnot pairs
-    z_pair_6 = []
-    for (a,b), elements in z_stb_with_de.items():
-        if b == -2:
-            z_pair_6 += [code.corresponding_x_ancillas_50per[code.z_ancilla_labels.index(a)], elements[5]]
-    z_cnot_pairs.append(z_pair_6)
-
-    x_pair_6 = []
-    for (a,b), elements in x_stb_with_de.items():
-        if b == -2:
-            x_pair_6 += [elements[5], code.corresponding_z_ancillas_50per[code.x_ancilla_labels.index(a)]]
-    x_cnot_pairs.append(x_pair_6)
-
-    # sixth cnot pairs
-    z_pair_7 = []
-    for (a,b), elements in z_stb_with_de.items():
-        if b == -2:
-            z_pair_7 += [elements[5], a]
-    z_cnot_pairs.append(z_pair_7) 
-
-    x_pair_7 = []
-    for (a,b), elements in x_stb_with_de.items():
-        if b == -2:
-            x_pair_7 += [a, elements[5]]
-    x_cnot_pairs.append(x_pair_7)
-
-
-
-    # seventh cnot pairs
-    z_pair_8 = []
-    for (a,b), elements in z_stb_with_de.items():
-        if b == -2:
-            z_pair_8 += [code.corresponding_x_ancillas_50per[code.z_ancilla_labels.index(a)], elements[5]]
-    z_cnot_pairs.append(z_pair_8)
-
-
-    x_pair_8 = []
-    for (a,b), elements in x_stb_with_de.items():
-        if b == -2:
-            x_pair_8 += [elements[5], code.corresponding_z_ancillas_50per[code.x_ancilla_labels.index(a)]]
-    x_cnot_pairs.append(x_pair_8)
-
-
-    # eighth cnot pairs
-    z_pair_9 = []
-    for (a,b), elements in z_stb_with_de.items():
-        if b == -2:
-            z_pair_9 += [elements[4], code.corresponding_x_ancillas_50per[code.z_ancilla_labels.index(a)]]
-    z_cnot_pairs.append(z_pair_9)
-
-    x_pair_9 = []
-    for (a,b), elements in x_stb_with_de.items():
-        if b == -2:
-            x_pair_9 += [code.corresponding_z_ancillas_50per[code.x_ancilla_labels.index(a)], elements[4]]
-    x_cnot_pairs.append(x_pair_9)
-    
-    return x_cnot_pairs, z_cnot_pairs
-
-
-
-def gen_circ_coupler_defect(code: BBCode, sround):
-
-        
+    Without rng every call draws the next pattern of the module-global generator, so the pattern
+    depends on the calls made before in the process; pass rng (or use
+    circ_gen.coupler_defect_ensemble) for independent, reproducible patterns.
+    """
     coupler_error_rate = 1 # 1 means 1/4 coupler dropout
-    z_stb_with_de, x_stb_with_de = gen_random_coupler_defect(code, coupler_error_rate)
-    x_cnot_pairs, z_cnot_pairs = gen_cnot_pairs_with_defect(code, z_stb_with_de, x_stb_with_de)
+    z_stb_with_de, x_stb_with_de = gen_random_coupler_defect(code, coupler_error_rate, rng)
+    z_flags, x_flags = coupler_dropout_flags(code, z_stb_with_de, x_stb_with_de)
 
 
     # print the x and z stabilizers with defects
@@ -526,48 +331,72 @@ def gen_circ_coupler_defect(code: BBCode, sround):
     #     if b != 0:
     #         print("z_stb_with_de: ", (a,b), z_stb_with_de[(a,b)])
 
+    return gen_circ_from_dropout_flags(code, sround, z_flags, x_flags)
+
 
+def gen_circ_from_dropout_flags(code: BBCode, sround, z_flags, x_flags):
+    """
+    Generate the circuit of the coupler defect pattern given by the dropout flags of the stabilizers
+    (see coupler_dropout_flags), with the CNOT layers of DEFECT_Z_SCHEDULE and DEFECT_X_SCHEDULE.
+    """
+    x_cnot_pairs, z_cnot_pairs = gen_cnot_pairs_from_flags(code, z_flags, x_flags, *_DEFECT_SCHEDULES)
+
+    return gen_circ_from_cnot_layers(code, sround, x_cnot_pairs, z_cnot_pairs)
+
+
+def gen_circ_from_cnot_layers(code: BBCode, sround, x_cnot_pairs, z_cnot_pairs, x_detectors=True):
+    """
+    Generate the circuit of sround syndrome rounds from the CNOT layers of the X and the Z stabilizer
+    measurements, e.g. the output of gen_cnot_pairs_from_flags or circ_gen.coupler_schedule.synthesize_cnot_layers.
+
+    Args:
+        code (BBCode): The code
+        sround (int): Number of syndrome rounds
+        x_cnot_pairs (list): Flat [control, target, ...] list of every CNOT layer of the X stabilizer measurement
+        z_cnot_pairs (list): Flat [control, target, ...] list of every CNOT layer of the Z stabilizer measurement
+        x_detectors (bool): Add the X detectors of the repeated rounds (the _only_z_detectors, 50% and 75% circuits do not)
+
+    Returns:
+        stim.Circuit: The noiseless circuit
+    """
     circuit = stim.Circuit()
 
     # annotate qubit coordinates
-    for i in range(2*code.l):
-        for j in range(2*code.m):
-            circuit.append("QUBIT_COORDS", code.qubit_label(i, j), [i, j])
+    append_qubit_coords(circuit, code)
 
     #reset data qubits
-    circuit.append("R", code.data_qubits_set)
+    append_gate(circuit, "R", code.data_qubits_set)
     
     # reset ancilla qubits
-    circuit.append("RX", code.x_ancilla_labels)
-    circuit.append("RX", code.z_ancilla_labels)
+    append_gate(circuit, "RX", code.x_ancilla_labels)
+    append_gate(circuit, "RX", code.z_ancilla_labels)
 
     circuit.append("TICK")
 
 
-    for i in range(10):
-        circuit.append("CNOT", x_cnot_pairs[i])
+    for i in range(len(x_cnot_pairs)):
+        append_gate(circuit, "CNOT", x_cnot_pairs[i])
         circuit.append("TICK")
 
 
-    circuit.append("MX", code.x_ancilla_labels)
-    circuit.append("MX", code.z_ancilla_labels)
+    append_gate(circuit, "MX", code.x_ancilla_labels)
+    append_gate(circuit, "MX", code.z_ancilla_labels)
 
     circuit.append("TICK")
 
-    circuit.append("R", code.x_ancilla_labels)
-    circuit.append("R", code.z_ancilla_labels)
+    append_gate(circuit, "R", code.x_ancilla_labels)
+    append_gate(circuit, "R", code.z_ancilla_labels)
 
     circuit.append("TICK")
 
-    for i in range(10):
-        circuit.append("CNOT", z_cnot_pairs[i])
+    for i in range(len(z_cnot_pairs)):
+        append_gate(circuit, "CNOT", z_cnot_pairs[i])
         circuit.append("TICK")
 
     # measure and reset stabilizers
-    circuit.append("M", code.x_ancilla_labels)
-    circuit.append("M", code.z_ancilla_labels)
-    for i in range(int(code.n/2)):
-        circuit.append("DETECTOR", stim.target_rec(-int(code.n/2)+i), [code.z_ancilla_labels[i]//int(code.l*2),code.z_ancilla_labels[i]%int(code.l*2), 0])
+    append_gate(circuit, "M", code.x_ancilla_labels)
+    append_gate(circuit, "M", code.z_ancilla_labels)
+    append_detectors(circuit, code, code.z_ancilla_labels, round_records(code, [-int(code.n/2)]))
     
 
     circuit.append("TICK")
@@ -577,34 +406,33 @@ def gen_circ_coupler_defect(code: BBCode, sround):
 
     loop_body_circuit.append("SHIFT_COORDS", [], [0,0,1])
 
-    loop_body_circuit.append("RX", code.x_ancilla_labels)
-    loop_body_circuit.append("RX", code.z_ancilla_labels)
+    append_gate(loop_body_circuit, "RX", code.x_ancilla_labels)
+    append_gate(loop_body_circuit, "RX", code.z_ancilla_labels)
 
     loop_body_circuit.append("TICK")
 
-    for i in range(10):
-        loop_body_circuit.append("CNOT", x_cnot_pairs[i])
+    for i in range(len(x_cnot_pairs)):
+        append_gate(loop_body_circuit, "CNOT", x_cnot_pairs[i])
         loop_body_circuit.append("TICK")
 
     # measure and reset stabilizers
-    loop_body_circuit.append("MX", code.x_ancilla_labels)
-    loop_body_circuit.append("MX", code.z_ancilla_labels)
-    for i in range(int(code.n/2)):
-        loop_body_circuit.append("DETECTOR", [stim.target_rec(-int(code.n)+i), stim.target_rec(-int(code.n*3)+i)], [code.x_ancilla_labels[i]//int(code.l*2),code.x_ancilla_labels[i]%int(code.l*2), 0])
+    append_gate(loop_body_circuit, "MX", code.x_ancilla_labels)
+    append_gate(loop_body_circuit, "MX", code.z_ancilla_labels)
+    if x_detectors:
+        append_detectors(loop_body_circuit, code, code.x_ancilla_labels, round_records(code, [-int(code.n), -int(code.n*3)]))
 
-    loop_body_circuit.append("R", code.x_ancilla_labels)
-    loop_body_circuit.append("R", code.z_ancilla_labels)
+    append_gate(loop_body_circuit, "R", code.x_ancilla_labels)
+    append_gate(loop_body_circuit, "R", code.z_ancilla_labels)
 
     loop_body_circuit.append("TICK")
 
-    for i in range(10):
-        loop_body_circuit.append("CNOT", z_cnot_pairs[i])
+    for i in range(len(z_cnot_pairs)):
+        append_gate(loop_body_circuit, "CNOT", z_cnot_pairs[i])
         loop_body_circuit.append("TICK")
 
-    loop_body_circuit.append("M", code.x_ancilla_labels)
-    loop_body_circuit.append("M", code.z_ancilla_labels)
-    for i in range(int(code.n/2)):
-        loop_body_circuit.append("DETECTOR", [stim.target_rec(-int(code.n/2)+i), stim.target_rec(-int(code.n*2+code.n/2)+i)], [code.z_ancilla_labels[i]//int(code.l*2),code.z_ancilla_labels[i]%int(code.l*2), 0])
+    append_gate(loop_body_circuit, "M", code.x_ancilla_labels)
+    append_gate(loop_body_circuit, "M", code.z_ancilla_labels)
+    append_detectors(loop_body_circuit, code, code.z_ancilla_labels, round_records(code, [-int(code.n/2), -int(code.n*2+code.n/2)]))
     
     loop_body_circuit.append("TICK")
 
@@ -615,20 +443,14 @@ def gen_circ_coupler_defect(code: BBCode, sround):
     repeat_count=sround))
 
     # final measurements and detector setting
-    circuit.append("M", code.data_qubits_set)
+    append_gate(circuit, "M", code.data_qubits_set)
 
-    for i in code.z_ancilla_labels:
-        ii = code.z_ancilla_labels.index(i)
-        data_qubits_stb = [value for (key1, key2), value in code.z_stabilizers.items() if key1 == i]
-        circuit.append("DETECTOR", [stim.target_rec(-int(code.n*3/2)+ii), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[0])), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[1])), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[2])), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[3])), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[4])), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[5]))], [code.z_ancilla_labels[ii]//int(code.l*2),code.z_ancilla_labels[ii]%int(code.l*2), 1])
+    append_final_z_detectors(circuit, code)
 
 
 
     # adding observable measurement to the circuit
-    for i in range(len(code.z_logical_operators)):
-        logical_ops = get_logical_ops_css(code.qcode.lz, code.k, code.m, code.n)
-        circuit.append("OBSERVABLE_INCLUDE", [stim.target_rec(code.data_qubits_set.index(idx)-code.n) for idx in logical_ops[i]], [i])
-        # print("z_random_logical: ", code.z_random_logical) 
+    append_z_observables(circuit, code)
 
 
     return circuit
@@ -662,115 +484,7 @@ def gen_circ_coupler_defect_only_z_detectors(code: BBCode, sround):
 
 
 
-    circuit = stim.Circuit()
-
-    # annotate qubit coordinates
-    for i in range(2*code.l):
-        for j in range(2*code.m):
-            circuit.append("QUBIT_COORDS", code.qubit_label(i, j), [i, j])
-
-    #reset data qubits
-    circuit.append("R", code.data_qubits_set)
-    
-    # reset ancilla qubits
-    circuit.append("RX", code.x_ancilla_labels)
-    circuit.append("RX", code.z_ancilla_labels)
-
-    circuit.append("TICK")
-
-
-    for i in range(10):
-        circuit.append("CNOT", x_cnot_pairs[i])
-        circuit.append("TICK")
-
-
-    circuit.append("MX", code.x_ancilla_labels)
-    circuit.append("MX", code.z_ancilla_labels)
-
-    circuit.append("TICK")
-
-    circuit.append("R", code.x_ancilla_labels)
-    circuit.append("R", code.z_ancilla_labels)
-
-    circuit.append("TICK")
-
-    for i in range(10):
-        circuit.append("CNOT", z_cnot_pairs[i])
-        circuit.append("TICK")
-
-    # measure and reset stabilizers
-    circuit.append("M", code.x_ancilla_labels)
-    # for i in range(int(code.n/2)):
-    #     circuit.append("DETECTOR", stim.target_rec(-int(code.n/2)+i), [code.x_ancilla_labels[i]//int(code.l*2),code.x_ancilla_labels[i]%int(code.l*2), 0])
-    circuit.append("M", code.z_ancilla_labels)
-    for i in range(int(code.n/2)):
-        circuit.append("DETECTOR", stim.target_rec(-int(code.n/2)+i), [code.z_ancilla_labels[i]//int(code.l*2),code.z_ancilla_labels[i]%int(code.l*2), 0])
-    
-
-    circuit.append("TICK")
-
-    # define loop body circuit
-    loop_body_circuit = stim.Circuit()
-
-    loop_body_circuit.append("SHIFT_COORDS", [], [0,0,1])
-
-    loop_body_circuit.append("RX", code.x_ancilla_labels)
-    loop_body_circuit.append("RX", code.z_ancilla_labels)
-
-    loop_body_circuit.append("TICK")
-
-    for i in range(10):
-        loop_body_circuit.append("CNOT", x_cnot_pairs[i])
-        loop_body_circuit.append("TICK")
-
-    # measure and reset stabilizers
-    loop_body_circuit.append("MX", code.x_ancilla_labels)
-    loop_body_circuit.append("MX", code.z_ancilla_labels)
-    # for i in range(int(code.n/2)):
-    #     loop_body_circuit.append("DETECTOR", [stim.target_rec(-int(code.n)+i), stim.target_rec(-int(code.n*3)+i)], [code.x_ancilla_labels[i]//int(code.l*2),code.x_ancilla_labels[i]%int(code.l*2), 0])
-
-    loop_body_circuit.append("R", code.x_ancilla_labels)
-    loop_body_circuit.append("R", code.z_ancilla_labels)
-
-    loop_body_circuit.append("TICK")
-
-    for i in range(10):
-        loop_body_circuit.append("CNOT", z_cnot_pairs[i])
-        loop_body_circuit.append("TICK")
-
-    loop_body_circuit.append("M", code.x_ancilla_labels)
-    # for i in range(int(code.n/2)):
-    #     loop_body_circuit.append("DETECTOR", [stim.target_rec(-int(code.n/2)+i), stim.target_rec(-int(code.n*2+code.n/2)+i)], [code.x_ancilla_labels[i]//int(code.l*2),code.x_ancilla_labels[i]%int(code.l*2), 0])
-    loop_body_circuit.append("M", code.z_ancilla_labels)
-    for i in range(int(code.n/2)):
-        loop_body_circuit.append("DETECTOR", [stim.target_rec(-int(code.n/2)+i), stim.target_rec(-int(code.n*2+code.n/2)+i)], [code.z_ancilla_labels[i]//int(code.l*2),code.z_ancilla_labels[i]%int(code.l*2), 0])
-    
-    loop_body_circuit.append("TICK")
-
-    
-    # adding loop body circuit to the main circuit
-    circuit.append(stim.CircuitRepeatBlock(
-    body=loop_body_circuit,
-    repeat_count=sround))
-
-    # final measurements and detector setting
-    circuit.append("M", code.data_qubits_set)
-
-    for i in code.z_ancilla_labels:
-        ii = code.z_ancilla_labels.index(i)
-        data_qubits_stb = [value for (key1, key2), value in code.z_stabilizers.items() if key1 == i]
-        circuit.append("DETECTOR", [stim.target_rec(-int(code.n*3/2)+ii), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[0])), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[1])), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[2])), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[3])), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[4])), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[5]))], [code.z_ancilla_labels[ii]//int(code.l*2),code.z_ancilla_labels[ii]%int(code.l*2), 1])
-
-
-
-    # adding observable measurement to the circuit
-    for i in range(code.k):
-        logical_ops = get_logical_ops_css(code.qcode.lz, code.k, code.m, code.n)
-        circuit.append("OBSERVABLE_INCLUDE", [stim.target_rec(code.data_qubits_set.index(idx)-code.n) for idx in logical_ops[i]], [i])
-        # print("z_random_logical: ", code.z_random_logical) 
-
-
-    return circuit
+    return gen_circ_from_cnot_layers(code, sround, x_cnot_pairs, z_cnot_pairs, x_detectors=False)
 
 
 
@@ -801,115 +515,7 @@ def gen_circ_50per_coupler(code: BBCode, sround):
 
 
 
-    circuit = stim.Circuit()
-
-    # annotate qubit coordinates
-    for i in range(2*code.l):
-        for j in range(2*code.m):
-            circuit.append("QUBIT_COORDS", code.qubit_label(i, j), [i, j])
-
-    #reset data qubits
-    circuit.append("R", code.data_qubits_set)
-    
-    # reset ancilla qubits
-    circuit.append("RX", code.x_ancilla_labels)
-    circuit.append("RX", code.z_ancilla_labels)
-
-    circuit.append("TICK")
-
-
-    for i in range(len(x_cnot_pairs)):
-        circuit.append("CNOT", x_cnot_pairs[i])
-        circuit.append("TICK")
-
-
-    circuit.append("MX", code.x_ancilla_labels)
-    circuit.append("MX", code.z_ancilla_labels)
-
-    circuit.append("TICK")
-
-    circuit.append("R", code.x_ancilla_labels)
-    circuit.append("R", code.z_ancilla_labels)
-
-    circuit.append("TICK")
-
-    for i in range(len(z_cnot_pairs)):
-        circuit.append("CNOT", z_cnot_pairs[i])
-        circuit.append("TICK")
-
-    # measure and reset stabilizers
-    circuit.append("M", code.x_ancilla_labels)
-    # for i in range(int(code.n/2)):
-    #     circuit.append("DETECTOR", stim.target_rec(-int(code.n/2)+i), [code.x_ancilla_labels[i]//int(code.l*2),code.x_ancilla_labels[i]%int(code.l*2), 0])
-    circuit.append("M", code.z_ancilla_labels)
-    for i in range(int(code.n/2)):
-        circuit.append("DETECTOR", stim.target_rec(-int(code.n/2)+i), [code.z_ancilla_labels[i]//int(code.l*2),code.z_ancilla_labels[i]%int(code.l*2), 0])
-    
-
-    circuit.append("TICK")
-
-    # define loop body circuit
-    loop_body_circuit = stim.Circuit()
-
-    loop_body_circuit.append("SHIFT_COORDS", [], [0,0,1])
-
-    loop_body_circuit.append("RX", code.x_ancilla_labels)
-    loop_body_circuit.append("RX", code.z_ancilla_labels)
-
-    loop_body_circuit.append("TICK")
-
-    for i in range(len(x_cnot_pairs)):
-        loop_body_circuit.append("CNOT", x_cnot_pairs[i])
-        loop_body_circuit.append("TICK")
-
-    # measure and reset stabilizers
-    loop_body_circuit.append("MX", code.x_ancilla_labels)
-    loop_body_circuit.append("MX", code.z_ancilla_labels)
-    # for i in range(int(code.n/2)):
-    #     loop_body_circuit.append("DETECTOR", [stim.target_rec(-int(code.n)+i), stim.target_rec(-int(code.n*3)+i)], [code.x_ancilla_labels[i]//int(code.l*2),code.x_ancilla_labels[i]%int(code.l*2), 0])
-
-    loop_body_circuit.append("R", code.x_ancilla_labels)
-    loop_body_circuit.append("R", code.z_ancilla_labels)
-
-    loop_body_circuit.append("TICK")
-
-    for i in range(len(z_cnot_pairs)):
-        loop_body_circuit.append("CNOT", z_cnot_pairs[i])
-        loop_body_circuit.append("TICK")
-
-    loop_body_circuit.append("M", code.x_ancilla_labels)
-    # for i in range(int(code.n/2)):
-    #     loop_body_circuit.append("DETECTOR", [stim.target_rec(-int(code.n/2)+i), stim.target_rec(-int(code.n*2+code.n/2)+i)], [code.x_ancilla_labels[i]//int(code.l*2),code.x_ancilla_labels[i]%int(code.l*2), 0])
-    loop_body_circuit.append("M", code.z_ancilla_labels)
-    for i in range(int(code.n/2)):
-        loop_body_circuit.append("DETECTOR", [stim.target_rec(-int(code.n/2)+i), stim.target_rec(-int(code.n*2+code.n/2)+i)], [code.z_ancilla_labels[i]//int(code.l*2),code.z_ancilla_labels[i]%int(code.l*2), 0])
-    
-    loop_body_circuit.append("TICK")
-
-    
-    # adding loop body circuit to the main circuit
-    circuit.append(stim.CircuitRepeatBlock(
-    body=loop_body_circuit,
-    repeat_count=sround))
-
-    # final measurements and detector setting
-    circuit.append("M", code.data_qubits_set)
-
-    for i in code.z_ancilla_labels:
-        ii = code.z_ancilla_labels.index(i)
-        data_qubits_stb = [value for (key1, key2), value in code.z_stabilizers.items() if key1 == i]
-        circuit.append("DETECTOR", [stim.target_rec(-int(code.n*3/2)+ii), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[0])), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[1])), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[2])), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[3])), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[4])), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[5]))], [code.z_ancilla_labels[ii]//int(code.l*2),code.z_ancilla_labels[ii]%int(code.l*2), 1])
-
-
-
-    # adding observable measurement to the circuit
-    for i in range(code.k):
-        logical_ops = get_logical_ops_css(code.qcode.lz, code.k, code.m, code.n)
-        circuit.append("OBSERVABLE_INCLUDE", [stim.target_rec(code.data_qubits_set.index(idx)-code.n) for idx in logical_ops[i]], [i])
-        # print("z_random_logical: ", code.z_random_logical) 
-
-
-    return circuit
+    return gen_circ_from_cnot_layers(code, sround, x_cnot_pairs, z_cnot_pairs, x_detectors=False)
 
 
 
@@ -941,112 +547,4 @@ def gen_circ_75per_coupler(code: BBCode, sround):
 
 
 
-    circuit = stim.Circuit()
-
-    # annotate qubit coordinates
-    for i in range(2*code.l):
-        for j in range(2*code.m):
-            circuit.append("QUBIT_COORDS", code.qubit_label(i, j), [i, j])
-
-    #reset data qubits
-    circuit.append("R", code.data_qubits_set)
-    
-    # reset ancilla qubits
-    circuit.append("RX", code.x_ancilla_labels)
-    circuit.append("RX", code.z_ancilla_labels)
-
-    circuit.append("TICK")
-
-
-    for i in range(len(x_cnot_pairs)):
-        circuit.append("CNOT", x_cnot_pairs[i])
-        circuit.append("TICK")
-
-
-    circuit.append("MX", code.x_ancilla_labels)
-    circuit.append("MX", code.z_ancilla_labels)
-
-    circuit.append("TICK")
-
-    circuit.append("R", code.x_ancilla_labels)
-    circuit.append("R", code.z_ancilla_labels)
-
-    circuit.append("TICK")
-
-    for i in range(len(z_cnot_pairs)):
-        circuit.append("CNOT", z_cnot_pairs[i])
-        circuit.append("TICK")
-
-    # measure and reset stabilizers
-    circuit.append("M", code.x_ancilla_labels)
-    # for i in range(int(code.n/2)):
-    #     circuit.append("DETECTOR", stim.target_rec(-int(code.n/2)+i), [code.x_ancilla_labels[i]//int(code.l*2),code.x_ancilla_labels[i]%int(code.l*2), 0])
-    circuit.append("M", code.z_ancilla_labels)
-    for i in range(int(code.n/2)):
-        circuit.append("DETECTOR", stim.target_rec(-int(code.n/2)+i), [code.z_ancilla_labels[i]//int(code.l*2),code.z_ancilla_labels[i]%int(code.l*2), 0])
-    
-
-    circuit.append("TICK")
-
-    # define loop body circuit
-    loop_body_circuit = stim.Circuit()
-
-    loop_body_circuit.append("SHIFT_COORDS", [], [0,0,1])
-
-    loop_body_circuit.append("RX", code.x_ancilla_labels)
-    loop_body_circuit.append("RX", code.z_ancilla_labels)
-
-    loop_body_circuit.append("TICK")
-
-    for i in range(len(x_cnot_pairs)):
-        loop_body_circuit.append("CNOT", x_cnot_pairs[i])
-        loop_body_circuit.append("TICK")
-
-    # measure and reset stabilizers
-    loop_body_circuit.append("MX", code.x_ancilla_labels)
-    loop_body_circuit.append("MX", code.z_ancilla_labels)
-    # for i in range(int(code.n/2)):
-    #     loop_body_circuit.append("DETECTOR", [stim.target_rec(-int(code.n)+i), stim.target_rec(-int(code.n*3)+i)], [code.x_ancilla_labels[i]//int(code.l*2),code.x_ancilla_labels[i]%int(code.l*2), 0])
-
-    loop_body_circuit.append("R", code.x_ancilla_labels)
-    loop_body_circuit.append("R", code.z_ancilla_labels)
-
-    loop_body_circuit.append("TICK")
-
-    for i in range(len(z_cnot_pairs)):
-        loop_body_circuit.append("CNOT", z_cnot_pairs[i])
-        loop_body_circuit.append("TICK")
-
-    loop_body_circuit.append("M", code.x_ancilla_labels)
-    # for i in range(int(code.n/2)):
-    #     loop_body_circuit.append("DETECTOR", [stim.target_rec(-int(code.n/2)+i), stim.target_rec(-int(code.n*2+code.n/2)+i)], [code.x_ancilla_labels[i]//int(code.l*2),code.x_ancilla_labels[i]%int(code.l*2), 0])
-    loop_body_circuit.append("M", code.z_ancilla_labels)
-    for i in range(int(code.n/2)):
-        loop_body_circuit.append("DETECTOR", [stim.target_rec(-int(code.n/2)+i), stim.target_rec(-int(code.n*2+code.n/2)+i)], [code.z_ancilla_labels[i]//int(code.l*2),code.z_ancilla_labels[i]%int(code.l*2), 0])
-    
-    loop_body_circuit.append("TICK")
-
-    
-    # adding loop body circuit to the main circuit
-    circuit.append(stim.CircuitRepeatBlock(
-    body=loop_body_circuit,
-    repeat_count=sround))
-
-    # final measurements and detector setting
-    circuit.append("M", code.data_qubits_set)
-
-    for i in code.z_ancilla_labels:
-        ii = code.z_ancilla_labels.index(i)
-        data_qubits_stb = [value for (key1, key2), value in code.z_stabilizers.items() if key1 == i]
-        circuit.append("DETECTOR", [stim.target_rec(-int(code.n*3/2)+ii), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[0])), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[1])), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[2])), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[3])), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[4])), stim.target_rec(-int(code.n)+code.data_qubits_set.index(data_qubits_stb[5]))], [code.z_ancilla_labels[ii]//int(code.l*2),code.z_ancilla_labels[ii]%int(code.l*2), 1])
-
-
-
-    # adding observable measurement to the circuit
-    for i in range(code.k):
-        logical_ops = get_logical_ops_css(code.qcode.lz, code.k, code.m, code.n)
-        circuit.append("OBSERVABLE_INCLUDE", [stim.target_rec(code.data_qubits_set.index(idx)-code.n) for idx in logical_ops[i]], [i])
-        # print("z_random_logical: ", code.z_random_logical) 
-
-
-    return circuit
\ No newline at end of file
+    return gen_circ_from_cnot_layers(code, sround, x_cnot_pairs, z_cnot_pairs, x_detectors=False)
@@ -0,0 +1,106 @@
+import os
+import sys
+import stim
+from src.bb_code import BBCode
+from parameters.code_config import get_config
+# the detector error model cache is shared with the surface code simulations, see routing_common/dem_cache.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from routing_common.dem_cache import DemCache
+
+
+class CircuitFactory:
+    """
+    CircuitFactory memoizes the objects needed to build the circuits of a threshold sweep.
+    BBCode instances are built once per code setting, noiseless circuits once per
+    (code setting, generator, rounds) and noise plans once per (code setting, generator, rounds,
+    noise model), so a sweep over the noise strength only rewrites probabilities.
+    The detector error models handed to sinter come from the on-disk self.dem_cache.
+
+    The generators are called once per key, so a generator that draws a random coupler defect
+    (e.g. gen_circ_coupler_defect) gives the same sample for all noise strengths.
+    """
+    def __init__(self, dem_cache=None, **code_kwargs):
+        """
+        Initialize the CircuitFactory class.
+
+        Args:
+            dem_cache (DemCache): Detector error model cache (default: DemCache() in the default directory)
+            **code_kwargs: Keyword arguments of BBCode (e.g. method="random")
+        """
+        self.dem_cache = dem_cache if dem_cache is not None else DemCache()
+        self.code_kwargs = code_kwargs
+        self._codes = {}
+        self._circuits = {}
+        self._plans = {}
+
+    def code(self, code_setting) -> BBCode:
+        """
+        Get the BBCode of a standard code configuration (see parameters.code_config).
+        """
+        if code_setting not in self._codes:
+            self._codes[code_setting] = BBCode(get_config(code_setting).get_params(), **self.code_kwargs)
+        return self._codes[code_setting]
+
+    def circuit(self, code_setting, generator, rounds=None) -> stim.Circuit:
+        """
+        Get the noiseless circuit of a code.
+
+        Args:
+            code_setting (int): Code configuration ID
+            generator (function): Circuit generator with the signature of gen_circ(code, sround)
+            rounds (int): Number of syndrome rounds (default: code.qcodedz)
+
+        Returns:
+            stim.Circuit: The circuit, shared between calls (copy it before modifying it)
+        """
+        if rounds is None:
+            rounds = self.code(code_setting).qcodedz
+        key = (code_setting, generator, rounds)
+        if key not in self._circuits:
+            self._circuits[key] = generator(self.code(code_setting), rounds)
+        return self._circuits[key]
+
+    def noise_plan(self, code_setting, generator, noise_model, rounds=None):
+        """
+        Get the noise plan of a circuit, see circuit for the arguments.
+
+        Args:
+            noise_model (function or NoiseModel): Noise model with a compile method, a
+                routing_common.noise.NoiseModel (e.g. noise_model.noise_model.SI1000) or one of its
+                functions (e.g. noise_model.noise_model.si1000_noise_model)
+
+        Returns:
+            NoiseTemplate: An object whose circuit(probability) gives the noisy circuit
+        """
+        if rounds is None:
+            rounds = self.code(code_setting).qcodedz
+        key = (code_setting, generator, rounds, noise_model)
+        if key not in self._plans:
+            circuit = self.circuit(code_setting, generator, rounds)
+            self._plans[key] = noise_model.compile(circuit, self.code(code_setting).full_qubit_set)
+        return self._plans[key]
+
+    def noisy_circuit(self, code_setting, generator, noise_model, probability, rounds=None) -> stim.Circuit:
+        """
+        Get a noisy circuit, the same as noise_model(circuit, code.full_qubit_set, probability).
+
+        Args:
+            code_setting (int): Code configuration ID
+            generator (function): Circuit generator with the signature of gen_circ(code, sround)
+            noise_model (function or NoiseModel): Noise model, see noise_plan
+            probability (float): Base error probability of the noise model
+            rounds (int): Number of syndrome rounds (default: code.qcodedz)
+
+        Returns:
+            stim.Circuit: The noisy circuit
+        """
+        return self.noise_plan(code_setting, generator, noise_model, rounds).circuit(probability)
+
+    def detector_error_model(self, code_setting, generator, noise_model, probability, rounds=None) -> stim.DetectorErrorModel:
+        """
+        Get the detector error model sinter uses for a noisy circuit (see noisy_circuit for the
+        arguments), from the detector error model cache if possible. Pass it to
+        sinter.Task(detector_error_model=...) so that the sinter workers do not rebuild it.
+        """
+        circuit = self.noisy_circuit(code_setting, generator, noise_model, probability, rounds)
+        return self.dem_cache.sinter_detector_error_model(circuit)
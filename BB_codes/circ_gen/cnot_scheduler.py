@@ -0,0 +1,151 @@
+import itertools
+import numpy as np
+import stim
+from src.bb_code import BBCode
+from circ_gen.circ_gen import gen_circ, gen_circ_only_z_detectors, SERIAL_SCHEDULE
+
+
+"""
+Interleaved X/Z CNOT schedules for the syndrome rounds of gen_circ.
+
+gen_circ applies the six CNOT terms of the X stabilizers and then the six terms of the Z stabilizers,
+12 layers per round. The schedules searched here are translation invariant like the code: the j-th
+CNOT of every X stabilizer is in layer tx[j] and the j-th CNOT of every Z stabilizer in layer tz[j].
+A schedule is valid if
+  - no qubit is in two CNOTs of a layer: an X and a Z term share a layer only if they act on
+    disjoint data qubits,
+  - every X stabilizer commutes through the round with every Z stabilizer: of the data qubits they
+    share, an even number is reached by the X stabilizer first,
+  - the hook errors are those of gen_circ: every stabilizer applies its terms in one of term_orders,
+    by default in the order of gen_circ or reversed (an ancilla fault then spreads to a prefix
+    instead of a suffix of the stabilizer, the same error up to the stabilizer).
+The space of such schedules is small, so it is searched exhaustively by increasing number of layers,
+and a schedule is only accepted if stim builds the detector error model of its circuit.
+"""
+
+
+# term orders with the hook errors of SERIAL_SCHEDULE
+HOOK_PRESERVING_ORDERS = (tuple(range(6)), tuple(reversed(range(6))))
+
+
+def _term_conflicts(code: BBCode):
+    """
+    Get conflicts[j, k]: the j-th terms of the X stabilizers and the k-th terms of the Z stabilizers share a data qubit.
+    """
+    return np.array([[np.isin(code.x_stabilizer_table[:, j], code.z_stabilizer_table[:, k]).any()
+                      for k in range(6)] for j in range(6)])
+
+
+def _overlap_patterns(code: BBCode):
+    """
+    Get the distinct overlaps of an X and a Z stabilizer, as tuples of the term pairs (j, k) of their
+    shared data qubits (the j-th term of the X stabilizer and the k-th term of the Z stabilizer).
+    """
+    z_terms = {}
+    for r, row in enumerate(code.z_stabilizer_table.tolist()):
+        for k, q in enumerate(row):
+            z_terms.setdefault(q, []).append((r, k))
+    overlaps = {}
+    for rx, row in enumerate(code.x_stabilizer_table.tolist()):
+        for j, q in enumerate(row):
+            for rz, k in z_terms.get(q, []):
+                overlaps.setdefault((rx, rz), []).append((j, k))
+    return set(tuple(sorted(pairs)) for pairs in overlaps.values())
+
+
+def schedule_from_times(tx, tz):
+    """
+    Get the CNOT layers of gen_circ(schedule=...) from the layers tx[j] and tz[j] of the j-th X and Z terms.
+    """
+    layers = [[] for _ in range(max(max(tx), max(tz)) + 1)]
+    for j, t in enumerate(tx):
+        layers[t].append((0, j))
+    for j, t in enumerate(tz):
+        layers[t].append((1, j))
+    return layers
+
+
+def interleaved_schedules(code: BBCode, max_layers=12, term_orders=HOOK_PRESERVING_ORDERS):
+    """
+    Enumerate the valid translation invariant schedules (see the module docstring) by increasing
+    number of layers. The checks are combinatorial only, see validate_schedule for the stim check.
+
+    Args:
+        code (BBCode): The code
+        max_layers (int): Largest number of layers, 12 includes SERIAL_SCHEDULE
+        term_orders (tuple): Allowed orders of the six terms of a stabilizer
+
+    Yields:
+        list: CNOT layers, see gen_circ
+    """
+    conflicts = _term_conflicts(code)
+    patterns = _overlap_patterns(code)
+    for depth in range(6, max_layers + 1):
+        for x_order, z_order in itertools.product(term_orders, repeat=2):
+            for x_layers in itertools.combinations(range(depth), 6):
+                tx = [0] * 6
+                for j, t in zip(x_order, x_layers):
+                    tx[j] = t
+                for z_layers in itertools.combinations(range(depth), 6):
+                    tz = [0] * 6
+                    for k, t in zip(z_order, z_layers):
+                        tz[k] = t
+                    if any(conflicts[j, k] for j in range(6) for k in range(6) if tx[j] == tz[k]):
+                        continue
+                    if any(sum(tx[j] < tz[k] for j, k in pattern) % 2 for pattern in patterns):
+                        continue
+                    yield schedule_from_times(tx, tz)
+
+
+def validate_schedule(code: BBCode, schedule):
+    """
+    Check a schedule against stim: the detector error model of its circuit can only be built if all
+    detectors and observables are deterministic.
+
+    Raises:
+        ValueError: If stim rejects the circuit
+    """
+    gen_circ(code, 1, schedule=schedule).detector_error_model()
+
+
+# schedules found by find_cnot_schedule, by stabilizer tables and search options
+_schedule_cache = {}
+
+
+def find_cnot_schedule(code: BBCode, max_layers=12, term_orders=HOOK_PRESERVING_ORDERS, validate=True):
+    """
+    Find the valid schedule with the fewest CNOT layers (see interleaved_schedules for the arguments),
+    checked against stim if validate.
+
+    Returns:
+        list: CNOT layers, see gen_circ (SERIAL_SCHEDULE if no shorter schedule is found)
+    """
+    key = (code.x_stabilizer_table.tobytes(), code.z_stabilizer_table.tobytes(), max_layers, tuple(term_orders), validate)
+    if key not in _schedule_cache:
+        schedule = SERIAL_SCHEDULE
+        for candidate in interleaved_schedules(code, max_layers, term_orders):
+            if len(candidate) >= len(SERIAL_SCHEDULE):
+                break
+            if validate:
+                try:
+                    validate_schedule(code, candidate)
+                except ValueError:
+                    continue
+            schedule = candidate
+            break
+        _schedule_cache[key] = schedule
+    return _schedule_cache[key]
+
+
+def gen_circ_interleaved(code: BBCode, sround):
+    """
+    gen_circ with the CNOT schedule of find_cnot_schedule.
+    """
+    return gen_circ(code, sround, schedule=find_cnot_schedule(code))
+
+
+def gen_circ_interleaved_only_z_detectors(code: BBCode, sround):
+    """
+    gen_circ_only_z_detectors with the CNOT schedule of find_cnot_schedule.
+    """
+    return gen_circ_only_z_detectors(code, sround, schedule=find_cnot_schedule(code))
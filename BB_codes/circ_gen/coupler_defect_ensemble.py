@@ -0,0 +1,155 @@
+import os
+import sys
+import hashlib
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import sinter
+import stim
+from src.bb_code import BBCode
+from circ_gen.circ_gen_coupler_de import sample_coupler_dropout_flags, gen_circ_from_dropout_flags
+# the detector error model cache is shared with the surface code simulations, see routing_common/dem_cache.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from routing_common.dem_cache import DemCache
+
+
+"""
+Monte Carlo ensembles of random coupler defect patterns.
+
+gen_circ_coupler_defect draws its pattern from the module-global generator of
+src.coupler_dropout_methods, so a process sees one fixed sequence of patterns that depends on the
+calls made before. Here every sample draws its pattern from its own child of one SeedSequence, so
+the ensemble is reproducible from a single seed and independent of the process and of the order in
+which the samples are built. The circuits are built in parallel, and the sinter tasks of a sample
+carry the hash of its pattern in their metadata, so logical error rates can be averaged over the
+fabrication variability (or grouped by pattern, identical patterns share a hash).
+"""
+
+
+@dataclass
+class CouplerDefectSample:
+    """
+    One sample of a coupler defect ensemble.
+
+    Attributes:
+        index (int): Index of the sample in the ensemble
+        pattern_hash (str): Hash of the dropout flags, see coupler_pattern_hash
+        z_flags (np.ndarray): Dropout flag of every Z stabilizer, in the order of code.z_ancilla_labels
+        x_flags (np.ndarray): Dropout flag of every X stabilizer, in the order of code.x_ancilla_labels
+        circuit (stim.Circuit): The noiseless circuit of the pattern
+    """
+    index: int
+    pattern_hash: str
+    z_flags: np.ndarray
+    x_flags: np.ndarray
+    circuit: stim.Circuit
+
+
+def coupler_pattern_hash(z_flags, x_flags):
+    """
+    Get a short hash of a coupler defect pattern given by its dropout flags.
+    """
+    hasher = hashlib.sha256()
+    hasher.update(np.asarray(z_flags, dtype=np.int8).tobytes())
+    hasher.update(b"|")
+    hasher.update(np.asarray(x_flags, dtype=np.int8).tobytes())
+    return hasher.hexdigest()[:16]
+
+
+def sample_coupler_defect_flags(code: BBCode, error_rate, seed_sequence):
+    """
+    Draw a random coupler defect pattern (see sample_coupler_dropout_flags) from its own generator.
+
+    Args:
+        code (BBCode): The code
+        error_rate (float): Dropout probability of every stabilizer (1 means 1/4 coupler dropout)
+        seed_sequence (np.random.SeedSequence): Seed of the sample
+
+    Returns:
+        tuple: (z_flags, x_flags), see coupler_dropout_flags
+    """
+    return sample_coupler_dropout_flags(code, error_rate, rng=np.random.default_rng(seed_sequence))
+
+
+# code of a worker process of gen_coupler_defect_ensemble
+_worker_code = None
+
+
+def _init_ensemble_worker(code_params, code_kwargs):
+    """
+    Initializer of the worker processes, BBCode instances cannot be pickled so every worker builds its own.
+    """
+    global _worker_code
+    _worker_code = BBCode(code_params, **code_kwargs)
+
+
+def _build_sample(args):
+    """
+    Helper function for multiprocessing that draws the pattern of one sample and builds its circuit.
+    """
+    index, sround, error_rate, seed_sequence = args
+    z_flags, x_flags = sample_coupler_defect_flags(_worker_code, error_rate, seed_sequence)
+    circuit = gen_circ_from_dropout_flags(_worker_code, sround, z_flags, x_flags)
+    return CouplerDefectSample(index, coupler_pattern_hash(z_flags, x_flags), z_flags, x_flags, circuit)
+
+
+def gen_coupler_defect_ensemble(code_params, num_samples, sround=None, error_rate=1, seed=None, num_workers=None, **code_kwargs):
+    """
+    Build the circuits of num_samples independent random coupler defect patterns.
+
+    Args:
+        code_params (list): Parameters [l, m, a, b, c, d] of the BB code, e.g. get_config(5).get_params()
+        num_samples (int): Number of samples
+        sround (int): Number of syndrome rounds (default: code.qcodedz)
+        error_rate (float): Dropout probability of every stabilizer (1 means 1/4 coupler dropout)
+        seed (int): Seed of the root SeedSequence, sample i uses its i-th child (default: fresh entropy)
+        num_workers (int): Number of worker processes (default: number of CPU cores)
+        **code_kwargs: Keyword arguments of BBCode (e.g. method="random")
+
+    Returns:
+        list: CouplerDefectSample of every sample
+    """
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    if sround is None:
+        sround = BBCode(code_params, **code_kwargs).qcodedz
+    seed_sequences = np.random.SeedSequence(seed).spawn(num_samples)
+    args_list = [(i, sround, error_rate, s) for i, s in enumerate(seed_sequences)]
+
+    if num_workers == 1 or num_samples <= 1:
+        _init_ensemble_worker(code_params, code_kwargs)
+        return [_build_sample(args) for args in args_list]
+    with ProcessPoolExecutor(max_workers=min(num_workers, num_samples), initializer=_init_ensemble_worker,
+                             initargs=(code_params, code_kwargs)) as executor:
+        return list(executor.map(_build_sample, args_list, chunksize=max(1, num_samples // (4 * num_workers))))
+
+
+def coupler_defect_ensemble_tasks(code: BBCode, samples, noise_model, probabilities, json_metadata=None, dem_cache=None):
+    """
+    Get the sinter tasks of an ensemble for a sweep over the noise strength, with the detector error
+    models from the on-disk cache.
+
+    Args:
+        code (BBCode): The code of the samples
+        samples (list): CouplerDefectSample of every sample, see gen_coupler_defect_ensemble
+        noise_model (function or NoiseModel): Noise model, see CircuitFactory.noise_plan
+        probabilities (list): Base error probabilities of the noise model
+        json_metadata (dict): Metadata shared by all tasks (e.g. {'code': 5, 'r': code.qcodedz})
+        dem_cache (DemCache): Detector error model cache (default: DemCache())
+
+    Returns:
+        list: sinter.Task for every sample and probability, with 'sample', 'pattern' and 'p' in json_metadata
+    """
+    if dem_cache is None:
+        dem_cache = DemCache()
+    tasks = []
+    for sample in samples:
+        plan = noise_model.compile(sample.circuit, code.full_qubit_set)
+        for p in probabilities:
+            circuit = plan.circuit(p)
+            tasks.append(sinter.Task(
+                circuit=circuit,
+                detector_error_model=dem_cache.sinter_detector_error_model(circuit),
+                json_metadata={**(json_metadata or {}), 'sample': sample.index, 'pattern': sample.pattern_hash, 'p': p},
+            ))
+    return tasks
@@ -0,0 +1,390 @@
+import numpy as np
+import stim
+from src.bb_code import BBCode
+from circ_gen.circ_gen_coupler_de import gen_circ_from_cnot_layers
+
+
+"""
+CNOT schedules synthesized from a per-coupler availability mask.
+
+A coupler connects an ancilla to one data qubit of its stabilizer. The availability of the couplers
+is given by two boolean masks z_mask and x_mask with the shape of code.z_stabilizer_table and
+code.x_stabilizer_table: z_mask[r, k] tells if the coupler between the Z ancilla
+code.z_ancilla_labels[r] and the data qubit code.z_stabilizer_table[r, k] works (same for X).
+
+A broken coupler between an ancilla a and a data qubit d is bridged like in DEFECT_Z_SCHEDULE and
+DEFECT_X_SCHEDULE of circ_gen_coupler_de: through a partner p, an ancilla of the other type which is
+idle during the measurement, and a helper h, another data qubit of the stabilizer of a. For a Z
+stabilizer the five CNOTs are d->p, p->h, h->a, p->h, d->p (the controls and targets are swapped for
+an X stabilizer), so a sees the parity of d and h and p and h are restored. The couplers p-d, p-h and
+a-h have to work, and the three CNOTs on h are consecutive layers. Any ancilla of the other type
+whose stabilizer contains d and h can be the partner; code.corresponding_x_ancillas (or _z_) and
+their _50per variants are tried first.
+
+The remaining CNOTs between ancillas and data qubits commute, so the layers of a measurement are an
+edge coloring of the bipartite ancilla-data graph. The bridges are placed first, the direct CNOTs are
+then colored with alternating path (Kempe chain) swaps around the layers the bridges occupy. The
+number of layers starts at a lower bound (the largest number of CNOT slots on one qubit, which is
+reached without broken couplers by Konig's theorem) and grows until a coloring is found.
+"""
+
+
+def full_coupler_availability(code: BBCode):
+    """
+    Get the availability masks (z_mask, x_mask) of a device where all couplers work.
+    """
+    return (np.ones(code.z_stabilizer_table.shape, dtype=bool),
+            np.ones(code.x_stabilizer_table.shape, dtype=bool))
+
+
+def coupler_availability_from_flags(code: BBCode, z_flags, x_flags):
+    """
+    Get the availability masks of the coupler defect pattern given by dropout flags (see
+    circ_gen_coupler_de.coupler_dropout_flags): flag -1 breaks the coupler to elements[5] and
+    flag -2 the coupler to elements[4].
+
+    Returns:
+        tuple: (z_mask, x_mask)
+    """
+    z_mask, x_mask = full_coupler_availability(code)
+    for mask, flags in ((z_mask, np.asarray(z_flags)), (x_mask, np.asarray(x_flags))):
+        mask[flags == -1, 5] = False
+        mask[flags == -2, 4] = False
+    return z_mask, x_mask
+
+
+class _Couplers:
+    """
+    Couplers of the ancillas of one type (the measured ones, or the partners).
+    self.labels are the ancilla labels, self.table the stabilizer table and self.mask the availability
+    mask. self.by_data maps a data qubit to the ancillas with a working coupler to it.
+    """
+    def __init__(self, labels, table, mask):
+        self.labels = np.asarray(labels)
+        self.table = np.asarray(table)
+        self.mask = np.asarray(mask, dtype=bool)
+        if self.mask.shape != self.table.shape:
+            raise ValueError(f"Availability mask of shape {self.mask.shape} does not match the stabilizer table of shape {self.table.shape}")
+        self.available = set()
+        self.by_data = {}
+        for r, a in enumerate(self.labels.tolist()):
+            for d in self.table[r][self.mask[r]].tolist():
+                self.available.add((a, d))
+                self.by_data.setdefault(d, []).append(a)
+
+
+def _find_bridges(ancillas: _Couplers, partners: _Couplers, preferred_partners):
+    """
+    Choose a partner and a helper for every broken coupler of the measured ancillas.
+
+    Args:
+        ancillas (_Couplers): Couplers of the measured ancillas
+        partners (_Couplers): Couplers of the ancillas of the other type
+        preferred_partners (list): Arrays of partner labels (one per ancilla) tried first, in order
+
+    Returns:
+        tuple: (bridges, direct), bridges the tuples (a, d, h, p) and direct the (a, d) pairs measured by a direct CNOT
+    """
+    bridges = []
+    direct = []
+    # number of layers every qubit is busy in so far, used to spread the bridges over the partners and helpers
+    load = {}
+    for r, a in enumerate(ancillas.labels.tolist()):
+        for d in ancillas.table[r][ancillas.mask[r]].tolist():
+            load[a] = load.get(a, 0) + 1
+            load[d] = load.get(d, 0) + 1
+    for r, a in enumerate(ancillas.labels.tolist()):
+        support = ancillas.table[r].tolist()
+        broken = [d for d, ok in zip(support, ancillas.mask[r].tolist()) if not ok]
+        helpers = set()
+        for d in broken:
+            partner_candidates = list(dict.fromkeys(
+                [int(p[r]) for p in preferred_partners] + partners.by_data.get(d, [])))
+            candidates = [(p, h) for p in partner_candidates if (p, d) in partners.available for h in support
+                          if h != d and h not in helpers and (a, h) in ancillas.available and (p, h) in partners.available]
+            if not candidates:
+                raise ValueError(f"The broken coupler between ancilla {a} and data qubit {d} cannot be bridged")
+            # the least loaded partner and helper, in the order of preference among equals
+            i = min(range(len(candidates)),
+                    key=lambda i: (max(load.get(candidates[i][0], 0) + 5, load.get(candidates[i][1], 0) + 2), i))
+            p, h = candidates[i]
+            for q, n in ((p, 5), (h, 2), (d, 2)):
+                load[q] = load.get(q, 0) + n
+            helpers.add(h)
+            bridges.append((a, d, h, p))
+        direct.extend((a, d) for d in support if (a, d) in ancillas.available and d not in helpers)
+    return bridges, direct
+
+
+def _depth_lower_bound(bridges, direct):
+    """
+    Get the largest number of layers one qubit is busy in, the partner is busy for at least five
+    layers and the helper for three layers per bridge.
+    """
+    load = {}
+    for a, d in direct:
+        load[a] = load.get(a, 0) + 1
+        load[d] = load.get(d, 0) + 1
+    for a, d, h, p in bridges:
+        for q, n in ((a, 1), (d, 2), (h, 3), (p, 5)):
+            load[q] = load.get(q, 0) + n
+    return max(load.values(), default=0)
+
+
+class _Layering:
+    """
+    Assignment of the CNOTs of one measurement to depth layers.
+    self.blocked[q] are the layers in which a bridge uses the qubit q, self.edge_at[q] maps a layer to
+    the direct CNOT (index into self.direct) of q in that layer.
+    """
+    def __init__(self, depth, direct):
+        self.depth = depth
+        self.direct = direct
+        self.color = [None] * len(direct)
+        self.blocked = {}
+        self.edge_at = {}
+        self.gadgets = []
+
+    def is_free(self, q, layer):
+        return layer not in self.blocked.get(q, ()) and layer not in self.edge_at.get(q, {})
+
+    def place_bridge(self, bridge, order):
+        """
+        Place the five CNOTs of a bridge at the first middle layer of order that fits.
+        The partner is reserved for the whole window from the first to the last CNOT.
+        """
+        a, d, h, p = bridge
+        for t in order:
+            if not all(self.is_free(h, t + i) for i in range(3)) or not self.is_free(a, t + 1):
+                continue
+            # the partner window reaches from the latest free layer before t to the first free layer after t+2
+            first = next((s for s in range(t - 1, -1, -1) if self.is_free(d, s) and self.is_free(p, s)), None)
+            last = next((s for s in range(t + 3, self.depth) if self.is_free(d, s) and self.is_free(p, s)), None)
+            if first is None or last is None or not all(self.is_free(p, s) for s in range(first, last + 1)):
+                continue
+            self.blocked.setdefault(p, set()).update(range(first, last + 1))
+            self.blocked.setdefault(h, set()).update((t, t + 1, t + 2))
+            self.blocked.setdefault(a, set()).add(t + 1)
+            self.blocked.setdefault(d, set()).update((first, last))
+            self.gadgets.append((bridge, first, t, last))
+            return True
+        return False
+
+    def _alternating_path(self, v, alpha, beta):
+        """
+        Get the edges of the path from v whose colors alternate alpha, beta, ... and its end vertex.
+        """
+        path = []
+        q, color, other = v, alpha, beta
+        while color in self.edge_at.get(q, {}):
+            e = self.edge_at[q][color]
+            path.append(e)
+            a, d = self.direct[e]
+            q = d if q == a else a
+            color, other = other, color
+        # after the swap the end vertex holds color on its last edge
+        return path, q, color
+
+    def _clear_color(self, e):
+        a, d = self.direct[e]
+        if self.color[e] is not None:
+            del self.edge_at[a][self.color[e]]
+            del self.edge_at[d][self.color[e]]
+            self.color[e] = None
+
+    def _set_color(self, e, color):
+        a, d = self.direct[e]
+        self._clear_color(e)
+        self.color[e] = color
+        self.edge_at.setdefault(a, {})[color] = e
+        self.edge_at.setdefault(d, {})[color] = e
+
+    def color_edge(self, e):
+        """
+        Color a direct CNOT, recoloring an alternating path if needed (Konig's edge coloring).
+        """
+        u, v = self.direct[e]
+        free_u = [c for c in range(self.depth) if self.is_free(u, c)]
+        free_v = set(c for c in range(self.depth) if self.is_free(v, c))
+        for c in free_u:
+            if c in free_v:
+                self._set_color(e, c)
+                return True
+        for alpha in free_u:
+            for beta in sorted(free_v):
+                path, end, end_color = self._alternating_path(v, alpha, beta)
+                if not path:
+                    continue
+                # the end vertex takes the color its last edge is swapped to, which a bridge may block
+                if end_color in self.blocked.get(end, ()):
+                    continue
+                # free the slots of the whole path first, consecutive path edges swap their slots
+                swapped = [beta if self.color[f] == alpha else alpha for f in path]
+                for f in path:
+                    self._clear_color(f)
+                for f, color in zip(path, swapped):
+                    self._set_color(f, color)
+                self._set_color(e, alpha)
+                return True
+        return False
+
+    def layers(self, bridge_cnots, direct_cnot):
+        """
+        Get the flat [control, target, ...] list of every layer.
+
+        Args:
+            bridge_cnots (function): Maps (a, d, h, p) to the five (control, target) pairs of a bridge
+            direct_cnot (function): Maps (a, d) to the (control, target) pair of a direct CNOT
+        """
+        layers = [[] for _ in range(self.depth)]
+        for e, pair in enumerate(self.direct):
+            layers[self.color[e]].append(direct_cnot(*pair))
+        for bridge, first, t, last in self.gadgets:
+            for layer, pair in zip((first, t, t + 1, t + 2, last), bridge_cnots(*bridge)):
+                layers[layer].append(pair)
+        return [[q for pair in sorted(layer) for q in pair] for layer in layers]
+
+
+def _try_layering(depth, bridges, direct, rng):
+    """
+    Try to schedule a measurement in depth layers, the bridges and the direct CNOTs in random order if rng is given.
+    """
+    layering = _Layering(depth, direct)
+    bridge_order = list(range(len(bridges)))
+    edge_order = list(range(len(direct)))
+    middle_layers = list(range(1, depth - 3))
+    if rng is not None:
+        rng.shuffle(bridge_order)
+        rng.shuffle(edge_order)
+    for i in bridge_order:
+        order = middle_layers if rng is None else rng.permutation(middle_layers).tolist()
+        if not layering.place_bridge(bridges[i], order):
+            return None
+    for e in edge_order:
+        if not layering.color_edge(e):
+            return None
+    return layering
+
+
+def _schedule_measurement(bridges, direct, max_extra_layers, attempts, rng):
+    """
+    Find the layering with the fewest layers, starting at _depth_lower_bound.
+    """
+    lower_bound = max(_depth_lower_bound(bridges, direct), 5 if bridges else 0)
+    for depth in range(lower_bound, lower_bound + max_extra_layers + 1):
+        for attempt in range(attempts):
+            layering = _try_layering(depth, bridges, direct, None if attempt == 0 else rng)
+            if layering is not None:
+                return layering
+    raise ValueError(f"No CNOT schedule with at most {lower_bound + max_extra_layers} layers found")
+
+
+def synthesize_cnot_layers(code: BBCode, z_mask, x_mask, max_extra_layers=4, attempts=32, seed=0):
+    """
+    Synthesize the CNOT layers of the X and the Z stabilizer measurements for a coupler availability mask.
+
+    Args:
+        code (BBCode): The code
+        z_mask (np.ndarray): Availability of the couplers of the Z ancillas, shape of code.z_stabilizer_table
+        x_mask (np.ndarray): Availability of the couplers of the X ancillas, shape of code.x_stabilizer_table
+        max_extra_layers (int): Number of layers above the lower bound tried before giving up
+        attempts (int): Number of randomized placements tried per number of layers
+        seed (int): Seed of the randomized placements
+
+    Returns:
+        tuple: (x_cnot_pairs, z_cnot_pairs) in the format of gen_cnot_pairs_from_flags
+
+    Raises:
+        ValueError: If a broken coupler cannot be bridged or no schedule is found
+    """
+    rng = np.random.default_rng(seed)
+    z_couplers = _Couplers(code.z_ancilla_labels, code.z_stabilizer_table, z_mask)
+    x_couplers = _Couplers(code.x_ancilla_labels, code.x_stabilizer_table, x_mask)
+
+    # Z stabilizers: the data qubits control the CNOTs, the partners are X ancillas in |0>
+    bridges, direct = _find_bridges(z_couplers, x_couplers,
+                                    [code.corresponding_x_ancillas, code.corresponding_x_ancillas_50per])
+    z_cnot_pairs = _schedule_measurement(bridges, direct, max_extra_layers, attempts, rng).layers(
+        lambda a, d, h, p: [(d, p), (p, h), (h, a), (p, h), (d, p)],
+        lambda a, d: (d, a))
+
+    # X stabilizers: the ancillas control the CNOTs, the partners are Z ancillas in |+>
+    bridges, direct = _find_bridges(x_couplers, z_couplers,
+                                    [code.corresponding_z_ancillas, code.corresponding_z_ancillas_50per])
+    x_cnot_pairs = _schedule_measurement(bridges, direct, max_extra_layers, attempts, rng).layers(
+        lambda a, d, h, p: [(p, d), (h, p), (a, h), (h, p), (p, d)],
+        lambda a, d: (a, d))
+    return x_cnot_pairs, z_cnot_pairs
+
+
+def random_coupler_availability(code: BBCode, dropout_fraction, rng=None, columns=(4, 5)):
+    """
+    Break a fraction of the couplers in the given stabilizer table columns (by default the long
+    range couplers elements[4] and elements[5]) uniformly at random, keeping every broken coupler
+    bridgeable: the couplers are visited in random order and a coupler is only broken if the
+    pattern stays bridgeable.
+
+    Args:
+        code (BBCode): The code
+        dropout_fraction (float): Fraction of the couplers in columns to break
+        rng (np.random.Generator): Random generator (default: fresh entropy)
+        columns (tuple): Stabilizer table columns of the couplers that can break
+
+    Returns:
+        tuple: (z_mask, x_mask)
+
+    Raises:
+        ValueError: If fewer couplers than requested can be broken
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    z_mask, x_mask = full_coupler_availability(code)
+    couplers = [(mask, r, k) for mask in (z_mask, x_mask) for r in range(mask.shape[0]) for k in columns]
+    target = int(round(dropout_fraction * len(couplers)))
+    num_broken = 0
+    for i in rng.permutation(len(couplers)).tolist():
+        if num_broken == target:
+            break
+        mask, r, k = couplers[i]
+        mask[r, k] = False
+        try:
+            _find_bridges(_Couplers(code.z_ancilla_labels, code.z_stabilizer_table, z_mask),
+                          _Couplers(code.x_ancilla_labels, code.x_stabilizer_table, x_mask),
+                          [code.corresponding_x_ancillas, code.corresponding_x_ancillas_50per])
+            _find_bridges(_Couplers(code.x_ancilla_labels, code.x_stabilizer_table, x_mask),
+                          _Couplers(code.z_ancilla_labels, code.z_stabilizer_table, z_mask),
+                          [code.corresponding_z_ancillas, code.corresponding_z_ancillas_50per])
+        except ValueError:
+            mask[r, k] = True
+            continue
+        num_broken += 1
+    if num_broken < target:
+        raise ValueError(f"Only {num_broken} of the requested {target} couplers can be broken with all of them bridgeable")
+    return z_mask, x_mask
+
+
+def gen_circ_from_availability(code: BBCode, sround, z_mask, x_mask, validate=True, **schedule_options):
+    """
+    Generate the circuit of a coupler availability mask with synthesized CNOT layers, the layout of
+    the circuit is that of gen_circ_from_dropout_flags.
+
+    For a generator with the signature gen_circ(code, sround), e.g. for CircuitFactory, bind the
+    masks with functools.partial.
+
+    Args:
+        code (BBCode): The code
+        sround (int): Number of syndrome rounds
+        z_mask (np.ndarray): Availability of the couplers of the Z ancillas
+        x_mask (np.ndarray): Availability of the couplers of the X ancillas
+        validate (bool): Check that all detectors are deterministic by building the detector error model
+        **schedule_options: Keyword arguments of synthesize_cnot_layers
+
+    Returns:
+        stim.Circuit: The noiseless circuit
+    """
+    x_cnot_pairs, z_cnot_pairs = synthesize_cnot_layers(code, z_mask, x_mask, **schedule_options)
+    circuit = gen_circ_from_cnot_layers(code, sround, x_cnot_pairs, z_cnot_pairs)
+    if validate:
+        # raises if a detector or an observable is not deterministic
+        circuit.detector_error_model()
+    return circuit
@@ -1,5 +1,14 @@
-import numpy as np
+import os
+import sys
 import stim
+# the noise engine is shared with the surface code simulations, see routing_common/noise.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from routing_common.noise import si1000, standard_depolarizing
+
+# BB code convention: Z errors around Z-basis resets and measurements, X errors around X-basis ones
+SI1000 = si1000(z_flip='Z_ERROR', x_flip='X_ERROR')
+STANDARD_DEPOLARIZING = standard_depolarizing(z_flip='Z_ERROR', x_flip='X_ERROR')
+
 
 def standard_depolarizing_noise_model(
         circuit: stim.Circuit, 
@@ -21,53 +30,7 @@ def standard_depolarizing_noise_model(
     Returns:
         stim.Circuit: A new circuit with noise operations inserted
     """
-    n = circuit.num_qubits
-    result = stim.Circuit()
-    
-    for instruction in circuit:
-        # Handle nested repeat blocks recursively
-        if isinstance(instruction, stim.CircuitRepeatBlock):
-            result.append(stim.CircuitRepeatBlock(
-                repeat_count=instruction.repeat_count,
-                body=standard_depolarizing_noise_model(instruction.body_copy(), full_qubit_set=full_qubit_set,
-                                                        probability=probability)))
-        # Add Z errors after R gates (rotation around Z axis)
-        elif instruction.name == 'R':
-            result.append(instruction)
-            result.append('Z_ERROR', instruction.targets_copy(), probability)
-            result.append('DEPOLARIZE1', list(set(full_qubit_set) - set(instruction.targets_copy())), probability)
-        # Add X errors after RX gates (rotation around X axis)
-        elif instruction.name == 'RX':
-            result.append(instruction)
-            result.append('X_ERROR', instruction.targets_copy(), probability)
-            result.append('DEPOLARIZE1', list(set(full_qubit_set) - set(instruction.targets_copy())), probability)
-        # Add measurement errors: Z error before measurement and depolarizing after
-        elif instruction.name == 'M':
-            result.append('Z_error', instruction.targets_copy(), probability)
-            result.append(instruction)
-            result.append('Z_error', instruction.targets_copy(), probability)
-            result.append('DEPOLARIZE1', list(set(full_qubit_set) - set(instruction.targets_copy())), probability)
-        # Add two-qubit depolarizing noise after CNOT gates
-        elif instruction.name == 'CX':
-            result.append(instruction)
-            result.append('DEPOLARIZE2', instruction.targets_copy(), probability)
-            result.append('DEPOLARIZE1', list(set(full_qubit_set) - set(instruction.targets_copy())), probability)
-        # Add measurement errors for MR gates (measure and reset)
-        elif instruction.name == 'MR':
-            result.append('Z_error', instruction.targets_copy(), probability)
-            result.append(instruction)
-            result.append('Z_error', instruction.targets_copy(), probability)
-            result.append('DEPOLARIZE1', list(set(full_qubit_set) - set(instruction.targets_copy())), probability)
-        # Add measurement errors for MRX gates (measure and reset with X rotation)
-        elif instruction.name == 'MRX':
-            result.append('X_error', instruction.targets_copy(), probability)
-            result.append(instruction)
-            result.append('X_error', instruction.targets_copy(), probability)
-            result.append('DEPOLARIZE1', list(set(full_qubit_set) - set(instruction.targets_copy())), probability)
-        # Pass through other instructions unchanged
-        else:
-            result.append(instruction)
-    return result
+    return STANDARD_DEPOLARIZING.apply(circuit, full_qubit_set, probability)
 
 def si1000_noise_model(
         circuit: stim.Circuit, 
@@ -88,53 +51,11 @@ def si1000_noise_model(
     Returns:
         stim.Circuit: A new circuit with noise operations inserted
     """
-    n = circuit.num_qubits
-    result = stim.Circuit()
-    
-    for instruction in circuit:
-        # Handle nested repeat blocks recursively
-        if isinstance(instruction, stim.CircuitRepeatBlock):
-            result.append(stim.CircuitRepeatBlock(
-                repeat_count=instruction.repeat_count,
-                body=si1000_noise_model(instruction.body_copy(), full_qubit_set = full_qubit_set,
-                                                        probability=probability)))
-        # Add Z errors after R gates with double probability
-        elif instruction.name == 'R':
-            result.append(instruction)
-            result.append('Z_ERROR', instruction.targets_copy(), 2*probability)
-            result.append('DEPOLARIZE1', list(set(full_qubit_set) - set(instruction.targets_copy())), 2*probability)
-        # Add X errors after RX gates with double probability
-        elif instruction.name == 'RX':
-            result.append(instruction)
-            result.append('X_ERROR', instruction.targets_copy(), 2*probability)
-            result.append('DEPOLARIZE1', list(set(full_qubit_set) - set(instruction.targets_copy())), 2*probability)
-        # Add measurement errors with 5x probability before and 1x after
-        elif instruction.name == 'M':
-            result.append('Z_error', instruction.targets_copy(), 5*probability)
-            result.append(instruction)
-            result.append('Z_error', instruction.targets_copy(), probability)
-            result.append('DEPOLARIZE1', list(set(full_qubit_set) - set(instruction.targets_copy())), 2*probability)
-        # Add reduced depolarizing noise after CNOT gates
-        elif instruction.name == 'CX':
-            result.append(instruction)
-            result.append('DEPOLARIZE2', instruction.targets_copy(), probability)
-            result.append('DEPOLARIZE1', list(set(full_qubit_set) - set(instruction.targets_copy())), probability/10)
-        # Add measurement errors for MR gates with 5x probability before and 1x after
-        elif instruction.name == 'MR':
-            result.append('Z_error', instruction.targets_copy(), 5*probability)
-            result.append(instruction)
-            result.append('Z_error', instruction.targets_copy(), probability)
-            result.append('DEPOLARIZE1', list(set(full_qubit_set) - set(instruction.targets_copy())), 2*probability)
-        # Add measurement errors for MRX gates with 5x probability before and 1x after
-        elif instruction.name == 'MRX':
-            result.append('X_error', instruction.targets_copy(), 5*probability)
-            result.append(instruction)
-            result.append('X_error', instruction.targets_copy(), probability)
-            result.append('DEPOLARIZE1', list(set(full_qubit_set) - set(instruction.targets_copy())), 2*probability)
-        # Pass through other instructions unchanged
-        else:
-            result.append(instruction)
-    return result
+    return SI1000.apply(circuit, full_qubit_set, probability)
+
+# the circuit builders compile a circuit once and render it for every p, see routing_common.noise.NoiseTemplate
+standard_depolarizing_noise_model.compile = STANDARD_DEPOLARIZING.compile
+si1000_noise_model.compile = SI1000.compile
 
 # def with_dephasing_before_ticks(
 #         circuit: stim.Circuit, 
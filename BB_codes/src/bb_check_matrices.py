@@ -0,0 +1,90 @@
+import numpy as np
+import scipy.sparse as sp
+
+
+"""
+Sparse construction of the BB code check matrices directly from the polynomial exponents.
+
+We assume the code polynomials have form:
+A = 1 + y + x^a*y^b
+B = 1 + x + x^c*y^d
+
+A monomial x^s*y^t acts on the l*m cyclic group by shifting the row index (i, j) to the
+column index ((i+s) mod l, (j+t) mod m), so every row of A and B can be written down
+without ever forming the dense l*m x l*m shift matrices.
+"""
+
+
+def bb_polynomial_terms(poly_params):
+    """
+    Get the monomial exponents (s, t) of the polynomials A and B.
+
+    Args:
+        poly_params (list): List of polynomial parameters [a, b, c, d]
+
+    Returns:
+        tuple: (A_terms, B_terms), each a list of (x exponent, y exponent)
+    """
+    a, b, c, d = poly_params
+    A_terms = [(0, 0), (0, 1), (a, b)]
+    B_terms = [(0, 0), (1, 0), (c, d)]
+    return A_terms, B_terms
+
+
+def polynomial_shift_matrix(l, m, terms, transpose=False):
+    """
+    Build the l*m x l*m sparse matrix of a bivariate polynomial over GF(2).
+
+    Args:
+        l (int): Order of the cyclic group generated by x
+        m (int): Order of the cyclic group generated by y
+        terms (list): List of monomial exponents (s, t)
+        transpose (bool): Return the matrix of the transposed polynomial (x^-s*y^-t)
+
+    Returns:
+        scipy.sparse.csr_matrix: The polynomial matrix with entries in {0, 1}
+    """
+    sign = -1 if transpose else 1
+    rows = np.arange(l*m)
+    i, j = np.divmod(rows, m)
+
+    row_idx = []
+    col_idx = []
+    for s, t in terms:
+        row_idx.append(rows)
+        col_idx.append(((i + sign*s) % l) * m + (j + sign*t) % m)
+    row_idx = np.concatenate(row_idx)
+    col_idx = np.concatenate(col_idx)
+
+    # coinciding monomials cancel modulo 2, so sum duplicates and keep odd entries only
+    matrix = sp.coo_matrix((np.ones(len(row_idx), dtype=int), (row_idx, col_idx)), shape=(l*m, l*m)).tocsr()
+    matrix.sum_duplicates()
+    matrix.data %= 2
+    matrix.eliminate_zeros()
+    return matrix
+
+
+def bb_check_matrices(l, m, poly_params):
+    """
+    Generate the sparse check matrices of the BB code.
+
+    H_X = [A | B] and H_Z = [B^T | A^T]; each row has weight 6 unless monomials coincide.
+
+    Args:
+        l (int): First lattice dimension
+        m (int): Second lattice dimension
+        poly_params (list): List of polynomial parameters [a, b, c, d]
+
+    Returns:
+        tuple: (hx, hz) as scipy.sparse.csr_matrix
+    """
+    A_terms, B_terms = bb_polynomial_terms(poly_params)
+
+    A = polynomial_shift_matrix(l, m, A_terms)
+    B = polynomial_shift_matrix(l, m, B_terms)
+    AT = polynomial_shift_matrix(l, m, A_terms, transpose=True)
+    BT = polynomial_shift_matrix(l, m, B_terms, transpose=True)
+
+    hx = sp.hstack((A, B), format="csr")
+    hz = sp.hstack((BT, AT), format="csr")
+    return hx, hz
@@ -1,5 +1,9 @@
 import numpy as np
 from src.bb_code_parameters import logical_operator_and_distance_compute, convert_logical_layout, compute_logical_operator, get_minimal_logical_length
+from src.bb_check_matrices import bb_check_matrices
+from src.bb_code_symmetry import logical_shift_orbits, shift_support
+from src.distance_cache import DistanceCache, code_cache_key
+from src.random_distance import random_logical_operators_and_distance
 from bposd.css import css_code
 import random
 import concurrent.futures
@@ -17,7 +21,10 @@ class BBCode:
     self.n, self.k, self.d are the parameters of the code.
     self.params = [self.n, self.k, self.d]
     self.x_stabilizers, self.z_stabilizers are the dictionaries of the X and Z stabilizers.
-    self.hx, self.hz are the check matrices for the X and Z stabilizers.
+    self.x_stabilizer_table, self.z_stabilizer_table are the same stabilizers as (n/2, 6) int32 arrays, row r belongs to the r-th ancilla of self.x_ancilla_labels (self.z_ancilla_labels).
+    self.x_ancilla_index, self.z_ancilla_index map a qubit label to its row in the stabilizer tables (-1 for other qubits).
+    self.qubit_index maps a qubit label to its position in self.full_qubit_set (data qubits, then X ancillas, then Z ancillas).
+    self.hx, self.hz are the check matrices for the X and Z stabilizers (dense, built on demand from self.hx_sparse, self.hz_sparse).
     self.x_ancilla_labels, self.z_ancilla_labels are the lists of the X and Z ancilla qubits.
     self.corresponding_z_ancillas are the labels of the Z ancilla qubits that are connected to the X ancilla qubits. self.corresponding_x_ancillas are the labels of the X ancilla qubits that are connected to the Z ancilla qubits.
     self.l_data_qubits_set, self.r_data_qubits_set are the lists of the data qubits.
@@ -25,13 +32,20 @@ class BBCode:
     self.x_rel_pos, self.z_rel_pos are the relative positions of the X and Z stabilizers (according to data qubits).
     self.qcode is the CSS code structure.
     self.z_logical_operators are the Z-type logical operators.
+    self.method is the distance method, "ilp" (exact) or "random" (upper bound).
+    self.distance_cache is the on-disk cache of distances and logical operators (None if disabled).
     """
-    def __init__(self, code_params):
+    def __init__(self, code_params, use_cache=True, cache_dir=None, method="ilp", time_budget=10.0):
         """
         Initialize the BBCode class.
         
         Args:
             code_params (list): List of parameters [l, m, a, b, c, d]
+            use_cache (bool): Load and store distances and logical operators in the on-disk cache
+            cache_dir (str): Cache directory (default: see src.distance_cache)
+            method (str): Distance method, "ilp" for the exact SCIP integer program or "random" for the
+                          randomized information-set search (certified upper bound, see src.random_distance)
+            time_budget (float): Time budget in seconds of the "random" method
         """
         self.l = code_params[0]
         self.m = code_params[1]
@@ -61,33 +75,45 @@ class BBCode:
         self._z_random_logical = None
         self._x_logical_operators = None
 
+        if method not in ("ilp", "random"):
+            raise ValueError(f"Invalid distance method: {method}. Valid options are: ilp, random")
+        self.method = method
+        self.time_budget = time_budget
+
+        self.distance_cache = DistanceCache(cache_dir) if use_cache else None
+        self._cache_key = None
+
 
     def gen_check_matrices(self):
         """
         Generate check matrices for X and Z stabilizers.
-        """
-        # define cyclic shift matrices 
-        I_ell = np.identity(self.l, dtype=int)
-        I_m = np.identity(self.m, dtype=int)
-        I = np.identity(self.l*self.m, dtype=int)
-        x = {}
-        y = {}
-    
-        for i in range(self.l):
-            x[i] = np.kron(np.roll(I_ell, i, axis=1), I_m)
-        for i in range(self.m):
-            y[i] = np.kron(I_ell, np.roll(I_m, i, axis=1))
 
-        # define check matrices
-        A = (I + y[1] + np.dot(x[self.poly_params[0]%self.l], y[self.poly_params[1]%self.m])) % 2
-        B = (I + x[1] + np.dot(x[self.poly_params[2]%self.l], y[self.poly_params[3]%self.m])) % 2
-    
-        AT = np.transpose(A)
-        BT = np.transpose(B)
-    
+        The matrices are built directly from the polynomial exponents as scipy.sparse CSR
+        matrices (self.hx_sparse, self.hz_sparse). The dense self.hx, self.hz are only
+        formed on demand.
+        """
         # H_X and H_Z are the check matrices for the X and Z stabilizers
-        self.hx = np.hstack((A, B))
-        self.hz = np.hstack((BT, AT))
+        self.hx_sparse, self.hz_sparse = bb_check_matrices(self.l, self.m, self.poly_params)
+        self._hx = None
+        self._hz = None
+
+    @property
+    def hx(self):
+        """
+        Dense view of the X check matrix, built from self.hx_sparse on first access.
+        """
+        if self._hx is None:
+            self._hx = self.hx_sparse.toarray()
+        return self._hx
+
+    @property
+    def hz(self):
+        """
+        Dense view of the Z check matrix, built from self.hz_sparse on first access.
+        """
+        if self._hz is None:
+            self._hz = self.hz_sparse.toarray()
+        return self._hz
 
     def gen_k(self):
         """
@@ -227,6 +253,32 @@ class BBCode:
         ## this is a stim target andd only used for appling idling error
         self.full_qubit_set = [stim.GateTarget(index) for index in full_qubit]
 
+        self.gen_stabilizer_tables(full_qubit)
+
+    def gen_stabilizer_tables(self, full_qubit):
+        """
+        Generate array-backed views of the stabilizer dictionaries.
+
+        self.x_stabilizer_table[r, k] == self.x_stabilizers[(self.x_ancilla_labels[r], k)], so the
+        support of the stabilizer of ancilla a is self.x_stabilizer_table[self.x_ancilla_index[a]],
+        without scanning the dictionary or the list of ancilla labels (same for Z).
+
+        Args:
+            full_qubit (list): Labels of all qubits in the order of self.full_qubit_set
+        """
+        num_labels = self.lattice_rows * self.lattice_cols
+        self.x_stabilizer_table = np.array(
+            [[self.x_stabilizers[(a, k)] for k in range(6)] for a in self.x_ancilla_labels], dtype=np.int32)
+        self.z_stabilizer_table = np.array(
+            [[self.z_stabilizers[(a, k)] for k in range(6)] for a in self.z_ancilla_labels], dtype=np.int32)
+
+        self.x_ancilla_index = np.full(num_labels, -1, dtype=np.int32)
+        self.x_ancilla_index[self.x_ancilla_labels] = np.arange(len(self.x_ancilla_labels))
+        self.z_ancilla_index = np.full(num_labels, -1, dtype=np.int32)
+        self.z_ancilla_index[self.z_ancilla_labels] = np.arange(len(self.z_ancilla_labels))
+        self.qubit_index = np.full(num_labels, -1, dtype=np.int32)
+        self.qubit_index[full_qubit] = np.arange(len(full_qubit))
+
 
     # Add property getters and setters for d and z_logical_operators
     @property
@@ -279,61 +331,138 @@ class BBCode:
         """
         return [self.n, self.k, self.d]
     
-    def _compute_z_logicals_and_distance(self):
+    def _load_cached_logicals(self, kind):
         """
-        Private method to compute the minimum distance of Z-type logical operators.
-        This is called internally when d or z_logical_operators are accessed.
-        Uses multiprocessing to compute logical operators in parallel, bypassing the GIL.
+        Private method to load a distance record ("z" or "x") from the on-disk cache.
+
+        Returns:
+            dict or None: The cached record, None if caching is disabled or there is no entry
         """
-        # Initialize with maximum possible distance
+        if self.distance_cache is None:
+            return None
+        if self._cache_key is None:
+            self._cache_key = code_cache_key(self)
+        return self.distance_cache.load(self._cache_key, self._cache_kind(kind))
 
-        if self.k == 0:
-            self._d = 0
-            self._z_logical_operators = []
+    def _cache_kind(self, kind):
+        """
+        Private method to get the cache entry type, upper bounds are stored apart from exact results.
+        """
+        return kind if self.method == "ilp" else f"{kind}_{self.method}"
+
+    def _store_cached_logicals(self, kind, distance, logical_operators, status="optimal"):
+        """
+        Private method to store a distance record ("z" or "x") in the on-disk cache.
+        """
+        if self.distance_cache is None:
             return
-        self._d = self.n
-        self._z_logical_operators = [None] * self.k
-        
+        if self._cache_key is None:
+            self._cache_key = code_cache_key(self)
+        record = {
+            "params": [self.l, self.m] + [int(p) for p in self.poly_params],
+            "n": self.n,
+            "k": self.k,
+            "distance": int(distance),
+            "logical_operators": [[int(q) for q in op] for op in logical_operators],
+            "status": status,
+        }
+        self.distance_cache.store(self._cache_key, self._cache_kind(kind), record)
+
+    def _solver_status(self):
+        """
+        Private method to get the status of the distance method, stored with the cached results.
+        """
+        return "optimal" if self.method == "ilp" else "upper_bound"
+
+    def _compute_logicals(self, stab, logicals):
+        """
+        Private method to compute minimum-weight (method="ilp") or low-weight (method="random")
+        logical operators with odd overlap with each row of logicals, commuting with the rows of stab.
+
+        Returns:
+            tuple: (weights, logical_operators), one entry per row of logicals
+        """
+        if self.method == "random":
+            weights, logical_operators = random_logical_operators_and_distance(stab, logicals, time_budget=self.time_budget)
+            if None in weights:
+                raise RuntimeError("No logical operator found within the time budget")
+            return weights, logical_operators
+        return self._compute_logicals_by_orbit(stab, logicals)
+
+    def _compute_logicals_by_orbit(self, stab, logicals):
+        """
+        Private method to compute the minimum-weight logical operators with odd overlap with
+        each row of logicals, commuting with the rows of stab.
+        The rows of logicals are grouped into orbits of the l x m cyclic shift group (modulo
+        stabilizers), one ILP is solved per orbit and the other members are obtained by shifting
+        the optimal solution of the orbit representative.
+        Uses multiprocessing to solve the ILPs in parallel, bypassing the GIL.
+
+        Returns:
+            tuple: (weights, logical_operators), one entry per row of logicals
+        """
+        orbits, permutations = logical_shift_orbits(stab, logicals, self.l, self.m)
+        weights = [None] * self.k
+        logical_operators = [None] * self.k
+
         args_list = [
-            (self.hx, self.qcode.lx[i,:], self.m, self.n, i) 
-            for i in range(self.k)
+            (stab, logicals[i,:], self.m, self.n, i)
+            for i in orbits
         ]
-        
+
         # Use ProcessPoolExecutor to parallelize the computation
         # This creates separate processes that bypass the GIL
         with concurrent.futures.ProcessPoolExecutor(
-            max_workers=min(multiprocessing.cpu_count(), self.k)
+            max_workers=min(multiprocessing.cpu_count(), len(args_list))
         ) as executor:
             # Process results as they complete
-            for i, w, converted_logical in executor.map(compute_logical_operator, args_list):
-                self._d = min(self._d, w)
-                self._z_logical_operators[i] = converted_logical
-
+            for i, w, logical in executor.map(compute_logical_operator, args_list):
+                for j, g in orbits[i].items():
+                    weights[j] = w
+                    logical_operators[j] = shift_support(logical, permutations[g])
+        return weights, logical_operators
 
-    def _compute_x_logicals(self):
+    def _compute_z_logicals_and_distance(self):
         """
         Private method to compute the minimum distance of Z-type logical operators.
         This is called internally when d or z_logical_operators are accessed.
-        Uses multiprocessing to compute logical operators in parallel, bypassing the GIL.
+        Results are read from / written to the on-disk cache when it is enabled.
+        With method="ilp", only one ILP is solved per translation orbit of the X logicals (see _compute_logicals_by_orbit).
         """
-        # Initialize with maximum possible distance
-        # self._d = self.n
-        self._x_logical_operators = [None] * self.k
-        
-        args_list = [
-            (self.hz, self.qcode.lz[i,:], self.m, self.n, i) 
-            for i in range(self.k)
-        ]
-        
-        # Use ProcessPoolExecutor to parallelize the computation
-        # This creates separate processes that bypass the GIL
-        with concurrent.futures.ProcessPoolExecutor(
-            max_workers=min(multiprocessing.cpu_count(), self.k)
-        ) as executor:
-            # Process results as they complete
-            for i, w, converted_logical in executor.map(compute_logical_operator, args_list):
-                # self._d = min(self._d, w)
-                self._x_logical_operators[i] = converted_logical
+        if self.k == 0:
+            self._d = 0
+            self._z_logical_operators = []
+            return
+
+        record = self._load_cached_logicals("z")
+        if record is not None:
+            self._d = record["distance"]
+            self._z_logical_operators = record["logical_operators"]
+            return
+
+        weights, self._z_logical_operators = self._compute_logicals(self.hx, self.qcode.lx)
+        self._d = min(weights)
+        self._store_cached_logicals("z", self._d, self._z_logical_operators, self._solver_status())
+
+
+    def _compute_x_logicals(self):
+        """
+        Private method to compute the minimum-weight X-type logical operators.
+        This is called internally when x_logical_operators is accessed.
+        Results are read from / written to the on-disk cache when it is enabled.
+        With method="ilp", only one ILP is solved per translation orbit of the Z logicals (see _compute_logicals_by_orbit).
+        """
+        if self.k == 0:
+            self._x_logical_operators = []
+            return
+
+        record = self._load_cached_logicals("x")
+        if record is not None:
+            self._x_logical_operators = record["logical_operators"]
+            return
+
+        weights, self._x_logical_operators = self._compute_logicals(self.hz, self.qcode.lz)
+        self._store_cached_logicals("x", min(weights), self._x_logical_operators, self._solver_status())
 
     @property
     def z_random_logical(self):
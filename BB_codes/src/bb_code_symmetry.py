@@ -0,0 +1,91 @@
+import numpy as np
+from src.gf2 import row_basis, reduce_modulo_rowspace
+
+
+"""
+Translation symmetry of BB codes.
+
+A BB code is invariant under the l x m cyclic shift group: the shift x^s*y^t maps the qubit
+(block, i, j) to (block, i+s mod l, j+t mod m) in both the left and the right block, and
+permutes the rows of hx and hz among themselves. If a logical operator is a shift of
+another one modulo stabilizers, the minimum-weight logical operator with odd overlap with
+it is the same shift of the minimum-weight logical operator of the other, so only one
+integer program has to be solved per shift orbit.
+"""
+
+
+def translation_permutations(l, m):
+    """
+    Get the qubit permutations of all l*m cyclic shifts.
+
+    Args:
+        l (int): Order of the cyclic group generated by x
+        m (int): Order of the cyclic group generated by y
+
+    Returns:
+        np.ndarray: Array of shape (l*m, 2*l*m), row s*m+t maps qubit q to the qubit x^s*y^t q
+    """
+    q = np.arange(2*l*m)
+    block, r = np.divmod(q, l*m)
+    i, j = np.divmod(r, m)
+    s, t = np.divmod(np.arange(l*m), m)
+    return block*l*m + ((i[None, :] + s[:, None]) % l)*m + (j[None, :] + t[:, None]) % m
+
+
+def logical_shift_orbits(stab, logicals, l, m):
+    """
+    Group logical operators into orbits of the translation group modulo stabilizers.
+
+    Args:
+        stab (np.ndarray): Stabilizer check matrix of the same type as the logicals (e.g. hx for qcode.lx)
+        logicals (np.ndarray or sparse matrix): Logical operators, one per row
+        l (int): code.l
+        m (int): code.m
+
+    Returns:
+        tuple: (orbits, permutations), orbits is a dictionary mapping each orbit representative
+               to a dictionary {member index: shift index}, the representative itself is
+               included with shift index 0. permutations is the output of translation_permutations.
+    """
+    if hasattr(logicals, 'toarray'):
+        logicals = logicals.toarray()
+    logicals = np.array(logicals, dtype=np.uint8) % 2
+    reduced, pivots = row_basis(stab)
+    permutations = translation_permutations(l, m)
+
+    canonical = reduce_modulo_rowspace(logicals, reduced, pivots)
+    canonical_index = {}
+    for i, row in enumerate(canonical):
+        canonical_index.setdefault(row.tobytes(), i)
+
+    orbits = {}
+    assigned = set()
+    for i in range(len(logicals)):
+        if i in assigned:
+            continue
+        orbits[i] = {i: 0}
+        assigned.add(i)
+        # all l*m shifts of logical i, shifted[g][permutations[g][q]] = logicals[i][q]
+        shifted = np.zeros((len(permutations), logicals.shape[1]), dtype=np.uint8)
+        np.put_along_axis(shifted, permutations, logicals[i][None, :], axis=1)
+        shifted = reduce_modulo_rowspace(shifted, reduced, pivots)
+        for g, row in enumerate(shifted):
+            j = canonical_index.get(row.tobytes())
+            if j is not None and j not in assigned:
+                orbits[i][j] = g
+                assigned.add(j)
+    return orbits, permutations
+
+
+def shift_support(support, permutation):
+    """
+    Apply a translation to the support of an operator.
+
+    Args:
+        support (list): Qubit indices of the operator
+        permutation (np.ndarray): Qubit permutation of the translation
+
+    Returns:
+        list: Sorted qubit indices of the shifted operator
+    """
+    return sorted(int(permutation[q]) for q in support)
@@ -1,11 +1,11 @@
 import random
 import numpy as np
 
-# Set random seed for reproducibility
+# Set random seed for reproducibility, used when no random generator is passed to the dropout methods
 np_random = np.random.RandomState(seed=8)
 
 
-def apply_z_coupler_dropout(z_stabilizer_dict, error_rate):
+def apply_z_coupler_dropout(z_stabilizer_dict, error_rate, rng=None):
     """
     Apply dropout to stabilizers based on an error rate.
     For each stabilizer, randomly delete one of the last two elements with probability given by error_rate.
@@ -13,6 +13,7 @@ def apply_z_coupler_dropout(z_stabilizer_dict, error_rate):
     Args:
         z_stabilizer_dict (dict): Dictionary with keys in format (a,) and values as lists of length 6
         error_rate (float): Probability (between 0 and 1) of applying the dropout
+        rng (np.random.Generator or np.random.RandomState): Random generator (default: the module-global np_random)
         
     Returns:
         dict: Dictionary with a new key (a,b) where b is the index of the removed element, if b=0 then the element is not removed
@@ -22,6 +23,8 @@ def apply_z_coupler_dropout(z_stabilizer_dict, error_rate):
         Output might be: {(12,-1): [0, 13, 24, 23, 93], (14,-2): [2, 15, 26, 13, 200]}
         (element 198 was removed from first stabilizer and 95 from second)
     """
+    if rng is None:
+        rng = np_random
     result_dict = {}
     
     for key, elements in z_stabilizer_dict.items():
@@ -30,9 +33,9 @@ def apply_z_coupler_dropout(z_stabilizer_dict, error_rate):
         new_elements = elements.copy()
         
         # Apply dropout with probability error_rate
-        if np_random.random() < error_rate:
+        if rng.random() < error_rate:
             # Decide which of the last two elements to remove (either -1 or -2 index)
-            index_to_remove = np_random.choice([-1, -2])
+            index_to_remove = rng.choice([-1, -2])
             # Remove the element at that index
             # del new_elements[index_to_remove]
             new_key = (key, index_to_remove)
@@ -50,18 +53,24 @@ def apply_z_coupler_dropout(z_stabilizer_dict, error_rate):
     return result_dict, keys_with_defect
 
 
-def apply_x_coupler_dropout(x_stabilizer_dict, z_keys_with_defect,x_ancilla_labels,corresponding_z_ancilla, error_rate):
+def apply_x_coupler_dropout(x_stabilizer_dict, z_keys_with_defect,x_ancilla_labels,corresponding_z_ancilla, error_rate, rng=None):
     """
     Apply dropout to stabilizers based on an error rate.
     For each x stabilizer, randomly delete one of the last two elements with probability given by error_rate.
     
     Notice that if the corresponding z stabilizer is already deleted, then the x stabilizer will not be deleted, other wise we can not design stabilizer measurement circuit.
+
+    The random numbers are drawn from rng (default: the module-global np_random), see apply_z_coupler_dropout.
     """
+    if rng is None:
+        rng = np_random
     result_dict = {}
+    x_ancilla_index = {a: i for i, a in enumerate(x_ancilla_labels)}
+    z_keys_with_defect = set(z_keys_with_defect)
     
     for key, elements in x_stabilizer_dict.items():
         # get the corresponding z stabilizer
-        corr_key = corresponding_z_ancilla[x_ancilla_labels.index(key)]
+        corr_key = corresponding_z_ancilla[x_ancilla_index[key]]
         # check if the corresponding z stabilizer has defect
         if corr_key not in z_keys_with_defect:
 
@@ -69,9 +78,9 @@ def apply_x_coupler_dropout(x_stabilizer_dict, z_keys_with_defect,x_ancilla_labe
             new_elements = elements.copy()
         
             # Apply dropout with probability error_rate
-            if np_random.random() < error_rate:
+            if rng.random() < error_rate:
                 # Decide which of the last two elements to remove (either -1 or -2 index)
-                index_to_remove = np_random.choice([-1, -2])
+                index_to_remove = rng.choice([-1, -2])
                 # Remove the element at that index
                 # del new_elements[index_to_remove]
                 new_key = (key, index_to_remove)
@@ -92,6 +101,42 @@ def apply_x_coupler_dropout(x_stabilizer_dict, z_keys_with_defect,x_ancilla_labe
     return result_dict, keys_with_defect   
 
 
+def coupler_dropout_flag_arrays(num_z_stabilizers, x_partner_index, error_rate, size=None, rng=None):
+    """
+    Vectorized apply_z_coupler_dropout and apply_x_coupler_dropout: draw the dropout flags of all
+    stabilizers of one or many patterns at once.
+
+    Every stabilizer is hit with probability error_rate, and the broken coupler is the one to the
+    last (-1) or the second to last (-2) data qubit with equal probability; both decisions come from
+    a single uniform number u (-1 if u < error_rate/2, -2 if u < error_rate). An X stabilizer whose
+    corresponding Z stabilizer is hit keeps all its couplers.
+
+    Args:
+        num_z_stabilizers (int): Number of Z stabilizers
+        x_partner_index (np.ndarray): x_partner_index[i] is the index of the Z stabilizer corresponding to X stabilizer i
+        error_rate (float): Probability (between 0 and 1) of applying the dropout
+        size (int): Number of patterns (default: a single pattern)
+        rng (np.random.Generator): Random generator (default: a new generator with fresh entropy)
+
+    Returns:
+        tuple: (z_flags, x_flags), int8 arrays of flags 0, -1 or -2 with shape (size, number of stabilizers),
+               or one-dimensional for a single pattern
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    x_partner_index = np.asarray(x_partner_index, dtype=np.intp)
+    num_patterns = 1 if size is None else size
+    u = rng.random((num_patterns, num_z_stabilizers + len(x_partner_index)))
+    flags = np.zeros(u.shape, dtype=np.int8)
+    flags[u < error_rate] = -2
+    flags[u < error_rate / 2] = -1
+    z_flags, x_flags = np.ascontiguousarray(flags[:, :num_z_stabilizers]), np.ascontiguousarray(flags[:, num_z_stabilizers:])
+    x_flags[z_flags[:, x_partner_index] != 0] = 0
+    if size is None:
+        return z_flags[0], x_flags[0]
+    return z_flags, x_flags
+
+
 def apply_z_coupler_dropout_fixed(z_stabilizer_dict):
     """
     Apply dropout to stabilizers based on an error rate.
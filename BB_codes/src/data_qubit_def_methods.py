@@ -4,10 +4,16 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import random
 from src.bb_code import BBCode
+from src import gf2
 import numpy as np
-from qiskit.result.distributions import probability
 from src.bb_code_parameters import transform_dictionary, get_logical_ops_css
 from parameters.code_config import get_config
+try:
+    from pyscipopt import Model, quicksum
+except ImportError:
+    print("Error importing pyscipopt. Please run this script in the 'scipopt' conda environment.")
+    print("Use: conda activate scipopt")
+    sys.exit(1)
 
 # Set random seed for reproducibility
 np_random = np.random.RandomState(seed=8)
@@ -21,29 +27,24 @@ def binary_matrix_rank(M):
     Returns:
         int: Rank over GF(2).
     """
-    M = M.copy() % 2
-    n_rows, n_cols = M.shape
-    rank = 0
-    row = 0
-    for col in range(n_cols):
-        pivot = None
-        for r in range(row, n_rows):
-            if M[r, col]:
-                pivot = r
-                break
-        if pivot is not None:
-            # Swap rows
-            if pivot != row:
-                M[[row, pivot]] = M[[pivot, row]]
-            # Eliminate below
-            for r in range(row + 1, n_rows):
-                if M[r, col]:
-                    M[r] ^= M[row]
-            rank += 1
-            row += 1
-        if row >= n_rows:
-            break
-    return rank
+    return gf2.rank(M)
+
+
+def stabilizer_matrix(table, num_labels):
+    """
+    Convert rows of a stabilizer table (e.g. code.x_stabilizer_table) to a binary matrix over qubit labels.
+
+    Args:
+        table (np.ndarray): Integer array of shape (rows, 6) with the qubit labels of every stabilizer
+        num_labels (int): Number of columns (code.n*2 qubit labels)
+
+    Returns:
+        np.ndarray: Binary uint8 matrix of shape (rows, num_labels)
+    """
+    table = np.asarray(table).reshape(-1, 6)
+    matrix = np.zeros((table.shape[0], num_labels), dtype=np.uint8)
+    matrix[np.arange(table.shape[0])[:, None], table] = 1
+    return matrix
 
 
 def generate_random_data_qubit_defects(code, error_rate):
@@ -123,6 +124,83 @@ def stabilizers_dq_def_check(code, defects_set):
 
 
 
+def _sparsify_meta_stabilizers(meta_stabilizers, coefficients):
+    """
+    Greedily lower the weight of a basis of meta stabilizers.
+
+    A basis vector is replaced by its sum with another basis vector whenever this lowers
+    (qubit weight, number of combined stabilizers), which keeps the span and the linear
+    independence. Every replacement lowers the total weight, so the loop terminates after
+    polynomially many sweeps.
+
+    Args:
+        meta_stabilizers (np.ndarray): Meta stabilizers, one per row
+        coefficients (np.ndarray): Row i combines the incomplete stabilizers where coefficients[i] is 1
+
+    Returns:
+        tuple: (meta_stabilizers, coefficients) of the sparsified basis
+    """
+    meta_stabilizers = meta_stabilizers.copy()
+    coefficients = coefficients.copy()
+    cost = np.stack((meta_stabilizers.sum(axis=1), coefficients.sum(axis=1)), axis=1)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(meta_stabilizers)):
+            candidates = meta_stabilizers ^ meta_stabilizers[i]
+            candidate_coefficients = coefficients ^ coefficients[i]
+            candidate_cost = np.stack((candidates.sum(axis=1), candidate_coefficients.sum(axis=1)), axis=1)
+            # lexicographic order on (qubit weight, number of combined stabilizers)
+            better = (candidate_cost[:, 0] < cost[:, 0]) | (
+                (candidate_cost[:, 0] == cost[:, 0]) & (candidate_cost[:, 1] < cost[:, 1]))
+            better[i] = False
+            for j in np.flatnonzero(better):
+                meta_stabilizers[j] = candidates[j]
+                coefficients[j] = candidate_coefficients[j]
+                cost[j] = candidate_cost[j]
+                improved = True
+    return meta_stabilizers, coefficients
+
+
+def find_meta_stabilizers(stabilizer_matrix, keys, defects_set):
+    """
+    Find a low-weight basis of the products of stabilizers that avoid all defects.
+
+    The products avoiding the defects are c @ stabilizer_matrix for the c in the kernel of the
+    stabilizer matrix restricted to the defect columns, so a basis follows from one GF(2)
+    elimination instead of an enumeration of all 2^n combinations.
+
+    Args:
+        stabilizer_matrix (np.ndarray): Binary matrix, one row per incomplete stabilizer (full support)
+        keys (list): Stabilizer index of every row
+        defects_set (list): Indices of the defect qubits
+
+    Returns:
+        tuple: (meta_stabilizers, components), lists of the linearly independent meta stabilizer
+               vectors and of the stabilizer indices combined into each of them
+    """
+    if stabilizer_matrix.size == 0:
+        return [], []
+    stabilizer_matrix = np.asarray(stabilizer_matrix, dtype=np.uint8) % 2
+    restricted = stabilizer_matrix[:, sorted(defects_set)]
+    kernel = gf2.nullspace(restricted.T)
+    if kernel.shape[0] == 0:
+        return [], []
+
+    # products of dependent stabilizers can vanish or coincide, keep an independent subset
+    products = (kernel.astype(np.int64) @ stabilizer_matrix) % 2
+    basis = gf2.IncrementalRank(stabilizer_matrix.shape[1])
+    independent = [i for i, product in enumerate(products) if basis.add(product)]
+    meta_stabilizers, coefficients = _sparsify_meta_stabilizers(
+        products[independent].astype(np.uint8), kernel[independent])
+
+    order = sorted(range(len(meta_stabilizers)),
+                   key=lambda i: (int(coefficients[i].sum()), int(meta_stabilizers[i].sum())))
+    meta_stabilizers = [meta_stabilizers[i].astype(int) for i in order]
+    components = [[keys[j] for j in np.flatnonzero(coefficients[i])] for i in order]
+    return meta_stabilizers, components
+
+
 def gen_meta_stabilizers(code, defects_set):
     """
     In this function, we generate meta stabilizers for the incomplete stabilizers.
@@ -132,100 +210,14 @@ def gen_meta_stabilizers(code, defects_set):
 
     incomplete_x_stabilizers, incomplete_z_stabilizers, stb_keys = stabilizers_dq_def_check(code, defects_set)
 
-    x_stabilizers_de_matrix = []
-    z_stabilizers_de_matrix = []
-
-    #get full stabilizers for imcomplete_x_stabilizers and incomplete_z_stabilizers
-    x_stabilizers = transform_dictionary(code.x_stabilizers)
-    z_stabilizers = transform_dictionary(code.z_stabilizers)
-    incomplete_x_stabilizers_com = {}
-    incomplete_z_stabilizers_com = {}
-    for key, element in incomplete_x_stabilizers.items():
-        incomplete_x_stabilizers_com[key] = x_stabilizers[key]
-    for key, element in incomplete_z_stabilizers.items():
-        incomplete_z_stabilizers_com[key] = z_stabilizers[key]
-    
-    # Generate matrix for incomplete_x_stabilizers
-    x_keys = list(incomplete_x_stabilizers_com.keys())
-    for key, element in incomplete_x_stabilizers_com.items():
-        row_vector = np.zeros(code.n*2)
-        for i in element:
-            row_vector[i] = 1
-        x_stabilizers_de_matrix.append(row_vector)
-    
-    # Generate matrix for incomplete_z_stabilizers
-    z_keys = list(incomplete_z_stabilizers_com.keys())
-    for key, element in incomplete_z_stabilizers_com.items():
-        row_vector = np.zeros(code.n*2)
-        for i in element:
-            row_vector[i] = 1
-        z_stabilizers_de_matrix.append(row_vector)
-    
-    x_stabilizers_de_matrix = np.array(x_stabilizers_de_matrix).astype(int)
-    z_stabilizers_de_matrix = np.array(z_stabilizers_de_matrix).astype(int)
-    
-    meta_x_stabilizers = []
-    meta_x_components = []
-    meta_z_stabilizers = []
-    meta_z_components = []
-    
-    # Process X stabilizers
-    if x_stabilizers_de_matrix.size > 0:
-        n_x = len(x_keys)
-        for weight in range(2, n_x + 1):
-            for combination in np.array(np.meshgrid(*[np.array([0, 1]) for _ in range(n_x)])).T.reshape(-1, n_x):
-                if np.sum(combination) != weight:
-                    continue
-                # Calculate the resulting meta stabilizer
-                meta_stabilizer = np.zeros(code.n*2, dtype=int)
-                for i, include in enumerate(combination):
-                    if include:
-                        meta_stabilizer = np.bitwise_xor(meta_stabilizer, x_stabilizers_de_matrix[i].astype(int))
-                # Check if this combination avoids all defects
-                valid = True
-                for defect in defects_set:
-                    if meta_stabilizer[defect] == 1:
-                        valid = False
-                        break
-                if not valid:
-                    continue
-                # Check GF(2) linear independence of meta stabilizers
-                if meta_x_stabilizers:
-                    prev = np.vstack(meta_x_stabilizers)
-                    test = np.vstack([prev, meta_stabilizer])
-                    if binary_matrix_rank(test) <= len(meta_x_stabilizers):
-                        continue
-                # Add if independent
-                components = [x_keys[i] for i in range(n_x) if combination[i] == 1]
-                meta_x_stabilizers.append(meta_stabilizer)
-                meta_x_components.append(components)
-    
-    # Process Z stabilizers (similar logic)
-    if z_stabilizers_de_matrix.size > 0:
-        n_z = len(z_keys)
-        for weight in range(2, n_z + 1):
-            for combination in np.array(np.meshgrid(*[np.array([0, 1]) for _ in range(n_z)])).T.reshape(-1, n_z):
-                if np.sum(combination) != weight:
-                    continue
-                meta_stabilizer = np.zeros(code.n*2, dtype=int)
-                for i, include in enumerate(combination):
-                    if include:
-                        meta_stabilizer = np.bitwise_xor(meta_stabilizer, z_stabilizers_de_matrix[i].astype(int))
-                valid = True
-                for defect in defects_set:
-                    if meta_stabilizer[defect] == 1:
-                        valid = False
-                        break
-                if not valid:
-                    continue
-                if meta_z_stabilizers:
-                    prev = np.vstack(meta_z_stabilizers)
-                    test = np.vstack([prev, meta_stabilizer])
-                    if binary_matrix_rank(test) <= len(meta_z_stabilizers):
-                        continue
-                components = [z_keys[i] for i in range(n_z) if combination[i] == 1]
-                meta_z_stabilizers.append(meta_stabilizer)
-                meta_z_components.append(components)
+    # Generate matrices of the full incomplete_x_stabilizers and incomplete_z_stabilizers
+    x_keys = list(incomplete_x_stabilizers.keys())
+    x_stabilizers_de_matrix = stabilizer_matrix(code.x_stabilizer_table[code.x_ancilla_index[x_keys]], code.n*2)
+    z_keys = list(incomplete_z_stabilizers.keys())
+    z_stabilizers_de_matrix = stabilizer_matrix(code.z_stabilizer_table[code.z_ancilla_index[z_keys]], code.n*2)
+
+    meta_x_stabilizers, meta_x_components = find_meta_stabilizers(x_stabilizers_de_matrix, x_keys, defects_set)
+    meta_z_stabilizers, meta_z_components = find_meta_stabilizers(z_stabilizers_de_matrix, z_keys, defects_set)
     
     print(f"\nFound {len(meta_x_stabilizers)} linearly independent meta X stabilizers:")
     for i, components in enumerate(meta_x_components):
@@ -259,70 +251,119 @@ def check_meta_stabilizers_defect_constraint(meta_stabilizers, defects_set):
     return True
 
 
-def gen_logicals_without_support_defects(code, defects_set, num_threads=10):
+def _minimum_weight_equivalent_logical(parity_checks, parities, defects_set, warm_start=None):
     """
-    Generate logical operators with defects and without support.
-    Returns a list of logical operators (as lists of qubit indices) that do not overlap with defects_set.
-    Uses multi-threading to speed up the computation.
-    
+    Find the minimum-weight operator x with parity_checks @ x = parities (mod 2) and zero support on
+    defects_set, with an integer program in the style of logical_operator_and_distance_compute.
+
+    With the rows of the dual stabilizers (parities 0) and of a basis of the dual logical operators
+    (their parities with a logical operator L), the solutions are exactly the operators equivalent to L.
+
+    Args:
+        parity_checks (np.ndarray): Binary matrix of the parity constraints
+        parities (np.ndarray): Required parity of every row of parity_checks
+        defects_set (list): Indices of the defect qubits
+        warm_start (np.ndarray): Optional feasible binary operator, used as a starting solution
+
+    Returns:
+        list: Qubit indices of the minimum-weight operator, or None if there is none
+    """
+    defects = set(int(q) for q in defects_set)
+    columns = np.flatnonzero(parity_checks.any(axis=0))
+
+    model = Model("defect_logical")
+    model.hideOutput()
+
+    # Set numerical parameters to improve stability
+    model.setRealParam('numerics/feastol', 1e-9)
+    model.setRealParam('numerics/epsilon', 1e-9)
+    model.setRealParam('numerics/sumepsilon', 1e-9)
+
+    # defect qubits must not be in the support
+    x = {q: model.addVar(vtype="B", ub=0 if q in defects else 1) for q in columns}
+    model.setObjective(quicksum(x.values()))
+
+    half = []
+    for row, parity in zip(parity_checks, parities):
+        supp = np.flatnonzero(row)
+        half.append(model.addVar(vtype="I", lb=0, ub=len(supp)))
+        model.addCons(quicksum(x[q] for q in supp) - 2 * half[-1] == int(parity))
+
+    if warm_start is not None:
+        sol = model.createSol()
+        for q in columns:
+            model.setSolVal(sol, x[q], int(warm_start[q]))
+        overlaps = parity_checks.astype(np.int64) @ warm_start.astype(np.int64)
+        for var, overlap in zip(half, overlaps):
+            model.setSolVal(sol, var, int(overlap) // 2)
+        model.addSol(sol)
+
+    model.optimize()
+    status = model.getStatus()
+    if status == "optimal":
+        return [int(q) for q in columns if model.getVal(x[q]) > 0.5]
+    elif status == "infeasible":
+        return None
+    raise RuntimeError("Problem could not be solved to optimality")
+
+
+def gen_logicals_without_support_defects(code, defects_set, minimize_weight=False):
+    """
+    Generate logical operators without support on the defects.
+
+    For every logical Z operator L of get_logical_ops_css we look for a combination s of Z
+    stabilizers such that L + s @ Z vanishes on the defects, i.e. we solve the GF(2) system
+    s @ Z[:, defects] = L[defects]. The logical operator is equivalent to L by construction, and if
+    the system is inconsistent no equivalent operator avoiding the defects exists.
+
     Args:
         code: The BB code object
         defects_set: Set of defect qubit indices
-        num_threads: Number of threads to use (default: 10)
+        minimize_weight: Also minimize the weight of every logical operator over its equivalence
+                         class with an integer program
     Returns:
-        List of logical operators without support on defects
+        List of logical operators (as lists of qubit indices) without support on defects, in the
+        order of get_logical_ops_css
+
+    Raises:
+        RuntimeError: If a logical operator has no equivalent operator avoiding the defects
     """
-    import concurrent.futures
-    from functools import partial
-    
     logical_z_ops = get_logical_ops_css(code.qcode.lz, code.k, code.m, code.n)
-    z_stabilizers = transform_dictionary(code.z_stabilizers)
-    
+    stab_matrix = stabilizer_matrix(code.z_stabilizer_table, code.n*2)
+    defects = sorted(int(q) for q in defects_set)
+
+    if minimize_weight:
+        x_stab_matrix = stabilizer_matrix(code.x_stabilizer_table, code.n*2)
+        # the operators commuting with all Z stabilizers are spanned by the X stabilizers and the
+        # X logical operators, so reducing them modulo the X stabilizers leaves the X logicals
+        data_qubits = np.array(code.data_qubits_set)
+        commuting_data = gf2.nullspace(stab_matrix[:, data_qubits])
+        commuting = np.zeros((commuting_data.shape[0], code.n*2), dtype=np.uint8)
+        commuting[:, data_qubits] = commuting_data
+        reduced, pivots = gf2.row_basis(x_stab_matrix)
+        x_logicals, _ = gf2.row_basis(gf2.reduce_modulo_rowspace(commuting, reduced, pivots))
+        parity_checks = np.vstack((x_stab_matrix, x_logicals))
+
     logicals_no_defect = []
-    
-    def process_logical(logical):
-        # Start with the original logical operator
-        logical_vec = np.zeros(code.n*2, dtype=int)
+    infeasible = []
+    for i, logical in enumerate(logical_z_ops):
+        logical_vec = np.zeros(code.n*2, dtype=np.uint8)
         logical_vec[logical] = 1
-        
-        # Build stabilizer matrix
-        stab_matrix = []
-        stab_keys = []
-        for key, qubits in z_stabilizers.items():
-            row = np.zeros(code.n*2, dtype=int)
-            row[qubits] = 1
-            stab_matrix.append(row)
-            stab_keys.append(key)
-        stab_matrix = np.array(stab_matrix, dtype=int)
-        
-        # Try all combinations of stabilizers
-        found = False
-        
-        # If there are too many stabilizers, we need to limit the search
-        max_combinations = 2**20  # Limit to prevent memory issues
-        total_combinations = 2**len(stab_matrix)
-        step = max(1, total_combinations // max_combinations)
-        
-        for i in range(0, total_combinations, step):
-            combo = np.array(list(np.binary_repr(i, width=len(stab_matrix))), dtype=int)
-            candidate = logical_vec.copy()
-            for j, use_stab in enumerate(combo):
-                if use_stab:
-                    candidate = np.bitwise_xor(candidate, stab_matrix[j])
-            # Check if candidate has support on any defect
-            if all(candidate[d] == 0 for d in defects_set):
-                return np.where(candidate == 1)[0].tolist()
-        
-        print(f"Warning: No logical operator found without support on defects for logical {logical[:5]}...")
-        return None
-    
-    # Use ThreadPoolExecutor to parallelize the computation
-    with concurrent.futures.ThreadPoolExecutor(max_workers=num_threads) as executor:
-        results = list(executor.map(process_logical, logical_z_ops))
-    
-    # Filter out None results
-    logicals_no_defect = [result for result in results if result is not None]
-    
+
+        combination = gf2.solve(stab_matrix[:, defects].T, logical_vec[defects])
+        if combination is None:
+            infeasible.append(i)
+            continue
+        candidate = (logical_vec + combination.astype(np.int64) @ stab_matrix) % 2
+        if minimize_weight:
+            parities = (parity_checks.astype(np.int64) @ logical_vec) % 2
+            logicals_no_defect.append(_minimum_weight_equivalent_logical(
+                parity_checks, parities, defects, warm_start=candidate))
+        else:
+            logicals_no_defect.append(np.flatnonzero(candidate).tolist())
+
+    if infeasible:
+        raise RuntimeError(f"No logical operator equivalent to logical Z operators {infeasible} avoids the defects {defects}")
     return logicals_no_defect
 
 
@@ -348,22 +389,16 @@ def check_logicals_no_defect(code, logicals_no_defect, defects_set):
     print("All logical operators have no support on defects ✓")
     
     # Check 2: Commutation with X stabilizers
-    # Convert X stabilizers to matrix form
-    x_stabilizers = transform_dictionary(code.x_stabilizers)
-    
     for i, logical in enumerate(logicals_no_defect):
         logical_vec = np.zeros(code.n*2, dtype=int)
         logical_vec[logical] = 1
-        
-        for key, x_stab in x_stabilizers.items():
-            x_stab_vec = np.zeros(code.n*2, dtype=int)
-            x_stab_vec[x_stab] = 1
-            
-            # Check commutation by counting overlaps (should be even for commutation)
-            overlap = np.sum(logical_vec * x_stab_vec) % 2
-            if overlap != 0:
-                print(f"Logical operator {i} does not commute with X stabilizer {key}")
-                return False
+
+        # Check commutation by counting overlaps (should be even for commutation)
+        overlaps = logical_vec[code.x_stabilizer_table].sum(axis=1) % 2
+        if np.any(overlaps):
+            key = code.x_ancilla_labels[int(np.flatnonzero(overlaps)[0])]
+            print(f"Logical operator {i} does not commute with X stabilizer {key}")
+            return False
     
     print("All logical operators commute with X stabilizers ✓")
     return True
@@ -403,7 +438,11 @@ if __name__ == "__main__":
     a, b, stb_keys = stabilizers_dq_def_check(code, defects_set)
     print("stb_keys: ", stb_keys)
 
-    logicals_no_defect = gen_logicals_without_support_defects(code, defects_set)
+    try:
+        logicals_no_defect = gen_logicals_without_support_defects(code, defects_set)
+    except RuntimeError as e:
+        print(e)
+        sys.exit(1)
     print("logicals_no_defect: ", logicals_no_defect)
 
     # After generating logicals_no_defect
@@ -0,0 +1,149 @@
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+
+
+"""
+Persistent on-disk cache for code distances and minimum-weight logical operators.
+
+Entries are content addressed: the key is a hash of the code parameters (l, m, a, b, c, d)
+together with the check matrices hx and hz, so a change in the code construction can never
+return a stale result. Each entry is a small JSON file holding the distance, the supports of
+the logical operators and the solver status.
+
+Writers first write to a temporary file in the cache directory and then atomically rename it,
+so concurrent processes never see a partially written entry (the last writer wins, and all
+writers store the same content). The total size of the cache is bounded; when it is exceeded
+the least recently used entries are deleted. Reading an entry refreshes its modification time.
+"""
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "BB_DISTANCE_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "routing_circuit", "distance"),
+)
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def _hash_sparse(hasher, matrix):
+    """
+    Feed a scipy sparse matrix into a hashlib object in a canonical way.
+    """
+    matrix = matrix.tocsr(copy=True)
+    matrix.sum_duplicates()
+    matrix.sort_indices()
+    hasher.update(np.asarray(matrix.shape, dtype=np.int64).tobytes())
+    hasher.update(np.asarray(matrix.indptr, dtype=np.int64).tobytes())
+    hasher.update(np.asarray(matrix.indices, dtype=np.int64).tobytes())
+    hasher.update((np.asarray(matrix.data) % 2).astype(np.uint8).tobytes())
+
+
+def code_cache_key(code):
+    """
+    Get the content-addressed cache key of a BB code.
+
+    Args:
+        code (BBCode): The BB code
+
+    Returns:
+        str: Hex digest of (l, m, a, b, c, d) and the check matrices hx, hz
+    """
+    hasher = hashlib.sha256()
+    params = [code.l, code.m] + [int(p) for p in code.poly_params]
+    hasher.update(json.dumps(params).encode())
+    _hash_sparse(hasher, code.hx_sparse)
+    _hash_sparse(hasher, code.hz_sparse)
+    return hasher.hexdigest()
+
+
+class DistanceCache:
+    """
+    DistanceCache stores distances and logical operators of codes in a local directory.
+    self.cache_dir is the directory of the cache, created on first write.
+    self.max_bytes is the maximum total size of the cache entries in bytes.
+    """
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Initialize the DistanceCache class.
+
+        Args:
+            cache_dir (str): Cache directory (default: $BB_DISTANCE_CACHE_DIR or ~/.cache/routing_circuit/distance)
+            max_bytes (int): Maximum total size of the cache entries in bytes
+        """
+        self.cache_dir = cache_dir if cache_dir is not None else DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+
+    def _path(self, key, kind):
+        return os.path.join(self.cache_dir, f"{key}_{kind}.json")
+
+    def load(self, key, kind):
+        """
+        Load a cache entry.
+
+        Args:
+            key (str): Code cache key (see code_cache_key)
+            kind (str): Type of the entry, e.g. "z" or "x"
+
+        Returns:
+            dict or None: The stored record, or None if there is no valid entry
+        """
+        path = self._path(key, kind)
+        try:
+            with open(path, "r") as f:
+                record = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        try:
+            # mark the entry as recently used
+            os.utime(path)
+        except OSError:
+            pass
+        return record
+
+    def store(self, key, kind, record):
+        """
+        Atomically write a cache entry and evict least recently used entries if needed.
+
+        Args:
+            key (str): Code cache key (see code_cache_key)
+            kind (str): Type of the entry, e.g. "z" or "x"
+            record (dict): JSON serializable record
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".tmp_", suffix=".json")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(record, f)
+            os.replace(tmp_path, self._path(key, kind))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """
+        Delete the least recently used entries until the cache fits into self.max_bytes.
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json") or name.startswith(".tmp_"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                # removed by a concurrent writer
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
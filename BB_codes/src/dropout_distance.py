@@ -0,0 +1,289 @@
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+try:
+    from pyscipopt import Model, quicksum
+except ImportError:
+    print("Error importing pyscipopt. Please run this script in the 'scipopt' conda environment.")
+    print("Use: conda activate scipopt")
+    import sys
+    sys.exit(1)
+
+
+"""
+Incremental distance computation for codes with dropped stabilizers.
+
+The integer program is the one of logical_operator_and_distance_compute: minimize the weight of x
+subject to stab @ x = 0 and logicOp @ x = 1 (mod 2), with binary slack variables to express the
+parity constraints. A dropout pattern only removes a few rows of stab, so instead of rebuilding the
+model for every pattern we build it once per logical operator and relax the constraints of the
+dropped rows (lhs = -inf, rhs = +inf) before each solve.
+
+Dropping rows only removes constraints, so the minimum-weight logical operators of the full code
+stay feasible for every dropout pattern, and the lightest of them gives an upper bound on the
+distance of a pattern. Within a pattern, the best weight known so far (over these operators and the
+logical operators already solved) is used as an objective limit, since only the minimum over the
+logical operators is returned. SCIP rejects starting solutions that violate the objective limit, so
+the operators of the full code are only passed to SCIP as warm starts when a logical operator is
+solved without a limit (logical_distances_with_dropout).
+"""
+
+
+class DropoutDistanceModel:
+    """
+    DropoutDistanceModel is the SCIP model for one logical operator, reusable across dropout patterns.
+    self.model is the SCIP model, self.x are the qubit variables.
+    self.stab_cons are the parity constraints of the rows of stab.
+    """
+    def __init__(self, stab, logicOp):
+        """
+        Initialize the DropoutDistanceModel class.
+
+        Args:
+            stab (np.ndarray): Binary check matrix of the full code (e.g. code.hx)
+            logicOp (np.ndarray): Binary logical operator (e.g. a row of code.qcode.lx)
+        """
+        stab = np.asarray(stab, dtype=int) % 2
+        logicOp = np.asarray(logicOp, dtype=int).ravel() % 2
+        self.stab = stab
+        self.logicOp = logicOp
+        # number of qubits
+        self.n = stab.shape[1]
+        # number of stabilizers
+        num_stab = stab.shape[0]
+
+        # how many slack variables are needed to express orthogonality constraints modulo two
+        wstab = int(np.max(np.sum(stab, axis=1)))
+        wlog = int(np.sum(logicOp))
+        self.num_anc_stab = int(np.ceil(np.log2(wstab)))
+        self.num_anc_logical = int(np.ceil(np.log2(wlog)))
+
+        self.model = Model("distance")
+        self.model.hideOutput()
+
+        # Set numerical parameters to improve stability
+        self.model.setRealParam('numerics/feastol', 1e-9)
+        self.model.setRealParam('numerics/epsilon', 1e-9)
+        self.model.setRealParam('numerics/sumepsilon', 1e-9)
+
+        self.x = [self.model.addVar(vtype="B") for i in range(self.n)]
+        self.stab_slack = [[self.model.addVar(vtype="B") for q in range(self.num_anc_stab)] for row in range(num_stab)]
+        self.logical_slack = [self.model.addVar(vtype="B") for q in range(self.num_anc_logical)]
+
+        # Set objective: minimize the weight of x
+        self.model.setObjective(quicksum(self.x))
+
+        # orthogonality to rows of stab constraints
+        self.stab_cons = []
+        for row in range(num_stab):
+            supp = np.nonzero(stab[row, :])[0]
+            self.stab_cons.append(self.model.addCons(
+                quicksum(self.x[q] for q in supp)
+                - quicksum((1 << (q + 1)) * self.stab_slack[row][q] for q in range(self.num_anc_stab)) == 0))
+
+        # odd overlap with logicOp constraint
+        supp = np.nonzero(logicOp)[0]
+        self.model.addCons(
+            quicksum(self.x[q] for q in supp)
+            - quicksum((1 << (q + 1)) * self.logical_slack[q] for q in range(self.num_anc_logical)) == 1)
+
+        self.dropped_rows = set()
+
+    def set_dropped_rows(self, dropped_rows):
+        """
+        Relax the constraints of the dropped rows and restore all other constraints.
+
+        Args:
+            dropped_rows (iterable): Indices of the rows of stab to drop
+        """
+        dropped_rows = set(int(r) for r in dropped_rows)
+        inf = self.model.infinity()
+        for row in self.dropped_rows - dropped_rows:
+            self.model.chgLhs(self.stab_cons[row], 0)
+            self.model.chgRhs(self.stab_cons[row], 0)
+        for row in dropped_rows - self.dropped_rows:
+            self.model.chgLhs(self.stab_cons[row], -inf)
+            self.model.chgRhs(self.stab_cons[row], inf)
+        self.dropped_rows = dropped_rows
+
+    def is_feasible(self, support, dropped_rows=None):
+        """
+        Check if a logical operator (list of qubit indices) is feasible for a dropout pattern
+        (default: the current dropout pattern of the model).
+        """
+        dropped_rows = self.dropped_rows if dropped_rows is None else set(int(r) for r in dropped_rows)
+        vec = np.zeros(self.n, dtype=int)
+        vec[list(support)] = 1
+        active = [row for row in range(self.stab.shape[0]) if row not in dropped_rows]
+        return not np.any(self.stab[active] @ vec % 2) and int(self.logicOp @ vec) % 2 == 1
+
+    def _add_warm_start(self, support):
+        """
+        Pass a feasible logical operator to SCIP as a starting solution.
+        """
+        vec = np.zeros(self.n, dtype=int)
+        vec[list(support)] = 1
+        sol = self.model.createSol()
+        for q in range(self.n):
+            self.model.setSolVal(sol, self.x[q], vec[q])
+        for row, slack in enumerate(self.stab_slack):
+            half_overlap = (int(self.stab[row] @ vec) // 2) if row not in self.dropped_rows else 0
+            for q in range(self.num_anc_stab):
+                self.model.setSolVal(sol, slack[q], (half_overlap >> q) & 1)
+        half_overlap = int(self.logicOp @ vec) // 2
+        for q in range(self.num_anc_logical):
+            self.model.setSolVal(sol, self.logical_slack[q], (half_overlap >> q) & 1)
+        self.model.addSol(sol)
+
+    def solve(self, dropped_rows, warm_starts=(), upper_bound=None):
+        """
+        Compute the minimum-weight logical operator for a dropout pattern.
+
+        Args:
+            dropped_rows (iterable): Indices of the rows of stab to drop
+            warm_starts (iterable): Candidate logical operators (lists of qubit indices), the feasible ones
+                lighter than upper_bound are used as starting solutions
+            upper_bound (int): Only look for logical operators of weight strictly smaller than upper_bound
+
+        Returns:
+            tuple: (weight, nonzero_positions), or (None, None) if there is no logical operator below upper_bound
+        """
+        self.model.freeTransform()
+        self.set_dropped_rows(dropped_rows)
+        for support in warm_starts:
+            # SCIP rejects starting solutions that are not below the objective limit
+            if support is None or (upper_bound is not None and len(support) >= upper_bound):
+                continue
+            if self.is_feasible(support):
+                self._add_warm_start(support)
+        if upper_bound is None:
+            self.model.setObjlimit(self.model.infinity())
+        else:
+            # the objective is integral
+            self.model.setObjlimit(upper_bound - 0.5)
+
+        self.model.optimize()
+
+        status = self.model.getStatus()
+        if status == "optimal":
+            solution = [self.model.getVal(self.x[i]) for i in range(self.n)]
+            nonzero_positions = [i for i in range(self.n) if solution[i] > 0.5]
+            return len(nonzero_positions), nonzero_positions
+        elif status == "infeasible" and upper_bound is not None:
+            return None, None
+        else:
+            raise RuntimeError("Problem could not be solved to optimality")
+
+
+def _solve_dropout_patterns(args):
+    """
+    Helper function for multiprocessing that solves a chunk of dropout patterns.
+    The models are built once per worker and reused for all patterns of the chunk.
+
+    Args:
+        args: Tuple (stab, logicals, base_logicals, patterns), base_logicals are the minimum-weight
+              logical operators of the full code, used as upper bounds
+
+    Returns:
+        list: Tuples (distance, index of the logical operator, support) for every pattern
+    """
+    stab, logicals, base_logicals, patterns = args
+    models = [DropoutDistanceModel(stab, logicals[i]) for i in range(len(logicals))]
+
+    results = []
+    for dropped_rows in patterns:
+        # the lightest feasible logical operator of the full code is an upper bound on the distance of this pattern
+        best = (None, None, None)
+        for i, model in enumerate(models):
+            support = base_logicals[i]
+            if (best[0] is None or len(support) < best[0]) and model.is_feasible(support, dropped_rows):
+                best = (len(support), i, list(support))
+
+        for i, model in enumerate(models):
+            w, support = model.solve(dropped_rows, upper_bound=best[0])
+            if w is None:
+                continue
+            best = (w, i, support)
+        results.append(best)
+    return results
+
+
+def _solve_logical(args):
+    """
+    Helper function for multiprocessing that solves one logical operator for a dropout pattern.
+
+    Args:
+        args: Tuple (stab, logicOp, dropped_rows, base_logical), base_logical is the minimum-weight
+              logical operator of the full code, used as warm start
+
+    Returns:
+        int: Distance of the logical operator
+    """
+    stab, logicOp, dropped_rows, base_logical = args
+    w, _ = DropoutDistanceModel(stab, logicOp).solve(dropped_rows, warm_starts=[base_logical])
+    return w
+
+
+def logical_distances_with_dropout(code, dropped_rows, num_workers=None):
+    """
+    Compute the dropout distance of every logical operator of a BB code for one pattern of dropped X
+    stabilizers, without the objective limit of distances_with_dropout.
+
+    Args:
+        code (BBCode): The BBCode object representing the quantum code
+        dropped_rows (list): Indices of rows of code.hx to drop
+        num_workers (int): Number of worker processes (default: number of CPU cores)
+
+    Returns:
+        list: Distance of every row of code.qcode.lx
+    """
+    logicals = code.qcode.lx.toarray()
+    if len(logicals) == 0:
+        return []
+
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    num_workers = min(num_workers, len(logicals))
+
+    base_logicals = code.z_logical_operators
+    args_list = [(code.hx, logicals[i], dropped_rows, base_logicals[i]) for i in range(len(logicals))]
+
+    if num_workers == 1:
+        return [_solve_logical(args) for args in args_list]
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        return list(executor.map(_solve_logical, args_list))
+
+
+def distances_with_dropout(code, dropout_patterns, num_workers=None):
+    """
+    Compute the Z distance of a BB code for many patterns of dropped X stabilizers.
+
+    Args:
+        code (BBCode): The BBCode object representing the quantum code
+        dropout_patterns (list): List of dropout patterns, each a list of indices of rows of code.hx to drop
+        num_workers (int): Number of worker processes (default: number of CPU cores)
+
+    Returns:
+        list: Tuples (distance, index of the minimizing logical operator, its support), one per pattern
+    """
+    if code.k == 0 or len(dropout_patterns) == 0:
+        return [(0, None, [])] * len(dropout_patterns)
+
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    num_workers = min(num_workers, len(dropout_patterns))
+
+    logicals = code.qcode.lx.toarray()
+    base_logicals = code.z_logical_operators
+    chunks = np.array_split(np.arange(len(dropout_patterns)), num_workers)
+    args_list = [
+        (code.hx, logicals, base_logicals, [dropout_patterns[j] for j in chunk])
+        for chunk in chunks
+    ]
+
+    if num_workers == 1:
+        results = [_solve_dropout_patterns(args_list[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            results = list(executor.map(_solve_dropout_patterns, args_list))
+    return [result for chunk_results in results for result in chunk_results]
@@ -4,8 +4,9 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import numpy as np
-import itertools  # Add this import statement
+import itertools
 from src.bb_code import BBCode
+from src import gf2
 from parameters.code_config import get_config
 
 """
@@ -22,65 +23,15 @@ def find_dependent_rows(matrix):
     Returns:
         dependent_rows: List of indices of linearly dependent rows
     """
-    # Convert to numpy array and ensure it's binary (mod 2)
     matrix = np.array(matrix, dtype=int) % 2
-    
+
     # Special case: empty matrix has no dependent rows
     if matrix.size == 0:
         return []
-    
-    # Get matrix shape
-    num_rows, num_cols = matrix.shape
-    
-    # Create a copy for row reduction
-    reduced_matrix = matrix.copy()
-    
-    # Track original row indices
-    row_indices = np.arange(num_rows)
-    
-    # Row echelon form (reduced row echelon form)
-    # Using a more robust implementation
-    r = 0  # Current row
-    pivot_cols = []  # Columns with pivots
-    
-    for c in range(num_cols):
-        # Find a pivot in this column
-        pivot_row = None
-        for i in range(r, num_rows):
-            if reduced_matrix[i, c] == 1:
-                pivot_row = i
-                break
-                
-        if pivot_row is None:
-            continue  # No pivot in this column
-            
-        # Swap rows if needed
-        if pivot_row != r:
-            reduced_matrix[[r, pivot_row]] = reduced_matrix[[pivot_row, r]]
-            row_indices[[r, pivot_row]] = row_indices[[pivot_row, r]]
-            
-        # Record this pivot position
-        pivot_cols.append(c)
-        
-        # Eliminate all other entries in this column
-        for i in range(num_rows):
-            if i != r and reduced_matrix[i, c] == 1:
-                reduced_matrix[i] = (reduced_matrix[i] + reduced_matrix[r]) % 2
-        
-        r += 1
-        if r == num_rows:
-            break
-    
+
     # Rows that didn't get pivots are dependent
-    independent_rows = r
-    dependent_rows = [int(row_indices[i]) for i in range(independent_rows, num_rows)]
-    
-    # Also identify rows that are all zeros
-    for i in range(num_rows):
-        if np.all(reduced_matrix[i] == 0) and row_indices[i] not in dependent_rows:
-            dependent_rows.append(int(row_indices[i]))
-    
-    return sorted(dependent_rows)
+    _, pivots, row_order = gf2.rref(matrix)
+    return sorted(int(i) for i in row_order[len(pivots):])
 
 
 def find_row_dependencies(matrix, dependent_row_idx):
@@ -95,51 +46,20 @@ def find_row_dependencies(matrix, dependent_row_idx):
         dependencies: List of row indices that the dependent row is a linear combination of,
                      or None if the row is not dependent
     """
-    # Make matrix copy to avoid modifying original
-    matrix = np.array(matrix, dtype=int)
-    num_rows, num_cols = matrix.shape
-    
-    # Create augmented matrix - original matrix plus identity matrix
-    aug = np.zeros((num_rows, num_cols + num_rows), dtype=int)
-    aug[:, :num_cols] = matrix
-    for i in range(num_rows):
-        aug[i, num_cols + i] = 1
-    
-    # Gaussian elimination to row echelon form
-    r = 0
-    for c in range(num_cols):
-        # Find pivot
-        pivot_found = False
-        for i in range(r, num_rows):
-            if aug[i, c] == 1:
-                pivot_found = True
-                if i != r:
-                    aug[[r, i]] = aug[[i, r]]
-                break
-        
-        if not pivot_found:
-            continue
-        
-        # Eliminate in other rows
-        for i in range(num_rows):
-            if i != r and aug[i, c] == 1:
-                aug[i] = np.bitwise_xor(aug[i], aug[r])
-        
-        r += 1
-        if r == num_rows:
-            break
-    
-    # If the row is dependent, its original matrix part will be all zeros
-    if not np.any(aug[dependent_row_idx, :num_cols]):
-        # Row is dependent - find which rows it depends on
-        dependencies = []
-        for j in range(num_rows):
-            if aug[dependent_row_idx, num_cols + j] == 1 and j != dependent_row_idx:
-                dependencies.append(j)
-        return dependencies
-    else:
+    matrix = np.array(matrix, dtype=int) % 2
+
+    # transform @ matrix = reduced, so each zero row of reduced is a vanishing combination of rows
+    reduced, pivots, row_order, transform = gf2.rref(matrix, provenance=True)
+    rank = len(pivots)
+    positions = np.flatnonzero(row_order[rank:] == dependent_row_idx) + rank
+    if len(positions) == 0:
+        # the row got a pivot, but it may still appear in the combination of another zero row
+        positions = np.flatnonzero(transform[rank:, dependent_row_idx]) + rank
+    if len(positions) == 0:
         # Row is not dependent
         return None
+    combination = transform[positions[0]]
+    return [int(j) for j in np.flatnonzero(combination) if j != dependent_row_idx]
 
 
 def find_all_dependencies(matrix):
@@ -152,16 +72,65 @@ def find_all_dependencies(matrix):
     Returns:
         dependency_dict: Dictionary mapping each dependent row to its dependencies
     """
-    # Find which rows are dependent
-    dependent_rows = find_dependent_rows(matrix)
-    
-    # For each dependent row, find its dependencies
+    matrix = np.array(matrix, dtype=int) % 2
+
+    # Special case: empty matrix has no dependent rows
+    if matrix.size == 0:
+        return {}
+
+    # One elimination: every zero row of the reduced matrix is a combination of the original
+    # rows that vanishes, and it contains the dependent row swapped into its position
+    _, pivots, row_order, transform = gf2.rref(matrix, provenance=True)
     dependency_dict = {}
-    for row_idx in dependent_rows:
-        dependencies = find_row_dependencies(matrix, row_idx)
-        if dependencies:  # Skip if somehow no dependencies found
+    for position in range(len(pivots), matrix.shape[0]):
+        row_idx = int(row_order[position])
+        dependencies = [int(j) for j in np.flatnonzero(transform[position]) if j != row_idx]
+        if dependencies:  # Skip zero rows, which depend on the empty set
             dependency_dict[row_idx] = dependencies
-    
+
+    return dict(sorted(dependency_dict.items()))
+
+
+def find_minimum_weight_dependencies(matrix, max_terms=None):
+    """
+    Find the smallest set of other rows that sums to each redundant row.
+
+    The dependencies between rows are the vectors v with v @ matrix = 0 (mod 2), i.e. the
+    nullspace of matrix^T. Its dimension is the number of redundant rows, which is small for BB
+    codes, so we enumerate the combinations of up to max_terms basis vectors and keep, for every
+    row, the lightest dependency that contains it.
+
+    Args:
+        matrix: Input binary matrix
+        max_terms: Maximum number of nullspace basis vectors per combination (default: all,
+                   which makes the result exact)
+
+    Returns:
+        dependency_dict: Dictionary mapping each row that appears in a dependency to the smallest
+                         list of other rows it equals the sum of
+    """
+    matrix = np.array(matrix, dtype=int) % 2
+    basis = gf2.nullspace(matrix.T).astype(np.int64)
+    num_basis = basis.shape[0]
+    if num_basis == 0:
+        return {}
+    if max_terms is None:
+        max_terms = num_basis
+
+    coefficients = []
+    for i in range(1, min(max_terms, num_basis) + 1):
+        for combo in itertools.combinations(range(num_basis), i):
+            row = np.zeros(num_basis, dtype=np.int64)
+            row[list(combo)] = 1
+            coefficients.append(row)
+    combinations = (np.array(coefficients) @ basis) % 2
+    weights = combinations.sum(axis=1)
+
+    dependency_dict = {}
+    for row_idx in np.flatnonzero(combinations.any(axis=0)):
+        candidates = np.flatnonzero(combinations[:, row_idx])
+        best = candidates[np.argmin(weights[candidates])]
+        dependency_dict[int(row_idx)] = [int(j) for j in np.flatnonzero(combinations[best]) if j != row_idx]
     return dependency_dict
 
 
@@ -234,80 +203,28 @@ def find_check_redundancy(code):
     print(f"X check matrix shape: {code.hx.shape}")
     print(f"Z check matrix shape: {code.hz.shape}")
     
-    # Direct calculation of matrix rank to verify our approach
-    x_rank = np.linalg.matrix_rank(code.hx % 2)
-    z_rank = np.linalg.matrix_rank(code.hz % 2)
+    x_rank = gf2.rank(code.hx)
+    z_rank = gf2.rank(code.hz)
     
     print(f"X check matrix rank: {x_rank} (should have {code.hx.shape[0] - x_rank} redundant rows)")
     print(f"Z check matrix rank: {z_rank} (should have {code.hz.shape[0] - z_rank} redundant rows)")
     
     print("\n=== Analyzing X Check Matrix ===")
-    
-    # First try direct method to find dependent rows
-    x_dependent_rows = find_dependent_rows(code.hx)
-    print(f"Found {len(x_dependent_rows)} dependent X checks: {x_dependent_rows}")
-    
-    # Then analyze fully
     redundant_x_checks, x_dependencies = analyze_matrix_dependencies(code.hx)
     
     print("\n=== Analyzing Z Check Matrix ===")
-    
-    # First try direct method to find dependent rows
-    z_dependent_rows = find_dependent_rows(code.hz)
-    print(f"Found {len(z_dependent_rows)} dependent Z checks: {z_dependent_rows}")
-    
-    # Then analyze fully
     redundant_z_checks, z_dependencies = analyze_matrix_dependencies(code.hz)
     
     # Print summary
     print(f"\nFound {len(redundant_x_checks)} redundant X checks out of {code.hx.shape[0]} total")
     print(f"Found {len(redundant_z_checks)} redundant Z checks out of {code.hz.shape[0]} total")
     
-    # Look more closely at specific checks - we expect indices 50-53 to be redundant
-    expected_redundant = [50, 51, 52, 53]
-    
-    print("\nDetailed analysis of expected redundant checks (50-53):")
-    
-    for check_idx in expected_redundant:
-        print(f"\nAnalyzing X check {check_idx}:")
-        # Try to find a small subset of checks that this check depends on
-        for i in range(1, 5):  # Try combinations of 1-4 other checks
-            for combo in itertools.combinations(range(code.hx.shape[0]), i):
-                if check_idx in combo:
-                    continue  # Skip combinations containing the check itself
-                
-                # Compute linear combination
-                combined_row = np.zeros_like(code.hx[0])
-                for idx in combo:
-                    combined_row = np.bitwise_xor(combined_row, code.hx[idx])
-                
-                # Check if it equals our target check
-                if np.array_equal(combined_row, code.hx[check_idx]):
-                    print(f"  X check {check_idx} = X check {' + X check '.join(map(str, combo))}")
-                    break
-            else:
-                continue
-            break
-        
-        print(f"\nAnalyzing Z check {check_idx}:")
-        # Try to find a small subset of checks that this check depends on
-        for i in range(1, 5):  # Try combinations of 1-4 other checks
-            for combo in itertools.combinations(range(code.hz.shape[0]), i):
-                if check_idx in combo:
-                    continue  # Skip combinations containing the check itself
-                
-                # Compute linear combination
-                combined_row = np.zeros_like(code.hz[0])
-                for idx in combo:
-                    combined_row = np.bitwise_xor(combined_row, code.hz[idx])
-                
-                # Check if it equals our target check
-                if np.array_equal(combined_row, code.hz[check_idx]):
-                    print(f"  Z check {check_idx} = Z check {' + Z check '.join(map(str, combo))}")
-                    break
-            else:
-                continue
-            break
+    print("\nSmallest dependencies of the redundant checks:")
+    for check_type, matrix, redundant_checks in (("X", code.hx, redundant_x_checks), ("Z", code.hz, redundant_z_checks)):
+        minimum_dependencies = find_minimum_weight_dependencies(matrix)
+        for check_idx in redundant_checks:
+            combo = minimum_dependencies[check_idx]
+            print(f"  {check_type} check {check_idx} = {check_type} check {f' + {check_type} check '.join(map(str, combo))}")
     
     return redundant_x_checks, redundant_z_checks, x_dependencies, z_dependencies
 
@@ -367,7 +284,7 @@ if __name__ == "__main__":
         demo_with_custom_matrix()
     else:
         print("Finding redundant checks in BB code")
-        code_setting = 4
+        code_setting = int(sys.argv[1]) if len(sys.argv) > 1 else 4
         code_config = get_config(code_setting)
         code_input_params = code_config.get_params()
         code = BBCode(code_input_params)
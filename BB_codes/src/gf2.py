@@ -0,0 +1,301 @@
+import numpy as np
+
+
+"""
+Linear algebra over GF(2) on bit-packed rows.
+
+Rows of a binary matrix are packed into uint64 words (bit c of a row is bit c%64 of word c//64),
+so adding one row to many others is a single vectorized XOR over ceil(n/64) words per row.
+Gaussian elimination therefore costs O(rank) NumPy operations instead of O(rank * rows) Python
+loop iterations over int64 rows.
+"""
+
+# number of set bits of every byte value
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint16)
+
+
+def pack_rows(matrix):
+    """
+    Pack the rows of a binary matrix into uint64 words.
+
+    Args:
+        matrix (np.ndarray): Binary matrix of shape (rows, n), entries are taken modulo 2
+
+    Returns:
+        np.ndarray: uint64 array of shape (rows, ceil(n/64))
+    """
+    if hasattr(matrix, 'toarray'):
+        matrix = matrix.toarray()
+    matrix = np.atleast_2d(np.asarray(matrix) % 2).astype(np.uint8)
+    num_rows, n = matrix.shape
+    num_words = max(1, (n + 63) // 64)
+    padded = np.zeros((num_rows, num_words * 64), dtype=np.uint8)
+    padded[:, :n] = matrix
+    return np.packbits(padded, axis=1, bitorder="little").view("<u8").astype(np.uint64)
+
+
+def unpack_rows(words, n):
+    """
+    Inverse of pack_rows.
+
+    Args:
+        words (np.ndarray): uint64 array of shape (rows, ceil(n/64))
+        n (int): Number of columns
+
+    Returns:
+        np.ndarray: Binary uint8 matrix of shape (rows, n)
+    """
+    words = np.atleast_2d(np.ascontiguousarray(words, dtype="<u8"))
+    return np.unpackbits(words.view(np.uint8), axis=1, bitorder="little")[:, :n]
+
+
+def popcount_rows(words):
+    """
+    Hamming weight of every packed row (along the last axis).
+    """
+    words = np.ascontiguousarray(words, dtype="<u8")
+    return _POPCOUNT_TABLE[words.view(np.uint8)].reshape(words.shape[:-1] + (-1,)).sum(axis=-1)
+
+
+def get_column(words, c):
+    """
+    Get column c of a packed matrix as a boolean array.
+    """
+    return ((words[:, c >> 6] >> np.uint64(c & 63)) & np.uint64(1)).astype(bool)
+
+
+def _eliminate(words, num_cols, reduced=True):
+    """
+    Gaussian elimination on packed rows, in place.
+
+    The pivot of column c is the first row at or below the current row with a 1 in column c.
+    With reduced=True the pivot column is cleared in all other rows (reduced row echelon form),
+    otherwise only in the rows below.
+
+    Args:
+        words (np.ndarray): Packed rows, modified in place
+        num_cols (int): Only the first num_cols columns are used as pivot columns
+
+    Returns:
+        tuple: (pivots, row_order), the pivot columns and the original index of every row after the row swaps
+    """
+    num_rows = words.shape[0]
+    row_order = np.arange(num_rows)
+    pivots = []
+    r = 0
+    for c in range(num_cols):
+        if r == num_rows:
+            break
+        column = get_column(words, c)
+        candidates = np.flatnonzero(column[r:])
+        if len(candidates) == 0:
+            continue
+        pivot_row = r + candidates[0]
+        if pivot_row != r:
+            words[[r, pivot_row]] = words[[pivot_row, r]]
+            row_order[[r, pivot_row]] = row_order[[pivot_row, r]]
+            column[[r, pivot_row]] = column[[pivot_row, r]]
+        column[r] = False
+        if not reduced:
+            column[:r] = False
+        words[column] ^= words[r]
+        pivots.append(c)
+        r += 1
+    return pivots, row_order
+
+
+def rank(matrix):
+    """
+    Compute the rank of a binary matrix over GF(2).
+
+    Args:
+        matrix (np.ndarray): Binary matrix
+
+    Returns:
+        int: Rank over GF(2)
+    """
+    matrix = np.atleast_2d(matrix)
+    if matrix.size == 0:
+        return 0
+    words = pack_rows(matrix)
+    pivots, _ = _eliminate(words, matrix.shape[1], reduced=False)
+    return len(pivots)
+
+
+def rref(matrix, provenance=False):
+    """
+    Compute the reduced row echelon form of a binary matrix over GF(2).
+
+    Args:
+        matrix (np.ndarray): Binary matrix of shape (rows, n)
+        provenance (bool): Also return the row-combination matrix
+
+    Returns:
+        tuple: (reduced, pivots, row_order) or (reduced, pivots, row_order, transform)
+               reduced (rows, n) has its len(pivots) nonzero rows on top,
+               pivots are the pivot columns of these rows,
+               row_order[i] is the original row that was swapped into position i,
+               transform (rows, rows) satisfies transform @ matrix = reduced (mod 2), so every
+               zero row of reduced gives a linear dependency between the rows of matrix
+    """
+    if hasattr(matrix, 'toarray'):
+        matrix = matrix.toarray()
+    matrix = np.atleast_2d(np.asarray(matrix) % 2).astype(np.uint8)
+    num_rows, n = matrix.shape
+    if provenance:
+        matrix = np.hstack((matrix, np.identity(num_rows, dtype=np.uint8)))
+    words = pack_rows(matrix)
+    pivots, row_order = _eliminate(words, n, reduced=True)
+    full = unpack_rows(words, matrix.shape[1])
+    if provenance:
+        return full[:, :n], pivots, row_order, full[:, n:]
+    return full, pivots, row_order
+
+
+def row_basis(matrix):
+    """
+    Get the nonzero rows of the reduced row echelon form and their pivot columns.
+
+    Args:
+        matrix (np.ndarray): Binary matrix
+
+    Returns:
+        tuple: (reduced, pivots)
+    """
+    reduced, pivots, _ = rref(matrix)
+    return reduced[:len(pivots)], pivots
+
+
+def reduce_modulo_rowspace(vectors, reduced, pivots):
+    """
+    Get the canonical representatives of binary vectors modulo the row space of a matrix.
+
+    Args:
+        vectors (np.ndarray): Binary vectors, one per row
+        reduced (np.ndarray): Nonzero rows of the reduced row echelon form of the matrix (see row_basis)
+        pivots (list): Pivot columns of reduced
+
+    Returns:
+        np.ndarray: The representatives, which vanish on all pivot columns
+    """
+    vectors = np.atleast_2d(np.asarray(vectors) % 2).astype(np.uint8)
+    if len(pivots) == 0:
+        return vectors
+    # in reduced row echelon form the rows to add are given by the bits at the pivot columns
+    selection = vectors[:, pivots].astype(np.int64)
+    return vectors ^ ((selection @ reduced.astype(np.int64)) % 2).astype(np.uint8)
+
+
+def nullspace(matrix):
+    """
+    Basis of the kernel of a binary matrix over GF(2), i.e. all x with matrix @ x = 0 mod 2.
+
+    Args:
+        matrix (np.ndarray): Binary matrix of shape (rows, n)
+
+    Returns:
+        np.ndarray: Binary uint8 matrix whose rows span the kernel
+    """
+    matrix = np.atleast_2d(matrix)
+    n = matrix.shape[1]
+    reduced, pivots = row_basis(matrix)
+    pivot_set = set(pivots)
+    free_cols = [c for c in range(n) if c not in pivot_set]
+    basis = np.zeros((len(free_cols), n), dtype=np.uint8)
+    for i, f in enumerate(free_cols):
+        basis[i, f] = 1
+        basis[i, pivots] = reduced[:, f]
+    return basis
+
+
+def solve(matrix, b):
+    """
+    Solve matrix @ x = b over GF(2).
+
+    Args:
+        matrix (np.ndarray): Binary matrix of shape (rows, n)
+        b (np.ndarray): Binary vector of length rows
+
+    Returns:
+        np.ndarray or None: A solution x (free variables set to 0), or None if there is no solution
+    """
+    matrix = np.atleast_2d(np.asarray(matrix) % 2).astype(np.uint8)
+    b = np.asarray(b).reshape(-1, 1) % 2
+    n = matrix.shape[1]
+    words = pack_rows(np.hstack((matrix, b.astype(np.uint8))))
+    pivots, _ = _eliminate(words, n, reduced=True)
+    augmented = unpack_rows(words, n + 1)
+    # a zero row of matrix with a nonzero right hand side is inconsistent
+    if np.any(augmented[len(pivots):, n]):
+        return None
+    x = np.zeros(n, dtype=np.uint8)
+    x[pivots] = augmented[:len(pivots), n]
+    return x
+
+
+class IncrementalRank:
+    """
+    IncrementalRank maintains a reduced row echelon basis of a growing set of binary vectors.
+    self.rank is the current rank, self.pivots are the pivot columns of the basis rows.
+    """
+    def __init__(self, n):
+        """
+        Initialize the IncrementalRank class.
+
+        Args:
+            n (int): Length of the vectors
+        """
+        self.n = n
+        self.rank = 0
+        self.pivots = []
+        self._basis = np.zeros((0, max(1, (n + 63) // 64)), dtype=np.uint64)
+
+    def reduce(self, vector):
+        """
+        Reduce a binary vector modulo the span of the basis.
+
+        Returns:
+            np.ndarray: The packed reduced vector
+        """
+        words = pack_rows(vector)[0]
+        if self.rank:
+            pivots = np.array(self.pivots)
+            selection = ((words[pivots >> 6] >> (pivots & 63).astype(np.uint64)) & np.uint64(1)).astype(bool)
+            if np.any(selection):
+                words = words ^ np.bitwise_xor.reduce(self._basis[selection], axis=0)
+        return words
+
+    def is_independent(self, vector):
+        """
+        Check if a binary vector is linearly independent of the basis.
+        """
+        return bool(np.any(self.reduce(vector)))
+
+    def add(self, vector):
+        """
+        Add a binary vector to the basis if it is linearly independent.
+
+        Returns:
+            bool: True if the rank increased
+        """
+        words = self.reduce(vector)
+        nonzero_words = np.flatnonzero(words)
+        if len(nonzero_words) == 0:
+            return False
+        w = nonzero_words[0]
+        value = int(words[w])
+        pivot = int(w) * 64 + (value & -value).bit_length() - 1
+        # keep the basis reduced: clear the new pivot column in the other rows
+        if self.rank:
+            mask = get_column(self._basis, pivot)
+            self._basis[mask] ^= words
+        self._basis = np.vstack((self._basis, words[None, :]))
+        self.pivots.append(pivot)
+        self.rank += 1
+        return True
+
+    def basis(self):
+        """
+        Get the basis rows as a binary uint8 matrix.
+        """
+        return unpack_rows(self._basis, self.n)
@@ -0,0 +1,148 @@
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from src.gf2 import pack_rows, unpack_rows, popcount_rows, nullspace
+
+
+"""
+Randomized information-set search for low-weight logical operators.
+
+Instead of solving the exact integer program of logical_operator_and_distance_compute, we sample
+random information sets of the code ker(stab): the generator matrix of ker(stab) is brought to
+systematic form with respect to a random column order, and every row of the result is a candidate
+codeword of low weight (Leon / Brouwer-Zimmermann style search at order 1). A candidate with odd
+overlap with a logical operator is a logical operator, so its weight is a certified upper bound on
+the minimum weight. The search runs on bit-packed uint64 rows and in parallel over processes, each
+with its own random seed, until the time budget (or the trial budget) is used up.
+"""
+
+def _information_set_worker(args):
+    """
+    Helper function for multiprocessing that runs random information-set trials.
+
+    Args:
+        args: Tuple (generator, logicals, n, time_budget, max_trials, seed) with packed generator rows
+              of ker(stab), packed logical operators and the number of qubits n
+
+    Returns:
+        tuple: (best weights, best packed supports, number of trials)
+    """
+    generator, logicals, n, time_budget, max_trials, seed = args
+    rng = np.random.default_rng(seed)
+    num_rows = generator.shape[0]
+    num_logicals = logicals.shape[0]
+
+    best_weights = np.full(num_logicals, n + 1, dtype=np.int64)
+    best_supports = np.zeros((num_logicals, generator.shape[1]), dtype=np.uint64)
+
+    deadline = time.monotonic() + time_budget
+    trials = 0
+    while time.monotonic() < deadline and (max_trials is None or trials < max_trials):
+        trials += 1
+        work = generator.copy()
+        r = 0
+        # systematic form with respect to a random column order
+        for c in rng.permutation(n):
+            if r == num_rows:
+                break
+            word = c >> 6
+            shift = np.uint64(c & 63)
+            column = ((work[:, word] >> shift) & np.uint64(1)).astype(bool)
+            candidates = np.flatnonzero(column[r:])
+            if len(candidates) == 0:
+                continue
+            pivot_row = r + candidates[0]
+            if pivot_row != r:
+                work[[r, pivot_row]] = work[[pivot_row, r]]
+                column[[r, pivot_row]] = column[[pivot_row, r]]
+            column[r] = False
+            work[column] ^= work[r]
+            r += 1
+
+        weights = popcount_rows(work)
+        parity = popcount_rows(work[:, None, :] & logicals[None, :, :]) % 2
+        for i in range(num_logicals):
+            rows = np.flatnonzero(parity[:, i])
+            if len(rows) == 0:
+                continue
+            best = rows[np.argmin(weights[rows])]
+            if weights[best] < best_weights[i]:
+                best_weights[i] = weights[best]
+                best_supports[i] = work[best]
+    return best_weights, best_supports, trials
+
+
+def random_logical_operators_and_distance(stab, logicals, time_budget=10.0, num_workers=None, max_trials=None, seed=None):
+    """
+    Find low-weight logical operators with a randomized information-set search.
+
+    For every row logicals[i] we search for a low-weight x with stab @ x = 0 and logicals[i] @ x = 1
+    (mod 2), the same problem as logical_operator_and_distance_compute, but we only guarantee an upper
+    bound on the minimum weight. Every returned operator is verified, so the weights are certified
+    upper bounds.
+
+    Args:
+        stab (np.ndarray): Binary check matrix, e.g. code.hx
+        logicals (np.ndarray or sparse matrix): Logical operators, one per row, e.g. code.qcode.lx
+        time_budget (float): Wall-clock budget in seconds for every worker
+        num_workers (int): Number of worker processes (default: number of CPU cores)
+        max_trials (int): Optional limit on the number of trials per worker
+        seed (int): Seed of the root SeedSequence, independent seeds are spawned for the workers
+
+    Returns:
+        tuple: (weights, logical_operators), weights[i] is an upper bound on the minimum weight for
+               logicals[i] (None if no logical operator was found), logical_operators[i] its support
+    """
+    if hasattr(logicals, 'toarray'):
+        logicals = logicals.toarray()
+    if hasattr(stab, 'toarray'):
+        stab = stab.toarray()
+    stab = np.asarray(stab, dtype=np.uint8) % 2
+    logicals = np.atleast_2d(np.asarray(logicals, dtype=np.uint8) % 2)
+    n = stab.shape[1]
+
+    generator = pack_rows(nullspace(stab))
+    packed_logicals = pack_rows(logicals)
+
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    seeds = np.random.SeedSequence(seed).spawn(num_workers)
+    args_list = [(generator, packed_logicals, n, time_budget, max_trials, s) for s in seeds]
+
+    if num_workers == 1:
+        results = [_information_set_worker(args_list[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            results = list(executor.map(_information_set_worker, args_list))
+
+    best_weights = np.min([w for w, _, _ in results], axis=0)
+    weights = []
+    logical_operators = []
+    for i in range(logicals.shape[0]):
+        if best_weights[i] > n:
+            weights.append(None)
+            logical_operators.append(None)
+            continue
+        worker = int(np.argmin([w[i] for w, _, _ in results]))
+        support = unpack_rows(results[worker][1][i], n)[0]
+        # certify the witness
+        if np.any((stab.astype(np.int64) @ support) % 2) or int(logicals[i].astype(np.int64) @ support) % 2 != 1:
+            raise RuntimeError(f"Invalid witness for logical operator {i}")
+        weights.append(int(best_weights[i]))
+        logical_operators.append(np.flatnonzero(support).tolist())
+    return weights, logical_operators
+
+
+def logical_operator_and_distance_upper_bound(stab, logicOp, time_budget=10.0, num_workers=None, max_trials=None, seed=None):
+    """
+    Randomized counterpart of logical_operator_and_distance_compute for a single logical operator.
+
+    Returns:
+        tuple: (weight upper bound, support of the witness logical operator)
+    """
+    weights, logical_operators = random_logical_operators_and_distance(
+        stab, logicOp, time_budget=time_budget, num_workers=num_workers, max_trials=max_trials, seed=seed)
+    if weights[0] is None:
+        raise RuntimeError("No logical operator found within the time budget")
+    return weights[0], logical_operators[0]
@@ -8,6 +8,10 @@ from circ_gen.circ_gen_coupler_de import gen_circ_coupler_defect_only_z_detector
 from noise_model.noise_model import si1000_noise_model, standard_depolarizing_noise_model
 from parameters.bposd_para import BposdParameters
 import os
+import sys
+# the result store is shared with the surface code simulations, see routing_common/results_store.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from routing_common.results_store import ResultStore
 
 
 bposd_params = BposdParameters()
@@ -28,31 +32,26 @@ def generate_tasks(code,distance,rounds):
         )
 
 def run_sinter_simulation(code,distance,rounds):
-    # Clean up previous samples file
-    sample_file = f"testdata/bposd_bb_code_d.csv"
-    if os.path.exists(sample_file):
-        os.remove(sample_file)
-
-    samples = sinter.collect(
-        num_workers=10,
-        max_shots=100_000,
-        max_errors=5_000,
-        tasks=generate_tasks(code,distance,rounds),
-        decoders=["bposd"],
-        custom_decoders={
-            "bposd": SinterBpOsdDecoder(
-                schedule="parallel",
-                max_iter=my_max_iter,
-                bp_method= my_bp_method,
-                ms_scaling_factor=my_ms_scaling_factor,
-                osd_method=my_osd_method,
-                osd_order = my_osd_order,
-            ),
-        },
-        print_progress=True,
-        save_resume_filepath=sample_file,
-    )
-    return samples
+    # every batch is appended to the result store as it arrives, and a rerun resumes from the stored batches
+    with ResultStore("testdata/bposd_bb_code.sqlite") as store:
+        return store.collect(
+            num_workers=10,
+            max_shots=100_000,
+            max_errors=5_000,
+            tasks=generate_tasks(code,distance,rounds),
+            decoders=["bposd"],
+            custom_decoders={
+                "bposd": SinterBpOsdDecoder(
+                    schedule="parallel",
+                    max_iter=my_max_iter,
+                    bp_method= my_bp_method,
+                    ms_scaling_factor=my_ms_scaling_factor,
+                    osd_method=my_osd_method,
+                    osd_order = my_osd_order,
+                ),
+            },
+            print_progress=True,
+        )
 
 
 
@@ -9,7 +9,7 @@ from circ_gen.circ_gen_coupler_de import gen_circ_coupler_defect_only_z_detector
 from parameters.code_config import get_config
 from noise_model.noise_model import si1000_noise_model, standard_depolarizing_noise_model
 import stim
-from src.circuit_level_distance import circuit_level_min_x_distance
+from src.circuit_level_distance import circuit_level_min_x_distance_progress
 
 """
 Code parameters for quantum error correction codes.
@@ -66,6 +66,12 @@ if __name__ == "__main__":
     noise_circuit = si1000_noise_model(circuit, full_qubit_set, probability=test_probability)
 
     print('Computing circuit level X distance...')
-    cd_x = circuit_level_min_x_distance(noise_circuit, 10000)
+    # stop once the minimum has not improved for 1000 iterations
+    for progress in circuit_level_min_x_distance_progress(noise_circuit, 10000, patience=1000):
+        if progress.trials % 100 < 4 or progress.stopped:
+            print(f"{progress.trials} iterations, {progress.elapsed:.0f} s, current circuit level X distance: {progress.min_distance}")
+    print(f"Weight histogram: {progress.histogram}")
+    print(f"Stopped by: {progress.stopped}")
+    cd_x = progress.min_distance
     print(f"Final circuit level X distance: {cd_x}")
 
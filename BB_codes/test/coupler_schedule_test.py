@@ -0,0 +1,101 @@
+import sys
+import os
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import stim
+from src.bb_code import BBCode
+from parameters.code_config import get_config
+from circ_gen.circ_gen_coupler_de import sample_coupler_dropout_flags, gen_circ_from_cnot_layers
+from circ_gen.coupler_schedule import coupler_availability_from_flags, random_coupler_availability, synthesize_cnot_layers
+
+
+"""
+Run the CNOT schedule synthesizer of circ_gen.coupler_schedule over sampled 1/4 coupler dropout
+patterns (which only break Z couplers at error rate 1) and over random patterns of
+random_coupler_availability (which also break X couplers), and check every layering: no qubit is in
+two CNOTs of a layer, every ancilla measures the row of its stabilizer table, and stim builds the
+detector error model of the circuit (all detectors and observables are deterministic).
+"""
+
+
+def check_layers(layers):
+    """
+    Check that no qubit appears twice in a layer of flat [control, target, ...] pairs.
+    """
+    for i, layer in enumerate(layers):
+        assert len(layer) == len(set(layer)), f"qubit used twice in layer {i}"
+
+
+def check_stabilizers(code, layers, basis):
+    """
+    Check the CNOT layers of the X (basis "X") or the Z (basis "Z") stabilizer measurement: the Pauli
+    measured on every ancilla, propagated back through the layers, is the row of its stabilizer table
+    on the data qubits (nothing for the ancillas of the other type, which only serve as bridges) and
+    acts on the ancillas only in the basis they are reset in.
+    """
+    circuit = stim.Circuit()
+    for layer in layers:
+        if layer:
+            circuit.append("CNOT", layer)
+    num_qubits = max(code.data_qubits_set + code.x_ancilla_labels + code.z_ancilla_labels) + 1
+    data_qubits = set(code.data_qubits_set)
+    if basis == "X":
+        tables = [(code.x_ancilla_labels, code.x_stabilizer_table), (code.z_ancilla_labels, None)]
+    else:
+        tables = [(code.z_ancilla_labels, code.z_stabilizer_table), (code.x_ancilla_labels, None)]
+    pauli_index = {"X": 1, "Z": 3}[basis]
+    for ancillas, table in tables:
+        for r, ancilla in enumerate(ancillas):
+            measured = stim.PauliString(num_qubits)
+            measured[ancilla] = basis
+            before = measured.before(circuit)
+            support = {q for q in range(num_qubits) if before[q] != 0}
+            expected = set(table[r].tolist()) if table is not None else set()
+            assert support & data_qubits == expected, f"ancilla {ancilla} does not measure its {basis} stabilizer"
+            assert all(before[q] == pauli_index for q in support), f"ancilla {ancilla} picks up a wrong Pauli"
+            assert before.sign == 1, f"ancilla {ancilla} measures a negated stabilizer"
+
+
+def check_masks(code, z_mask, x_mask):
+    """
+    Synthesize the CNOT layers of a coupler availability pattern and check them.
+
+    Returns:
+        tuple: Number of X and Z CNOT layers
+    """
+    x_cnot_pairs, z_cnot_pairs = synthesize_cnot_layers(code, z_mask, x_mask)
+    check_layers(x_cnot_pairs)
+    check_layers(z_cnot_pairs)
+    check_stabilizers(code, x_cnot_pairs, "X")
+    check_stabilizers(code, z_cnot_pairs, "Z")
+    # raises if a detector or an observable is not deterministic
+    gen_circ_from_cnot_layers(code, 1, x_cnot_pairs, z_cnot_pairs).detector_error_model()
+    return len(x_cnot_pairs), len(z_cnot_pairs)
+
+
+if __name__ == "__main__":
+
+    num_patterns = 200
+    rng = np.random.default_rng(2024)
+
+    for code_setting in [1, 5]:
+        code = BBCode(get_config(code_setting).get_params(), method="random", time_budget=0.5)
+        z_flags, x_flags = sample_coupler_dropout_flags(code, 1, size=num_patterns, rng=rng)
+        depths = {}
+        for i in range(num_patterns):
+            z_mask, x_mask = coupler_availability_from_flags(code, z_flags[i], x_flags[i])
+            key = check_masks(code, z_mask, x_mask)
+            depths[key] = depths.get(key, 0) + 1
+        print(f"code {code_setting}: {num_patterns} dropout patterns valid, (X, Z) layers: {depths}")
+
+        depths = {}
+        num_x_broken = 0
+        for i in range(num_patterns):
+            z_mask, x_mask = random_coupler_availability(code, 1 / 4, rng=rng)
+            num_x_broken += int(not x_mask.all())
+            key = check_masks(code, z_mask, x_mask)
+            depths[key] = depths.get(key, 0) + 1
+        assert num_x_broken > 0, "no pattern breaks an X coupler"
+        print(f"code {code_setting}: {num_patterns} random patterns valid ({num_x_broken} with broken X couplers),"
+              f" (X, Z) layers: {depths}")
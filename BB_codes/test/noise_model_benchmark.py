@@ -0,0 +1,87 @@
+import sys
+import os
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import time
+import stim
+from src.bb_code import BBCode
+from parameters.code_config import get_config
+from circ_gen.circ_gen import gen_circ, gen_circ_only_z_detectors
+from circ_gen.circ_gen_coupler_de import gen_circ_50per_coupler
+from noise_model.noise_model import si1000_noise_model, standard_depolarizing_noise_model
+
+"""
+Benchmark of the noise models against the instruction-by-instruction reference implementation.
+
+The reference collects the idle qubits of every instruction as a Python set, so the order of the
+targets of the idle DEPOLARIZE1 channels is arbitrary; the circuits are compared with these
+targets sorted. Everything else (instructions, order, probabilities, repeat blocks) must match exactly.
+"""
+
+
+def reference_noise_model(circuit: stim.Circuit, full_qubit_set: list, probability: float, si1000: bool) -> stim.Circuit:
+    """
+    The previous implementation of si1000_noise_model (si1000=True) and standard_depolarizing_noise_model.
+    """
+    p = probability
+    reset_p, measure_p, idle_p, cx_idle_p = (2*p, 5*p, 2*p, p/10) if si1000 else (p, p, p, p)
+    result = stim.Circuit()
+    for instruction in circuit:
+        if isinstance(instruction, stim.CircuitRepeatBlock):
+            result.append(stim.CircuitRepeatBlock(
+                repeat_count=instruction.repeat_count,
+                body=reference_noise_model(instruction.body_copy(), full_qubit_set, probability, si1000)))
+            continue
+        idle = list(set(full_qubit_set) - set(instruction.targets_copy()))
+        if instruction.name in ('R', 'RX'):
+            result.append(instruction)
+            result.append('Z_ERROR' if instruction.name == 'R' else 'X_ERROR', instruction.targets_copy(), reset_p)
+            result.append('DEPOLARIZE1', idle, reset_p)
+        elif instruction.name in ('M', 'MR', 'MRX'):
+            channel = 'X_ERROR' if instruction.name == 'MRX' else 'Z_ERROR'
+            result.append(channel, instruction.targets_copy(), measure_p)
+            result.append(instruction)
+            result.append(channel, instruction.targets_copy(), p)
+            result.append('DEPOLARIZE1', idle, idle_p)
+        elif instruction.name == 'CX':
+            result.append(instruction)
+            result.append('DEPOLARIZE2', instruction.targets_copy(), p)
+            result.append('DEPOLARIZE1', idle, cx_idle_p)
+        else:
+            result.append(instruction)
+    return result
+
+
+def canonical_lines(circuit: stim.Circuit):
+    """
+    Get the lines of a circuit with the targets of the DEPOLARIZE1 channels sorted.
+    """
+    lines = []
+    for line in str(circuit).split("\n"):
+        if line.lstrip().startswith("DEPOLARIZE1("):
+            head, _, targets = line.partition(") ")
+            line = head + ") " + " ".join(sorted(targets.split(), key=int))
+        lines.append(line)
+    return lines
+
+
+if __name__ == "__main__":
+    cases = [
+        (BBCode(get_config(5).get_params()), 12),
+        (BBCode((24, 24, 3, -1, -1, 3), method="random", time_budget=1.0, use_cache=False), 24),
+    ]
+    for code, sround in cases:
+        for generator in (gen_circ, gen_circ_only_z_detectors, gen_circ_50per_coupler):
+            circuit = generator(code, sround)
+            for si1000, noise_model in ((True, si1000_noise_model), (False, standard_depolarizing_noise_model)):
+                start = time.perf_counter()
+                expected = reference_noise_model(circuit, code.full_qubit_set, 0.001, si1000)
+                reference_time = time.perf_counter() - start
+                start = time.perf_counter()
+                noisy = noise_model(circuit, code.full_qubit_set, 0.001)
+                compiled_time = time.perf_counter() - start
+                assert canonical_lines(noisy) == canonical_lines(expected), (code.n, generator.__name__, noise_model.__name__)
+                print(f"n={code.n} rounds={sround} {generator.__name__} {noise_model.__name__}: "
+                      f"reference {reference_time*1e3:.1f} ms, compiled {compiled_time*1e3:.1f} ms, "
+                      f"speedup {reference_time/compiled_time:.1f}x")
+    print("All noisy circuits are equivalent.")
@@ -2,8 +2,11 @@ import sys
 import os
 # Add the project root directory to the Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+# the result store is shared by the BB code and surface code simulations, see routing_common/results_store.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
 
 import sinter
+from routing_common.results_store import ResultStore
 import stim
 from typing import List
 import numpy as np
@@ -12,6 +15,7 @@ import matplotlib.pyplot as plt
 from src.bb_code import BBCode
 from parameters.code_config import get_config
 from circ_gen.circ_gen import gen_circ, gen_circ_only_z_detectors
+from circ_gen.circuit_factory import CircuitFactory
 from circ_gen.circ_gen_coupler_de import gen_circ_50per_coupler, gen_circ_75per_coupler, gen_circ_coupler_defect_only_z_detectors
 from noise_model.noise_model import si1000_noise_model, standard_depolarizing_noise_model
 from parameters.bposd_para import BposdParameters
@@ -50,20 +54,23 @@ if __name__ == "__main__":
     # if os.path.exists(sample_file):
     #     os.remove(sample_file)
 
+    # build every code, circuit and noise plan once, only the noise strength changes between tasks,
+    # and load the detector error models from the on-disk cache instead of rebuilding them in every worker
+    factory = CircuitFactory()
     bb_code_tasks = [
     sinter.Task(
-        circuit = si1000_noise_model(
-            gen_circ_75per_coupler(BBCode(get_config(code_setting).get_params()), BBCode(get_config(code_setting).get_params()).qcodedz), BBCode(get_config(code_setting).get_params()).full_qubit_set,
-            probability=noise,
-        ),
-        json_metadata={'code': code_setting, 'r': BBCode(get_config(code_setting).get_params()).qcodedz, 'p': noise},
+        circuit = factory.noisy_circuit(code_setting, gen_circ_75per_coupler, si1000_noise_model, noise),
+        detector_error_model = factory.detector_error_model(code_setting, gen_circ_75per_coupler, si1000_noise_model, noise),
+        json_metadata={'code': code_setting, 'r': factory.code(code_setting).qcodedz, 'p': noise},
     )
     for code_setting in [3,4]
     for noise in [0.0001, 0.0005, 0.001, 0.003]
     ]
     
     print("Decoding...")
-    collected_bb_code_stats: List[sinter.TaskStats] = sinter.collect(
+    # every batch is appended to the result store as it arrives, a rerun resumes from the stored batches
+    store = ResultStore(os.path.join('results', 'bb_stats_75per_coupler.sqlite'))
+    collected_bb_code_stats: List[sinter.TaskStats] = store.collect(
         num_workers=10,
         tasks=bb_code_tasks,
         decoders=["bposd"],
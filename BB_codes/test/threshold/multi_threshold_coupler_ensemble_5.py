@@ -0,0 +1,82 @@
+import sys
+import os
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+# the result store is shared by the BB code and surface code simulations, see routing_common/results_store.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+import sinter
+import numpy as np
+from routing_common.results_store import ResultStore
+from typing import List
+from collections import defaultdict
+from ldpc.sinter_decoders import SinterBpOsdDecoder
+from src.bb_code import BBCode
+from parameters.code_config import get_config
+from circ_gen.coupler_defect_ensemble import gen_coupler_defect_ensemble, coupler_defect_ensemble_tasks
+from noise_model.noise_model import si1000_noise_model
+from parameters.bposd_para import BposdParameters
+import pickle
+
+
+if __name__ == "__main__":
+
+    bposd_params = BposdParameters()
+    my_max_iter, my_ms_scaling_factor, my_osd_method, my_bp_method, my_osd_order = bposd_params.get_params()
+
+    code_setting = 5
+    num_samples = 20
+    code_params = get_config(code_setting).get_params()
+    code = BBCode(code_params)
+
+    print("Generating coupler defect ensemble...")
+    # every sample draws its defect pattern from its own child of the SeedSequence of seed
+    samples = gen_coupler_defect_ensemble(code_params, num_samples, seed=2024)
+    print(f"{len(set(s.pattern_hash for s in samples))} distinct patterns in {num_samples} samples")
+
+    print("Generating tasks...")
+    bb_code_tasks = coupler_defect_ensemble_tasks(
+        code, samples, si1000_noise_model, [0.0005, 0.001, 0.003],
+        json_metadata={'code': code_setting, 'r': code.qcodedz},
+    )
+
+    print("Decoding...")
+    # every batch is appended to the result store as it arrives, a rerun resumes from the stored batches
+    store = ResultStore(os.path.join('results', 'bb_stats_coupler_ensemble.sqlite'))
+    collected_bb_code_stats: List[sinter.TaskStats] = store.collect(
+        num_workers=10,
+        tasks=bb_code_tasks,
+        decoders=["bposd"],
+        custom_decoders={
+            "bposd": SinterBpOsdDecoder(
+                schedule="parallel",
+                max_iter=my_max_iter,
+                bp_method= my_bp_method,
+                ms_scaling_factor=my_ms_scaling_factor,
+                osd_method=my_osd_method,
+                osd_order = my_osd_order,
+            ),
+        },
+        max_shots=1_000_000,
+        max_errors=100,
+        print_progress=True,
+    )
+
+    # logical error rate of every defect pattern, averaged over the samples with equal weight (pooling
+    # the shots would weight every pattern by its number of shots, which max_errors makes larger for
+    # the better patterns)
+    rates = defaultdict(list)
+    for stat in collected_bb_code_stats:
+        rates[stat.json_metadata['p']].append(stat.errors / (stat.shots - stat.discards))
+    for p in sorted(rates):
+        p_rates = np.array(rates[p])
+        print(f"p={p}: ensemble logical error rate {p_rates.mean():.3e} +- {p_rates.std(ddof=1) / np.sqrt(len(p_rates)):.1e}"
+              f" (std {p_rates.std(ddof=1):.1e}, min {p_rates.min():.3e}, max {p_rates.max():.3e}, {len(p_rates)} samples)")
+
+    # Create results directory if it doesn't exist
+    results_dir = 'results'
+    if not os.path.exists(results_dir):
+        os.makedirs(results_dir)
+
+    with open(os.path.join(results_dir, f'collected_bb_stats_coupler_ensemble{code_setting}.pkl'), 'wb') as f:
+        pickle.dump(collected_bb_code_stats, f)
@@ -1,136 +1,116 @@
-import numpy as np
+import os
+import sys
 import stim
-from beliefmatching import detector_error_model_to_check_matrices
-from ldpc import BpOsdDecoder
 from parameters.bposd_para import BposdParameters
-import multiprocessing
-from concurrent.futures import ProcessPoolExecutor
+# the circuit-level distance search is shared with the BB code simulations, see routing_common/distance.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from routing_common.distance import DistanceEngine, circuit_distance, distances, x_distance
 
-
-def _run_single_iteration(circuit):
-    """
-    Helper function for multiprocessing that calculates X distance for a single iteration.
-    
-    Args:
-        circuit (stim.Circuit): The circuit to analyze
-        
-    Returns:
-        int: The X distance found for this iteration
-    """
-    # Create a copy of the circuit to avoid modifying the original
-    circuit_copy = circuit.copy()
-    
-    # Calculate X distance for this iteration
-    x_distance = circuit_level_x_distance(circuit_copy)
-    print(f"Current circuit level X distance: {x_distance}")
-    
-    return x_distance
+# BP+OSD settings of the distance search for surface code circuits, loaded once per process
+BPOSD_SETTINGS = {"error_rate": 0.002, "force_last_observable": True,
+                   "decoder_params": BposdParameters().get_params()}
 
 
-def circuit_level_min_x_distance(circuit: stim.Circuit, iter_num: int):
+def circuit_level_min_x_distance(circuit: stim.Circuit, iter_num: int, seed=None, num_workers=None,
+                                 patience=None, time_budget=None):
     """
     Calculate the minimum X distance of a circuit over multiple iterations using multiprocessing.
     
-    This function repeatedly calls circuit_level_x_distance in parallel to find the minimum X distance.
+    Every iteration runs the search of circuit_level_x_distance with a different random logical operator.
     Multiple iterations are used because the decoder may find different logical operators
     in different runs, and we want to find the minimum weight logical operator.
+    The check matrices are built once and shared with the worker processes, see routing_common/distance.py.
     
     Args:
         circuit (stim.Circuit): The quantum circuit to analyze
         iter_num (int): Number of iterations to run the calculation
+        seed (int): Seed of the random logical operators (default: fresh entropy)
+        num_workers (int): Number of worker processes (default: number of CPU cores)
+        patience (int): Stop after this many iterations without improvement (default: run all iterations)
+        time_budget (float): Wall-clock budget in seconds (default: no limit)
         
     Returns:
         int: The minimum X distance found across all iterations
     """
-    # Determine the number of processes to use (up to the number of CPU cores)
-    num_processes = min(multiprocessing.cpu_count(), iter_num)
-    
-    # Create a list of the same circuit for each iteration
-    circuits = [circuit] * iter_num
-    
-    # Use ProcessPoolExecutor to run iterations in parallel
-    with ProcessPoolExecutor(max_workers=num_processes) as executor:
-        # Map the _run_single_iteration function to each circuit in the list
-        distances = list(executor.map(_run_single_iteration, circuits))
-    
-    # Find the minimum distance from all iterations
-    min_x_distance = min(distances) if distances else float('inf')
-    
-    return min_x_distance
+    with DistanceEngine(circuit, num_workers=num_workers, **BPOSD_SETTINGS) as engine:
+        return engine.min_x_distance(iter_num, seed, time_budget, patience)
+
+
+def circuit_level_min_x_distance_progress(circuit: stim.Circuit, iter_num: int, seed=None, num_workers=None,
+                                          patience=None, time_budget=None):
+    """
+    Streaming version of circuit_level_min_x_distance (same arguments), yields the progress of the search.
+
+    Yields:
+        DistanceProgress: trials, min_distance, histogram of the weights found, since_improvement,
+                          elapsed and stopped (the reason the search stopped, in the last item only)
+    """
+    with DistanceEngine(circuit, num_workers=num_workers, **BPOSD_SETTINGS) as engine:
+        yield from engine.stream(iter_num, seed, patience=patience, time_budget=time_budget)
 
 
-def circuit_level_x_distance(circuit: stim.Circuit):
+def circuit_level_distance(circuit: stim.Circuit, backend="graphlike", time_budget=None, **options):
+    """
+    Compute or bound the circuit-level distance of a circuit with a pluggable backend.
+
+    Backends (see routing_common/distance.py):
+        "bposd": circuit_level_min_x_distance within the time budget (upper bound), options trials, seed and patience
+        "graphlike": stim's shortest_graphlike_error (exact if all errors are graphlike, else upper bound)
+        "undetectable": stim's search_for_undetectable_logical_errors with the truncation options
+                        max_detection_events, max_edge_degree and no_symptom_increase (upper bound)
+        "ilp": SCIP integer program on the check matrices (exact if solved within the time budget)
+
+    Args:
+        circuit (stim.Circuit): The quantum circuit to analyze
+        backend (str): Name of the backend
+        time_budget (float): Wall-clock budget in seconds (default: no limit)
+        **options: Options of the backend
+
+    Returns:
+        DistanceResult: distance, bound type ("exact", "upper" or "none"), backend name and elapsed time
+    """
+    if backend == "bposd":
+        options = {**BPOSD_SETTINGS, **options}
+    return circuit_distance(circuit, backend, time_budget, **options)
+
+
+def circuit_level_distances(circuits, trials=1000, backend="bposd", time_budget=None, num_workers=None, **options):
+    """
+    Batched version of circuit_level_distance: all circuits share one worker pool, and with the
+    bposd backend the trials of all circuits are interleaved on it, so that a sweep over codes and
+    dropout variants keeps every core busy.
+
+    Args:
+        circuits (iterable): The quantum circuits to analyze
+        trials (int): Maximum number of trials per circuit of the bposd backend
+        backend (str): Name of the backend, see circuit_level_distance
+        time_budget (float): Wall-clock budget in seconds per circuit (default: no limit)
+        num_workers (int): Number of worker processes (default: number of CPU cores)
+        **options: Options of the backend
+
+    Returns:
+        list: DistanceResult of every circuit, in the order of circuits
+    """
+    if backend == "bposd":
+        options = {**BPOSD_SETTINGS, **options}
+    return distances(circuits, trials, backend, time_budget, num_workers, **options)
+
+
+def circuit_level_x_distance(circuit: stim.Circuit, use_cache=True):
     """
     Calculate the X distance of a quantum circuit using a belief propagation decoder.
     
     This function determines the minimum weight of an X-type logical operator by:
     1. Converting the circuit to a detector error model
     2. Extracting the check matrix and observables matrix
-    3. Creating a syndrome that triggers a logical error
+    3. Creating a syndrome that triggers a random logical operator (a random combination of their rows)
     4. Using belief propagation with ordered statistics decoding to find a low-weight solution
     
     Args:
         circuit (stim.Circuit): The quantum circuit to analyze
+        use_cache (bool): Load and store the check matrices in the on-disk detector error model cache
         
     Returns:
         int: The minimum weight of an X-type logical operator found
     """
-    # Extract the detector error model from the circuit
-    dem = circuit.detector_error_model()
-    # Convert the detector error model to check matrices
-    dem_matrices = detector_error_model_to_check_matrices(dem, allow_undecomposed_hyperedges=True)
-    
-    # Get check matrix and observables matrix
-    check_matrix = dem_matrices.check_matrix.todense()  # Convert check matrix to dense
-    observables_matrix = dem_matrices.observables_matrix.todense()  # Convert observables matrix to dense
-
-    # print(f"Check matrix shape: {check_matrix.shape}")
-    # print(f"Observables matrix shape: {observables_matrix.shape}")
-
-    # Select a random logical operator to find the distance (use the structure of Bravyi et al.) A logical operator at circuit level is a linear combination of rows of the check matrix and rows of the observables matrix.
-    DXL_matrix = np.vstack((check_matrix, observables_matrix))
-    random_vector = np.random.randint(2,size=DXL_matrix.shape[0]) 
-    random_vector[-1] = 1
-    random_logical_op = (random_vector @ DXL_matrix) % 2
-    random_logical_op = np.reshape(random_logical_op,(1,DXL_matrix.shape[1]))
-
-    # Combine the check matrix with the selected observable
-    dem_matrix = np.vstack((check_matrix, random_logical_op))
-
-    # Create a syndrome that only triggers the logical observable
-    syndrome = np.zeros(dem_matrix.shape[0], dtype=int)
-    syndrome[-1] = 1  # Set the last element (corresponding to the logical observable) to 1
-
-    wminX = float('inf')  # Initialize minimum weight to infinity
-
-    # Get decoder parameters
-    bposd_params = BposdParameters()
-    my_max_iter, my_ms_scaling_factor, my_osd_method, my_bp_method, my_osd_order = bposd_params.get_params()
-
-    # Initialize the BP+OSD decoder
-    bpdX = BpOsdDecoder(
-        dem_matrix,
-        error_rate=0.002,  # Physical error rate for the decoder
-        max_iter=my_max_iter,  # Maximum number of iterations for BP
-        bp_method=my_bp_method,  # Belief propagation method
-        ms_scaling_factor=my_ms_scaling_factor,  # Min sum scaling factor
-        osd_method=my_osd_method,  # OSD method
-        osd_order=my_osd_order  # OSD search depth (commented out)
-    )
-    
-    # Decode the syndrome to find a low-weight logical operator
-    bpdX.decode(syndrome)
-    low_weight_logical = bpdX.osdw_decoding
-    
-    # Count the weight of the found logical operator
-    wt = np.count_nonzero(low_weight_logical)
-    
-    # Update minimum weight if the found operator is valid and has lower weight
-    if wt < wminX and wt > 0:
-        wminX = wt
-    
-    return wminX
-
-
-
-
+    return x_distance(circuit, use_cache=use_cache, **BPOSD_SETTINGS)
@@ -2,8 +2,11 @@ import sys
 import os
 # Add the project root directory to the Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# the result store is shared by the BB code and surface code simulations, see routing_common/results_store.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 import sinter
+from routing_common.results_store import ResultStore
 from typing import List
 from ldpc.sinter_decoders import SinterBpOsdDecoder
 from src.surface_code import SurfaceCode, transform_dictionary
@@ -41,7 +44,9 @@ if __name__ == "__main__":
     # for noise in [0.015, 0.018, 0.022, 0.025, 0.030, 0.035, 0.040] # for the normal circuit
     ]
 
-    collected_surface_code_stats: List[sinter.TaskStats] = sinter.collect(
+    # every batch is appended to the result store as it arrives, a rerun resumes from the stored batches
+    store = ResultStore(os.path.join('results', 'sc_stats_routing.sqlite'))
+    collected_surface_code_stats: List[sinter.TaskStats] = store.collect(
         num_workers=10,
         tasks=surface_code_tasks,
         # decoders=['pymatching'],
@@ -0,0 +1,6 @@
+"""
+Code shared by the BB code (BB_codes/) and surface code (Surface_codes/) simulations.
+
+The simulation scripts put their own code directory on the Python path; modules that use this
+package also add the repository root (see BB_codes/noise_model/noise_model.py).
+"""
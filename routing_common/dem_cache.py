@@ -0,0 +1,216 @@
+"""
+Persistent on-disk cache for detector error models and their check matrices.
+
+Entries are keyed by a hash of the noisy circuit text, the Stim version and the options used to
+build the detector error model, so threshold runs (sinter) and circuit-level distance runs reuse
+each other's work across processes and days. Each entry is a compressed .npz file: the text of the
+detector error model, or the CSR arrays of the check matrix and the observables matrix of
+beliefmatching.detector_error_model_to_check_matrices together with the error priors.
+
+Writers first write to a temporary file in the cache directory and then atomically rename it, so
+concurrent processes never see a partially written entry. The total size of the cache is bounded;
+when it is exceeded the least recently used entries are deleted. Reading an entry refreshes its
+modification time.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+import scipy.sparse
+import stim
+from beliefmatching import detector_error_model_to_check_matrices
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "ROUTING_DEM_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "routing_circuit", "dem"),
+)
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+# the detector error models sinter builds for a task when none is given, in order of preference
+SINTER_DEM_OPTIONS = (
+    {"decompose_errors": True, "approximate_disjoint_errors": True},
+    {"approximate_disjoint_errors": True},
+    {"approximate_disjoint_errors": True, "flatten_loops": True},
+)
+
+
+def circuit_cache_key(circuit: stim.Circuit, **options):
+    """
+    Get the cache key of a circuit and the options of its detector error model.
+
+    Args:
+        circuit (stim.Circuit): The noisy circuit
+        **options: Keyword arguments of stim.Circuit.detector_error_model
+
+    Returns:
+        str: Hex digest of the Stim version, the options and the circuit text
+    """
+    hasher = hashlib.sha256()
+    hasher.update(json.dumps([stim.__version__, sorted(options.items())]).encode())
+    hasher.update(str(circuit).encode())
+    return hasher.hexdigest()
+
+
+def _csr_arrays(prefix, matrix):
+    """
+    Get the arrays of a binary CSR matrix for np.savez.
+    """
+    matrix = scipy.sparse.csr_matrix(matrix)
+    matrix.sort_indices()
+    return {
+        f"{prefix}_shape": np.asarray(matrix.shape, dtype=np.int64),
+        f"{prefix}_indptr": matrix.indptr,
+        f"{prefix}_indices": matrix.indices,
+    }
+
+
+def _csr_from_arrays(prefix, arrays):
+    """
+    Inverse of _csr_arrays.
+    """
+    indices = arrays[f"{prefix}_indices"]
+    return scipy.sparse.csr_matrix(
+        (np.ones(len(indices), dtype=np.uint8), indices, arrays[f"{prefix}_indptr"]),
+        shape=tuple(arrays[f"{prefix}_shape"]))
+
+
+class DemCache:
+    """
+    DemCache stores detector error models and check matrices of circuits in a local directory.
+    self.cache_dir is the directory of the cache, created on first write.
+    self.max_bytes is the maximum total size of the cache entries in bytes.
+    """
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Initialize the DemCache class.
+
+        Args:
+            cache_dir (str): Cache directory (default: $ROUTING_DEM_CACHE_DIR or ~/.cache/routing_circuit/dem)
+            max_bytes (int): Maximum total size of the cache entries in bytes
+        """
+        self.cache_dir = cache_dir if cache_dir is not None else DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+
+    def _path(self, key, kind):
+        return os.path.join(self.cache_dir, f"{key}_{kind}.npz")
+
+    def load(self, key, kind):
+        """
+        Load a cache entry.
+
+        Args:
+            key (str): Circuit cache key (see circuit_cache_key)
+            kind (str): Type of the entry, "dem" or "matrices"
+
+        Returns:
+            dict or None: The stored arrays, or None if there is no valid entry
+        """
+        path = self._path(key, kind)
+        try:
+            with np.load(path) as data:
+                arrays = {name: data[name] for name in data.files}
+        except (FileNotFoundError, ValueError, OSError, EOFError):
+            return None
+        try:
+            # mark the entry as recently used
+            os.utime(path)
+        except OSError:
+            pass
+        return arrays
+
+    def store(self, key, kind, arrays):
+        """
+        Atomically write a cache entry and evict least recently used entries if needed.
+
+        Args:
+            key (str): Circuit cache key (see circuit_cache_key)
+            kind (str): Type of the entry, "dem" or "matrices"
+            arrays (dict): Arrays to store
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".tmp_", suffix=".npz")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(f, **arrays)
+            os.replace(tmp_path, self._path(key, kind))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """
+        Delete the least recently used entries until the cache fits into self.max_bytes.
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".npz") or name.startswith(".tmp_"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                # removed by a concurrent writer
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def detector_error_model(self, circuit: stim.Circuit, **options) -> stim.DetectorErrorModel:
+        """
+        Get circuit.detector_error_model(**options), from the cache if possible.
+        """
+        key = circuit_cache_key(circuit, **options)
+        arrays = self.load(key, "dem")
+        if arrays is not None:
+            return stim.DetectorErrorModel(arrays["text"].tobytes().decode())
+        dem = circuit.detector_error_model(**options)
+        self.store(key, "dem", {"text": np.frombuffer(str(dem).encode(), dtype=np.uint8)})
+        return dem
+
+    def sinter_detector_error_model(self, circuit: stim.Circuit) -> stim.DetectorErrorModel:
+        """
+        Get the detector error model sinter would build for a task of the circuit, from the cache if
+        possible. Pass it as sinter.Task(detector_error_model=...) so that the workers do not rebuild it.
+        """
+        for i, options in enumerate(SINTER_DEM_OPTIONS):
+            try:
+                return self.detector_error_model(circuit, **options)
+            except ValueError:
+                if i == len(SINTER_DEM_OPTIONS) - 1:
+                    raise
+
+    def check_matrices(self, circuit: stim.Circuit):
+        """
+        Get the check matrices of the detector error model of a circuit, from the cache if possible.
+
+        The matrices are those of beliefmatching.detector_error_model_to_check_matrices applied to
+        circuit.detector_error_model() with allow_undecomposed_hyperedges=True.
+
+        Returns:
+            tuple: (check_matrix, observables_matrix, priors), the matrices as scipy.sparse CSR
+                   matrices with one column per error mechanism, priors the error probabilities
+        """
+        key = circuit_cache_key(circuit)
+        arrays = self.load(key, "matrices")
+        if arrays is None:
+            dem = self.detector_error_model(circuit)
+            dem_matrices = detector_error_model_to_check_matrices(dem, allow_undecomposed_hyperedges=True)
+            arrays = {
+                **_csr_arrays("check", dem_matrices.check_matrix),
+                **_csr_arrays("observables", dem_matrices.observables_matrix),
+                "priors": np.asarray(dem_matrices.priors, dtype=np.float64),
+            }
+            self.store(key, "matrices", arrays)
+        return _csr_from_arrays("check", arrays), _csr_from_arrays("observables", arrays), arrays["priors"]
@@ -0,0 +1,723 @@
+"""
+Circuit-level distance search with BP+OSD on random logical operators.
+
+The search of circuit_level_x_distance (Bravyi et al.): a logical operator of the detector error
+model is a combination of rows of the check matrix H and of the observables matrix L; for a random
+combination l we decode H e = 0, l e = 1 with BP+OSD, and the weight of e is an upper bound on the
+circuit-level distance. The minimum over many random combinations is the estimate of the distance.
+
+A DistanceEngine builds the sparse rows of [H; L] once (from the detector error model cache) and
+places their CSR arrays in shared memory. A worker process attaches to these arrays on its first
+trial of the circuit and keeps the attachment, and every trial only draws the random combination, appends it as a row to
+the sparse H and decodes; the circuit, the detector error model and dense matrices never cross a
+process boundary. Every trial has its own seed, spawned from one SeedSequence, so runs are
+reproducible and the workers never share a random stream. DistanceEngine.stream processes the
+trials as they complete, keeps a histogram of the weights found and stops once the minimum has not
+improved for a number of trials or a wall-clock budget is used up.
+
+circuit_distance puts this heuristic behind a backend interface next to exact or cheaper methods:
+stim's shortest_graphlike_error, stim's truncated search_for_undetectable_logical_errors and an
+integer program on the check matrices solved with SCIP. Every backend runs within a time budget
+and returns a DistanceResult that says whether its distance is exact or an upper bound.
+distances runs a backend on a batch of circuits with one worker pool.
+
+The BB code and surface code trees call this module from src/circuit_level_distance.py with their
+own decoder settings.
+"""
+
+import os
+import time
+import itertools
+import multiprocessing
+from collections import Counter, deque
+from dataclasses import dataclass
+import numpy as np
+import scipy.sparse
+import stim
+from multiprocessing import shared_memory, resource_tracker
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from ldpc import BpOsdDecoder
+from beliefmatching import detector_error_model_to_check_matrices
+from pyscipopt import Model, quicksum
+from routing_common.dem_cache import DemCache
+
+# BP+OSD parameters in the order of BposdParameters.get_params()
+DEFAULT_DECODER_PARAMS = (15, 0, "osd0", "ms", 0)
+
+
+def check_rows(circuit: stim.Circuit, dem_cache=None, use_cache=True):
+    """
+    Get the CSR arrays of the rows of [H; L], the check matrix and the observables matrix of the
+    detector error model of a circuit.
+
+    Args:
+        circuit (stim.Circuit): The noisy circuit
+        dem_cache (DemCache): Cache of the check matrices (default: DemCache())
+        use_cache (bool): Load and store the check matrices in the cache
+
+    Returns:
+        tuple: (num_checks, num_errors, indptr, indices)
+    """
+    if use_cache:
+        check_matrix, observables_matrix, _ = (dem_cache if dem_cache is not None else DemCache()).check_matrices(circuit)
+    else:
+        dem_matrices = detector_error_model_to_check_matrices(circuit.detector_error_model(), allow_undecomposed_hyperedges=True)
+        check_matrix, observables_matrix = dem_matrices.check_matrix, dem_matrices.observables_matrix
+    rows = scipy.sparse.vstack([check_matrix, observables_matrix]).tocsr()
+    rows.sort_indices()
+    return check_matrix.shape[0], check_matrix.shape[1], rows.indptr.astype(np.int64), rows.indices.astype(np.int64)
+
+
+class _TrialRunner:
+    """
+    Runs distance trials on the rows of [H; L] of one detector error model.
+    self.indptr and self.indices are the CSR arrays of [H; L], the first self.num_checks rows are H.
+    """
+    def __init__(self, rows, error_rate, force_last_observable, decoder_params):
+        self.num_checks, self.num_errors, self.indptr, self.indices = rows
+        self.row_lengths = np.diff(self.indptr)
+        self.error_rate = error_rate
+        self.force_last_observable = force_last_observable
+        self.max_iter, self.ms_scaling_factor, self.osd_method, self.bp_method, self.osd_order = decoder_params
+        # CSR arrays of H, the random row is appended for every trial
+        self.check_indptr = self.indptr[:self.num_checks + 1].astype(np.int32)
+        self.check_indices = self.indices[:self.indptr[self.num_checks]].astype(np.int32)
+        self.syndrome = np.zeros(self.num_checks + 1, dtype=np.uint8)
+        self.syndrome[-1] = 1
+
+    def random_logical_row(self, rng):
+        """
+        Get the support of a random combination of the rows of [H; L].
+        """
+        random_vector = rng.integers(2, size=len(self.row_lengths)).astype(bool)
+        if self.force_last_observable:
+            random_vector[-1] = True
+        selected = self.indices[np.repeat(random_vector, self.row_lengths)]
+        return np.flatnonzero(np.bincount(selected, minlength=self.num_errors) & 1).astype(np.int32)
+
+    def trial(self, seed):
+        """
+        Run one trial.
+
+        Args:
+            seed (int): Seed of the random combination (None for fresh entropy)
+
+        Returns:
+            float: Weight of the logical operator found (inf if none was found)
+        """
+        row = self.random_logical_row(np.random.default_rng(seed))
+        matrix = scipy.sparse.csr_matrix(
+            (np.ones(len(self.check_indices) + len(row), dtype=np.uint8),
+             np.concatenate((self.check_indices, row)),
+             np.append(self.check_indptr, self.check_indptr[-1] + len(row))),
+            shape=(self.num_checks + 1, self.num_errors))
+        decoder = BpOsdDecoder(
+            matrix,
+            error_rate=self.error_rate,
+            max_iter=self.max_iter,
+            bp_method=self.bp_method,
+            ms_scaling_factor=self.ms_scaling_factor,
+            osd_method=self.osd_method,
+            osd_order=self.osd_order,
+        )
+        decoder.decode(self.syndrome)
+        wt = np.count_nonzero(decoder.osdw_decoding)
+        return wt if wt > 0 else float('inf')
+
+
+def x_distance(circuit: stim.Circuit, error_rate=0.01, force_last_observable=False,
+               decoder_params=DEFAULT_DECODER_PARAMS, use_cache=True, seed=None):
+    """
+    Run a single trial of the search in the calling process, see DistanceEngine for the arguments.
+
+    Returns:
+        float: Weight of the logical operator found (inf if none was found)
+    """
+    rows = check_rows(circuit, use_cache=use_cache)
+    return _TrialRunner(rows, error_rate, force_last_observable, tuple(decoder_params)).trial(seed)
+
+
+# trial runners of a worker process with the shared memory blocks they use, by the name of the first block
+_worker_runners = {}
+# number of circuits a worker process keeps attached, a pool can serve many circuits in turn
+_MAX_WORKER_RUNNERS = 32
+
+
+def _worker_runner(job):
+    """
+    Get the trial runner of a job in a worker process, attaching to its shared CSR arrays on first use.
+
+    Args:
+        job: (shared, settings), shared are tuples (shared memory name, length, dtype) of indptr and
+             indices, settings are (num_checks, num_errors, error_rate, force_last_observable, decoder_params)
+    """
+    shared, settings = job
+    key = shared[0][0]
+    if key not in _worker_runners:
+        if len(_worker_runners) >= _MAX_WORKER_RUNNERS:
+            # detach from the circuit used least recently
+            old_runner, old_blocks = _worker_runners.pop(next(iter(_worker_runners)))
+            del old_runner
+            for block in old_blocks:
+                block.close()
+        blocks = [shared_memory.SharedMemory(name=name) for name, _, _ in shared]
+        indptr, indices = [np.ndarray((length,), dtype=dtype, buffer=block.buf)
+                           for block, (_, length, dtype) in zip(blocks, shared)]
+        _worker_runners[key] = (_TrialRunner((*settings[:2], indptr, indices), *settings[2:]), blocks)
+    else:
+        _worker_runners[key] = _worker_runners.pop(key)
+    return _worker_runners[key][0]
+
+
+def _run_trials(job, seeds):
+    """
+    Helper function for multiprocessing that runs a chunk of trials in a worker process.
+    """
+    runner = _worker_runner(job)
+    return [runner.trial(int(seed)) for seed in seeds]
+
+
+@dataclass(frozen=True)
+class DistanceProgress:
+    """
+    Statistics of a streaming distance search (see DistanceEngine.stream).
+
+    Attributes:
+        trials (int): Number of completed trials
+        min_distance (float): Smallest weight found so far (inf if none was found)
+        histogram (dict): Number of trials that found each weight, by weight
+        since_improvement (int): Number of trials since the minimum last improved
+        elapsed (float): Wall-clock time in seconds
+        stopped (str): Why the search stopped ("trials", "patience" or "time_budget"), None while it runs
+    """
+    trials: int
+    min_distance: float
+    histogram: dict
+    since_improvement: int
+    elapsed: float
+    stopped: str = None
+
+
+class _Search:
+    """
+    Statistics and stopping rule of the trials of one DistanceEngine.
+    self.chunks are the chunks of trial seeds, self.stopped is the reason the search stopped.
+    """
+    def __init__(self, engine, seeds, chunk_size, patience, time_budget):
+        self.engine = engine
+        self.chunks = [chunk for chunk in np.array_split(seeds, max(1, -(-len(seeds) // chunk_size))) if len(chunk)]
+        self.num_trials = len(seeds)
+        self.patience = patience
+        self.start = time.monotonic()
+        self.deadline = None if time_budget is None else self.start + time_budget
+        self.histogram = Counter()
+        self.trials = 0
+        self.since_improvement = 0
+        self.minimum = float('inf')
+        self.stopped = "trials" if not self.chunks else None
+        self.elapsed = 0.0
+
+    def add(self, weights):
+        """
+        Add the weights found by a chunk of trials and update the stopping reason.
+        """
+        for wt in weights:
+            self.trials += 1
+            self.histogram[wt] += 1
+            if wt < self.minimum:
+                self.minimum = wt
+                self.since_improvement = 0
+            else:
+                self.since_improvement += 1
+        self.elapsed = time.monotonic() - self.start
+        if self.trials == self.num_trials:
+            self.stopped = "trials"
+        elif self.patience is not None and self.since_improvement >= self.patience:
+            self.stopped = "patience"
+        elif self.deadline is not None and time.monotonic() >= self.deadline:
+            self.stopped = "time_budget"
+
+    def progress(self):
+        return DistanceProgress(self.trials, self.minimum, dict(sorted(self.histogram.items())),
+                                self.since_improvement, self.elapsed, self.stopped)
+
+
+def _run_searches(searches, executor=None, max_pending=1):
+    """
+    Run the chunks of several searches, on one pool if executor is given, and yield
+    (search index, DistanceProgress) after every chunk, in the order the chunks complete.
+    The pool gets the chunks of the searches in turn, so that all searches advance together; at most
+    max_pending chunks are queued, and the queued chunks of a search are cancelled when it stops.
+    """
+    if executor is None:
+        for index, search in enumerate(searches):
+            runner = search.engine._local_runner()
+            for chunk in search.chunks:
+                if search.stopped:
+                    break
+                search.add([runner.trial(int(s)) for s in chunk])
+                yield index, search.progress()
+        return
+
+    queues = [iter(search.chunks) for search in searches]
+    turns = deque(index for index, search in enumerate(searches) if not search.stopped)
+    pending = {}
+
+    def submit_next():
+        while turns:
+            index = turns.popleft()
+            chunk = next(queues[index], None)
+            if chunk is None or searches[index].stopped:
+                continue
+            pending[executor.submit(_run_trials, searches[index].engine.job(), chunk)] = index
+            turns.append(index)
+            return True
+        return False
+
+    try:
+        while len(pending) < max_pending and submit_next():
+            pass
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                search = searches[index]
+                if future.cancelled() or search.stopped:
+                    continue
+                search.add(future.result())
+                yield index, search.progress()
+                if search.stopped:
+                    for other, other_index in list(pending.items()):
+                        if other_index == index and other.cancel():
+                            del pending[other]
+            while len(pending) < max_pending and submit_next():
+                pass
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+class DistanceEngine:
+    """
+    DistanceEngine estimates the circuit-level X distance of one noisy circuit (see module docstring).
+    Use it as a context manager, or call close() to stop the workers and free the shared memory.
+    """
+    def __init__(self, circuit: stim.Circuit, error_rate=0.01, force_last_observable=False,
+                 decoder_params=DEFAULT_DECODER_PARAMS, num_workers=None, dem_cache=None, executor=None, rows=None):
+        """
+        Initialize the DistanceEngine class.
+
+        Args:
+            circuit (stim.Circuit): The noisy circuit
+            error_rate (float): Physical error rate of the decoder
+            force_last_observable (bool): Always include the last observable in the random combination
+            decoder_params (tuple): (max_iter, ms_scaling_factor, osd_method, bp_method, osd_order),
+                                    e.g. BposdParameters().get_params()
+            num_workers (int): Number of worker processes (default: number of CPU cores, 1 runs in-process)
+            dem_cache (DemCache): Cache of the check matrices (default: DemCache())
+            executor (ProcessPoolExecutor): Pool shared with other engines (default: a pool of the engine,
+                                            started on first use and stopped by close)
+            rows (tuple): Result of check_rows(circuit), if already known (circuit is then not used)
+        """
+        self.rows = rows if rows is not None else check_rows(circuit, dem_cache)
+        self.num_checks, self.num_errors = self.rows[:2]
+        self.num_workers = num_workers if num_workers is not None else (os.cpu_count() or 1)
+        self._settings = (error_rate, force_last_observable, tuple(decoder_params))
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._runner = None
+        self._job = None
+        self._blocks = []
+
+    def _local_runner(self):
+        if self._runner is None:
+            self._runner = _TrialRunner(self.rows, *self._settings)
+        return self._runner
+
+    def job(self):
+        """
+        Get the job description of the worker processes, with the CSR arrays in shared memory.
+        """
+        if self._job is None:
+            shared = []
+            for array in self.rows[2:]:
+                block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+                self._blocks.append(block)
+                shared.append((block.name, len(array), array.dtype.str))
+            self._job = (tuple(shared), (self.num_checks, self.num_errors, *self._settings))
+        return self._job
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.num_workers)
+        return self._executor
+
+    def trial_seeds(self, iter_num, seed=None):
+        """
+        Get independent seeds for iter_num trials from the SeedSequence of seed (an int, a
+        SeedSequence or None for fresh entropy).
+        """
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        return seed.generate_state(iter_num, dtype=np.uint64)
+
+    def x_distances(self, iter_num, seed=None):
+        """
+        Run iter_num trials.
+
+        Args:
+            iter_num (int): Number of trials
+            seed (int): Seed of the root SeedSequence (default: fresh entropy)
+
+        Returns:
+            list: Weight found by every trial (inf where none was found)
+        """
+        seeds = self.trial_seeds(iter_num, seed)
+        if self.num_workers == 1 or iter_num <= 1:
+            runner = self._local_runner()
+            return [runner.trial(int(s)) for s in seeds]
+        # a few chunks per worker, so the pickling overhead is negligible and the load stays balanced
+        chunks = np.array_split(seeds, min(iter_num, 4 * self.num_workers))
+        return [wt for result in self._pool().map(_run_trials, itertools.repeat(self.job()), chunks) for wt in result]
+
+    def stream(self, iter_num, seed=None, patience=None, time_budget=None, chunk_size=4):
+        """
+        Run up to iter_num trials and yield the statistics after every chunk of trials, in the order
+        the chunks complete. The run stops early once the minimum has not improved for patience
+        trials or the time budget is used up; chunks that have not started then are cancelled.
+
+        Args:
+            iter_num (int): Maximum number of trials
+            seed (int): Seed of the root SeedSequence (default: fresh entropy)
+            patience (int): Stop after this many trials without improvement of the minimum (default: never)
+            time_budget (float): Wall-clock budget in seconds (default: no limit)
+            chunk_size (int): Number of trials per task of the worker pool
+
+        Yields:
+            DistanceProgress: Statistics of the trials completed so far, the last one has stopped set
+        """
+        search = _Search(self, self.trial_seeds(iter_num, seed), chunk_size, patience, time_budget)
+        # keep every worker busy with one chunk and one queued chunk
+        executor = None if self.num_workers == 1 or len(search.chunks) <= 1 else self._pool()
+        for _, progress in _run_searches([search], executor, 2 * self.num_workers):
+            yield progress
+
+    def min_x_distance(self, iter_num, seed=None, time_budget=None, patience=None):
+        """
+        Get the minimum weight found by iter_num trials (inf if none was found), see stream for the
+        early-stopping arguments.
+        """
+        if time_budget is None and patience is None:
+            distances = self.x_distances(iter_num, seed)
+            return min(distances) if distances else float('inf')
+        result = None
+        for result in self.stream(iter_num, seed, patience=patience, time_budget=time_budget):
+            pass
+        return result.min_distance if result is not None else float('inf')
+
+    def close(self):
+        """
+        Stop the worker pool (unless it is shared) and free the shared memory.
+        """
+        if self._executor is not None and self._owns_executor:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+        self._job = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+@dataclass(frozen=True)
+class DistanceResult:
+    """
+    Result of a circuit-level distance backend.
+
+    Attributes:
+        distance (float): Smallest weight of an undetectable logical error found (inf if none was found)
+        bound (str): "exact" if distance is the circuit-level distance, "upper" if it is an upper bound,
+                     "none" if the backend found nothing within its budget
+        backend (str): Name of the backend
+        elapsed (float): Wall-clock time in seconds
+        lower_bound (float): Proven lower bound on the distance, if the backend provides one
+    """
+    distance: float
+    bound: str
+    backend: str
+    elapsed: float
+    lower_bound: float = None
+
+
+def _call_with_time_budget(function, args, time_budget):
+    """
+    Call function(*args) in a child process, so that native code can be stopped at the deadline.
+
+    Returns:
+        The result of the call, or None if it did not finish within time_budget seconds
+    """
+    if time_budget is None:
+        return function(*args)
+    pool = multiprocessing.Pool(1)
+    try:
+        return pool.apply_async(function, args).get(timeout=time_budget)
+    except multiprocessing.TimeoutError:
+        return None
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _shortest_graphlike_weight(dem_text):
+    """
+    Helper function for _call_with_time_budget, weight of stim's shortest graphlike logical error.
+    """
+    try:
+        return len(stim.DetectorErrorModel(dem_text).shortest_graphlike_error(ignore_ungraphlike_errors=True))
+    except ValueError:
+        # no graphlike logical error
+        return float('inf')
+
+
+def _undetectable_logical_weight(circuit_text, max_detection_events, max_edge_degree, no_symptom_increase):
+    """
+    Helper function for _call_with_time_budget, weight of the undetectable logical error found by stim.
+    """
+    try:
+        return len(stim.Circuit(circuit_text).search_for_undetectable_logical_errors(
+            dont_explore_detection_event_sets_with_size_above=max_detection_events,
+            dont_explore_edges_with_degree_above=max_edge_degree,
+            dont_explore_edges_increasing_symptom_degree=no_symptom_increase,
+            canonicalize_circuit_errors=False,
+        ))
+    except ValueError:
+        # nothing found within the truncation
+        return float('inf')
+
+
+class BposdBackend:
+    """
+    Heuristic search of DistanceEngine, the minimum over random logical operators is an upper bound.
+    """
+    name = "bposd"
+
+    def __init__(self, trials=1000, error_rate=0.01, force_last_observable=False,
+                 decoder_params=DEFAULT_DECODER_PARAMS, num_workers=None, seed=None, patience=None):
+        """
+        Initialize the BposdBackend class, see DistanceEngine for the arguments.
+
+        Args:
+            trials (int): Maximum number of trials
+            seed (int): Seed of the random logical operators (default: fresh entropy)
+            patience (int): Stop after this many trials without improvement (default: never)
+        """
+        self.trials = trials
+        self.patience = patience
+        self.engine_kwargs = dict(error_rate=error_rate, force_last_observable=force_last_observable,
+                                  decoder_params=decoder_params, num_workers=num_workers)
+        self.seed = seed
+
+    def __call__(self, circuit: stim.Circuit, time_budget=None, dem_cache=None) -> DistanceResult:
+        start = time.monotonic()
+        with DistanceEngine(circuit, dem_cache=dem_cache, **self.engine_kwargs) as engine:
+            distance = engine.min_x_distance(self.trials, self.seed, time_budget, self.patience)
+        return DistanceResult(distance, "upper" if distance < float('inf') else "none", self.name, time.monotonic() - start)
+
+
+class GraphlikeBackend:
+    """
+    stim's shortest_graphlike_error on the undecomposed detector error model. Errors with more than
+    two detectors are ignored, so the result is exact if there are none and an upper bound otherwise.
+    """
+    name = "graphlike"
+
+    def __call__(self, circuit: stim.Circuit, time_budget=None, dem_cache=None) -> DistanceResult:
+        start = time.monotonic()
+        dem = (dem_cache if dem_cache is not None else DemCache()).detector_error_model(circuit)
+        distance = _call_with_time_budget(_shortest_graphlike_weight, (str(dem),), time_budget)
+        elapsed = time.monotonic() - start
+        if distance is None or distance == float('inf'):
+            return DistanceResult(float('inf'), "none", self.name, elapsed)
+        graphlike = all(
+            sum(t.is_relative_detector_id() for t in instruction.targets_copy()) <= 2
+            for instruction in dem.flattened() if instruction.type == "error")
+        return DistanceResult(distance, "exact" if graphlike else "upper", self.name, elapsed)
+
+
+class UndetectableSearchBackend:
+    """
+    stim's search_for_undetectable_logical_errors, truncated as configured, the result is an upper bound.
+    """
+    name = "undetectable"
+
+    def __init__(self, max_detection_events=4, max_edge_degree=4, no_symptom_increase=True):
+        """
+        Initialize the UndetectableSearchBackend class.
+
+        Args:
+            max_detection_events (int): dont_explore_detection_event_sets_with_size_above
+            max_edge_degree (int): dont_explore_edges_with_degree_above
+            no_symptom_increase (bool): dont_explore_edges_increasing_symptom_degree
+        """
+        self.options = (max_detection_events, max_edge_degree, no_symptom_increase)
+
+    def __call__(self, circuit: stim.Circuit, time_budget=None, dem_cache=None) -> DistanceResult:
+        start = time.monotonic()
+        distance = _call_with_time_budget(_undetectable_logical_weight, (str(circuit), *self.options), time_budget)
+        elapsed = time.monotonic() - start
+        if distance is None or distance == float('inf'):
+            return DistanceResult(float('inf'), "none", self.name, elapsed)
+        return DistanceResult(distance, "upper", self.name, elapsed)
+
+
+class IlpBackend:
+    """
+    Integer program on the check matrices of the detector error model, solved with SCIP:
+    minimize the number of errors e with H e = 0 and L e != 0 (mod 2).
+    The result is exact if SCIP proves optimality within the time budget, an upper bound otherwise.
+    """
+    name = "ilp"
+
+    def __call__(self, circuit: stim.Circuit, time_budget=None, dem_cache=None) -> DistanceResult:
+        start = time.monotonic()
+        check_matrix, observables_matrix, _ = (dem_cache if dem_cache is not None else DemCache()).check_matrices(circuit)
+        check_matrix, observables_matrix = check_matrix.tocsr(), observables_matrix.tocsr()
+        num_errors = check_matrix.shape[1]
+
+        model = Model("circuit_distance")
+        model.hideOutput()
+        if time_budget is not None:
+            model.setRealParam("limits/time", max(time_budget - (time.monotonic() - start), 1.0))
+        x = [model.addVar(vtype="B") for _ in range(num_errors)]
+        model.setObjective(quicksum(x))
+
+        # every detector is flipped an even number of times
+        for row in range(check_matrix.shape[0]):
+            supp = check_matrix.indices[check_matrix.indptr[row]:check_matrix.indptr[row + 1]]
+            if len(supp) == 0:
+                continue
+            slack = model.addVar(vtype="I", lb=0, ub=len(supp) // 2)
+            model.addCons(quicksum(x[j] for j in supp) == 2 * slack)
+
+        # at least one observable is flipped an odd number of times
+        flipped = []
+        for row in range(observables_matrix.shape[0]):
+            supp = observables_matrix.indices[observables_matrix.indptr[row]:observables_matrix.indptr[row + 1]]
+            if len(supp) == 0:
+                continue
+            parity = model.addVar(vtype="B")
+            slack = model.addVar(vtype="I", lb=0, ub=len(supp) // 2)
+            model.addCons(quicksum(x[j] for j in supp) == 2 * slack + parity)
+            flipped.append(parity)
+        if not flipped:
+            return DistanceResult(float('inf'), "none", self.name, time.monotonic() - start)
+        model.addCons(quicksum(flipped) >= 1)
+
+        model.optimize()
+        elapsed = time.monotonic() - start
+        lower_bound = int(np.ceil(model.getDualbound() - 1e-6))
+        if model.getNSols() == 0:
+            return DistanceResult(float('inf'), "none", self.name, elapsed, lower_bound)
+        distance = int(round(model.getObjVal()))
+        bound = "exact" if model.getStatus() == "optimal" else "upper"
+        return DistanceResult(distance, bound, self.name, elapsed, distance if bound == "exact" else lower_bound)
+
+
+DISTANCE_BACKENDS = {
+    backend.name: backend for backend in (BposdBackend, GraphlikeBackend, UndetectableSearchBackend, IlpBackend)
+}
+
+
+def circuit_distance(circuit: stim.Circuit, backend="graphlike", time_budget=None, dem_cache=None, **options) -> DistanceResult:
+    """
+    Compute or bound the circuit-level distance of a noisy circuit with one of the backends.
+
+    Args:
+        circuit (stim.Circuit): The noisy circuit
+        backend (str or backend): Name in DISTANCE_BACKENDS ("bposd", "graphlike", "undetectable", "ilp"),
+                                  or a backend instance
+        time_budget (float): Wall-clock budget in seconds (default: no limit)
+        dem_cache (DemCache): Detector error model cache (default: DemCache())
+        **options: Arguments of the backend class, if backend is a name
+
+    Returns:
+        DistanceResult: The distance and its bound type
+    """
+    if isinstance(backend, str):
+        backend = DISTANCE_BACKENDS[backend](**options)
+    elif options:
+        raise ValueError("Backend options are only accepted with a backend name")
+    return backend(circuit, time_budget=time_budget, dem_cache=dem_cache)
+
+
+def distances(circuits, trials=1000, backend="bposd", time_budget=None, num_workers=None, dem_cache=None, **options):
+    """
+    Compute or bound the circuit-level distances of many circuits on one worker pool.
+
+    With the bposd backend, the check matrices of all circuits are built in parallel and the trials of
+    all circuits are scheduled on the pool in turn, so a sweep over codes and variants keeps every core
+    busy instead of running circuit by circuit; every circuit stops on its own (trials, patience or
+    time budget). The other backends run one circuit per worker.
+
+    Args:
+        circuits (iterable): The noisy circuits
+        trials (int): Maximum number of trials per circuit of the bposd backend
+        backend (str or backend): Name in DISTANCE_BACKENDS or a backend instance, see circuit_distance
+        time_budget (float): Wall-clock budget in seconds per circuit (default: no limit)
+        num_workers (int): Number of worker processes (default: number of CPU cores)
+        dem_cache (DemCache): Detector error model cache (default: DemCache())
+        **options: Arguments of the backend class, if backend is a name
+
+    Returns:
+        list: DistanceResult of every circuit, in the order of circuits
+    """
+    circuits = list(circuits)
+    if isinstance(backend, str):
+        if backend == BposdBackend.name:
+            options = {"trials": trials, **options}
+        backend = DISTANCE_BACKENDS[backend](**options)
+    elif options:
+        raise ValueError("Backend options are only accepted with a backend name")
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    executor = None
+    if num_workers > 1 and len(circuits) > 0:
+        # the pool starts before the shared memory blocks of the engines exist: without a resource
+        # tracker of this process, every worker would start its own, which reports the blocks it
+        # attached to as leaked and fails to unlink them again at exit
+        resource_tracker.ensure_running()
+        executor = ProcessPoolExecutor(max_workers=num_workers)
+
+    try:
+        if not isinstance(backend, BposdBackend):
+            if executor is None:
+                return [backend(circuit, time_budget, dem_cache) for circuit in circuits]
+            return list(executor.map(backend, circuits, itertools.repeat(time_budget), itertools.repeat(dem_cache)))
+
+        if executor is None:
+            rows = [check_rows(circuit, dem_cache) for circuit in circuits]
+        else:
+            rows = list(executor.map(check_rows, circuits, itertools.repeat(dem_cache)))
+        engine_kwargs = {**backend.engine_kwargs, "num_workers": num_workers}
+        engines = [DistanceEngine(None, rows=r, executor=executor, **engine_kwargs) for r in rows]
+        try:
+            seeds = np.random.SeedSequence(backend.seed).spawn(len(engines))
+            searches = [_Search(engine, engine.trial_seeds(backend.trials, s), 4, backend.patience, time_budget)
+                        for engine, s in zip(engines, seeds)]
+            for _ in _run_searches(searches, executor, 2 * num_workers):
+                pass
+        finally:
+            for engine in engines:
+                engine.close()
+        return [DistanceResult(search.minimum, "upper" if search.minimum < float('inf') else "none",
+                               backend.name, search.elapsed) for search in searches]
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
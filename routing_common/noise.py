@@ -0,0 +1,216 @@
+"""
+Table-driven circuit noise models.
+
+A NoiseModel maps gate names to NoiseRules: the channels applied to the targets of the gate before
+and after it, and the strength of the DEPOLARIZE1 channel applied to all other qubits (idle noise).
+Every strength is a scale factor of the base probability p, so a circuit is compiled once into a
+NoiseTemplate, and the noisy circuit for any p (or for a whole vector of p) is obtained by writing
+the probabilities into the template.
+
+si1000 and standard_depolarizing build the two noise models of noise_model.md. The BB code and
+surface code trees use them with different bit-flip channels around resets and measurements.
+"""
+
+from dataclasses import dataclass, field
+from fractions import Fraction
+from typing import Dict, Tuple
+import numpy as np
+import stim
+
+
+@dataclass(frozen=True)
+class NoiseRule:
+    """
+    Noise of one gate.
+
+    Attributes:
+        before (tuple): (channel, scale) pairs applied to the targets of the gate before it
+        after (tuple): (channel, scale) pairs applied to the targets of the gate after it
+        idle (Fraction): Scale of the DEPOLARIZE1 channel on all qubits the gate does not act on (None for no idle noise)
+    """
+    before: Tuple[Tuple[str, Fraction], ...] = ()
+    after: Tuple[Tuple[str, Fraction], ...] = ()
+    idle: Fraction = None
+
+
+@dataclass(eq=False)
+class NoiseModel:
+    """
+    Data class representing a noise model, gates without a rule are left noiseless.
+    Noise models compare and hash by identity, so they can be used as cache keys.
+
+    Attributes:
+        name (str): Name of the noise model
+        rules (dict): NoiseRule of every gate name
+    """
+    name: str
+    rules: Dict[str, NoiseRule] = field(default_factory=dict)
+
+    def compile(self, circuit: stim.Circuit, full_qubit_set: list) -> "NoiseTemplate":
+        """
+        Compile a circuit into a NoiseTemplate (a single pass over the circuit).
+
+        Args:
+            circuit (stim.Circuit): The noiseless circuit
+            full_qubit_set (list): All qubits of the circuit (stim.GateTarget or int), used for the idle noise
+        """
+        return NoiseTemplate(self, circuit, full_qubit_set)
+
+    def apply(self, circuit: stim.Circuit, full_qubit_set: list, probability: float) -> stim.Circuit:
+        """
+        Get the noisy circuit for one base probability.
+        """
+        return self.compile(circuit, full_qubit_set).circuit(probability)
+
+    def sweep(self, circuit: stim.Circuit, full_qubit_set: list, probabilities) -> list:
+        """
+        Get the noisy circuits for a vector of base probabilities from one pass over the circuit.
+        """
+        template = self.compile(circuit, full_qubit_set)
+        return [template.circuit(p) for p in probabilities]
+
+
+def scale_probability(probability, scale):
+    """
+    Compute scale * probability, as probability * numerator / denominator for a Fraction scale,
+    so that e.g. Fraction(1, 10) gives exactly probability / 10.
+    """
+    if isinstance(scale, Fraction):
+        return float(probability) * scale.numerator / scale.denominator
+    return float(probability) * scale
+
+
+class NoiseTemplate:
+    """
+    NoiseTemplate is a noisy circuit with the base probability left open.
+    self.lines are the lines of the circuit text, self.slots are tuples (line index, prefix, scale, suffix)
+    for the lines with a noise channel, whose probability is scale * p.
+    """
+    def __init__(self, noise_model: NoiseModel, circuit: stim.Circuit, full_qubit_set: list):
+        """
+        Initialize the NoiseTemplate class.
+
+        The idle qubits of a gate are computed from a boolean mask over the qubit indices, once per
+        distinct target list, and repeat blocks are compiled once.
+
+        Args:
+            noise_model (NoiseModel): The noise model
+            circuit (stim.Circuit): The noiseless circuit
+            full_qubit_set (list): All qubits of the circuit (stim.GateTarget or int)
+        """
+        self.rules = noise_model.rules
+        self.qubits = np.array(list(dict.fromkeys(
+            q.value if isinstance(q, stim.GateTarget) else int(q) for q in full_qubit_set)), dtype=np.int64)
+        self._active = np.zeros(int(self.qubits.max()) + 1 if len(self.qubits) else 0, dtype=bool)
+        # idle qubits of every target list seen so far
+        self._idle_cache = {}
+        self.lines = []
+        self.slots = []
+        self._add_block(circuit, "")
+
+    def _idle_qubits(self, instruction, targets):
+        """
+        Get the text of the qubits of full_qubit_set that an instruction does not act on.
+        """
+        if targets not in self._idle_cache:
+            values = np.array([t.value for t in instruction.targets_copy()], dtype=np.int64)
+            self._active[:] = False
+            self._active[values[values < len(self._active)]] = True
+            self._idle_cache[targets] = " ".join(map(str, self.qubits[~self._active[self.qubits]].tolist()))
+        return self._idle_cache[targets]
+
+    def _add_slot(self, prefix, scale, suffix):
+        """
+        Add a noise channel line, filled in by circuit.
+        """
+        self.slots.append((len(self.lines), prefix, scale, suffix))
+        self.lines.append(None)
+
+    def _add_block(self, circuit: stim.Circuit, indent):
+        """
+        Add the lines of a circuit, recursively for the repeat blocks.
+        """
+        for instruction in circuit:
+            if isinstance(instruction, stim.CircuitRepeatBlock):
+                self.lines.append(f"{indent}REPEAT {instruction.repeat_count} {{")
+                self._add_block(instruction.body_copy(), indent + "    ")
+                self.lines.append(f"{indent}}}")
+                continue
+            text = str(instruction)
+            rule = self.rules.get(instruction.name)
+            if rule is None:
+                self.lines.append(indent + text)
+                continue
+            targets = text.partition(" ")[2]
+            for channel, scale in rule.before:
+                self._add_slot(f"{indent}{channel}", scale, f" {targets}")
+            self.lines.append(indent + text)
+            for channel, scale in rule.after:
+                self._add_slot(f"{indent}{channel}", scale, f" {targets}")
+            if rule.idle is not None:
+                self._add_slot(f"{indent}DEPOLARIZE1", rule.idle, f" {self._idle_qubits(instruction, targets)}")
+
+    def circuit(self, probability) -> stim.Circuit:
+        """
+        Get the noisy circuit for a base probability.
+        """
+        lines = list(self.lines)
+        for index, prefix, scale, suffix in self.slots:
+            lines[index] = f"{prefix}({scale_probability(probability, scale)!r}){suffix}"
+        return stim.Circuit("\n".join(lines))
+
+
+def si1000(z_flip="Z_ERROR", x_flip="X_ERROR", **overrides) -> NoiseModel:
+    """
+    SI1000 noise model (see noise_model.md).
+
+    Z-basis resets and measurements (R, M, MR) are followed or surrounded by z_flip, X-basis
+    ones (RX, MRX) by x_flip.
+
+    Args:
+        z_flip (str): Channel flipping the result of Z-basis resets and measurements
+        x_flip (str): Channel flipping the result of X-basis resets and measurements
+        **overrides: NoiseRules replacing the rules of the preset, by gate name
+
+    Returns:
+        NoiseModel: The noise model
+    """
+    one, two, five, tenth = Fraction(1), Fraction(2), Fraction(5), Fraction(1, 10)
+    rules = {
+        # reset errors with double probability
+        'R': NoiseRule(after=((z_flip, two),), idle=two),
+        'RX': NoiseRule(after=((x_flip, two),), idle=two),
+        # measurement errors with 5x probability before and 1x after
+        'M': NoiseRule(before=((z_flip, five),), after=((z_flip, one),), idle=two),
+        'MR': NoiseRule(before=((z_flip, five),), after=((z_flip, one),), idle=two),
+        'MRX': NoiseRule(before=((x_flip, five),), after=((x_flip, one),), idle=two),
+        # two-qubit depolarizing noise after CNOT gates, reduced idle noise
+        'CX': NoiseRule(after=(('DEPOLARIZE2', one),), idle=tenth),
+    }
+    rules.update(overrides)
+    return NoiseModel("si1000", rules)
+
+
+def standard_depolarizing(z_flip="Z_ERROR", x_flip="X_ERROR", **overrides) -> NoiseModel:
+    """
+    Standard depolarizing noise model (see noise_model.md), every channel has strength p.
+
+    Args:
+        z_flip (str): Channel flipping the result of Z-basis resets and measurements
+        x_flip (str): Channel flipping the result of X-basis resets and measurements
+        **overrides: NoiseRules replacing the rules of the preset, by gate name
+
+    Returns:
+        NoiseModel: The noise model
+    """
+    one = Fraction(1)
+    rules = {
+        'R': NoiseRule(after=((z_flip, one),), idle=one),
+        'RX': NoiseRule(after=((x_flip, one),), idle=one),
+        'M': NoiseRule(before=((z_flip, one),), after=((z_flip, one),), idle=one),
+        'MR': NoiseRule(before=((z_flip, one),), after=((z_flip, one),), idle=one),
+        'MRX': NoiseRule(before=((x_flip, one),), after=((x_flip, one),), idle=one),
+        'CX': NoiseRule(after=(('DEPOLARIZE2', one),), idle=one),
+    }
+    rules.update(overrides)
+    return NoiseModel("standard_depolarizing", rules)
@@ -0,0 +1,243 @@
+"""
+Streaming store of sinter results in an SQLite database.
+
+Every sinter.TaskStats delta reported during a collection is appended as one row and committed
+immediately, so an interrupted run loses at most the batches that were still being decoded. A
+collection resumes from the rows of its own tasks: their sums are given to sinter.iter_collect as
+existing data, so finished tasks are skipped and the others only sample the missing shots and
+errors. Rows are identified by the strong id of their task and by their decoder. The code, the noise
+strength and the number of rounds are copied from the json metadata into indexed columns, so plots
+load only the rows they need.
+
+The database uses write-ahead logging, a plot can read it while a collection writes to it.
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+from collections import Counter
+import sinter
+from routing_common.dem_cache import DemCache
+
+# the indexed columns and the json metadata keys they are read from, the first key present is used
+# (the BB code scripts use 'code' and 'r', the surface code scripts 'd' and 'r')
+DEFAULT_METADATA_COLUMNS = {
+    "code": ("code", "d"),
+    "p": ("p",),
+    "rounds": ("rounds", "r"),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS task_stats (
+    id INTEGER PRIMARY KEY,
+    strong_id TEXT NOT NULL,
+    decoder TEXT NOT NULL,
+    json_metadata TEXT NOT NULL,
+    code,
+    p REAL,
+    rounds INTEGER,
+    shots INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    discards INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    custom_counts TEXT,
+    recorded_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS task_stats_task ON task_stats (strong_id, decoder);
+CREATE INDEX IF NOT EXISTS task_stats_query ON task_stats (code, p, rounds, decoder);
+"""
+
+
+def _condition(column, value):
+    """
+    Get the SQL condition and parameters of a filter value, a list or tuple of values matches any of them.
+    """
+    if isinstance(value, (list, tuple, set)):
+        values = list(value)
+        return f"{column} IN ({', '.join('?' * len(values))})", values
+    return f"{column} = ?", [value]
+
+
+class ResultStore:
+    """
+    ResultStore appends sinter.TaskStats deltas to an SQLite database and sums them on query.
+    self.path is the database file, created with its directory on first use.
+    self.metadata_columns maps the indexed columns to the json metadata keys they are read from.
+    """
+    def __init__(self, path, metadata_columns=None):
+        """
+        Initialize the ResultStore class.
+
+        Args:
+            path (str): Path of the database file
+            metadata_columns (dict): Json metadata keys of the columns code, p and rounds (default: DEFAULT_METADATA_COLUMNS)
+        """
+        self.path = path
+        self.metadata_columns = dict(DEFAULT_METADATA_COLUMNS, **(metadata_columns or {}))
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, timeout=60)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _metadata_value(self, json_metadata, column):
+        """
+        Get the value of an indexed column from the json metadata of a task (None if no key is present).
+        """
+        if not isinstance(json_metadata, dict):
+            return None
+        for key in self.metadata_columns[column]:
+            if key in json_metadata:
+                return json_metadata[key]
+        return None
+
+    def append(self, stats):
+        """
+        Append sinter.TaskStats deltas in one transaction.
+
+        Args:
+            stats (iterable): The sinter.TaskStats, e.g. sinter.Progress.new_stats or stats read from a pickle or CSV file
+        """
+        now = time.time()
+        rows = [(
+            stat.strong_id,
+            stat.decoder,
+            json.dumps(stat.json_metadata, sort_keys=True),
+            self._metadata_value(stat.json_metadata, "code"),
+            self._metadata_value(stat.json_metadata, "p"),
+            self._metadata_value(stat.json_metadata, "rounds"),
+            stat.shots,
+            stat.errors,
+            stat.discards,
+            stat.seconds,
+            json.dumps(dict(stat.custom_counts), sort_keys=True) if stat.custom_counts else None,
+            now,
+        ) for stat in stats]
+        with self._connection:
+            self._connection.executemany(
+                "INSERT INTO task_stats (strong_id, decoder, json_metadata, code, p, rounds, shots, errors,"
+                " discards, seconds, custom_counts, recorded_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows)
+
+    def stats(self, code=None, p=None, rounds=None, decoder=None, strong_id=None, **metadata):
+        """
+        Get the summed statistics of every task matching the filters, a filter given as a list or
+        tuple matches any of its values.
+
+        Args:
+            code: Code of the tasks (json metadata 'code' or 'd')
+            p (float): Noise strength of the tasks (json metadata 'p')
+            rounds (int): Number of rounds of the tasks (json metadata 'rounds' or 'r')
+            decoder (str): Decoder
+            strong_id (str): Strong id of the task
+            **metadata: Other json metadata values the tasks must have (checked after loading)
+
+        Returns:
+            list: sinter.TaskStats per task and decoder, ready for sinter.plot_error_rate
+        """
+        conditions, parameters = [], []
+        for column, value in (("code", code), ("p", p), ("rounds", rounds), ("decoder", decoder), ("strong_id", strong_id)):
+            if value is not None:
+                condition, values = _condition(column, value)
+                conditions.append(condition)
+                parameters.extend(values)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        totals = self._connection.execute(
+            "SELECT strong_id, decoder, MIN(json_metadata), SUM(shots), SUM(errors), SUM(discards), SUM(seconds)"
+            f" FROM task_stats{where} GROUP BY strong_id, decoder", parameters).fetchall()
+        custom_counts = {}
+        for task_id, task_decoder, counts in self._connection.execute(
+                f"SELECT strong_id, decoder, custom_counts FROM task_stats{where}"
+                f"{' AND' if where else ' WHERE'} custom_counts IS NOT NULL", parameters):
+            custom_counts.setdefault((task_id, task_decoder), Counter()).update(json.loads(counts))
+
+        results = []
+        for task_id, task_decoder, json_metadata, shots, errors, discards, seconds in totals:
+            json_metadata = json.loads(json_metadata)
+            if metadata and not (isinstance(json_metadata, dict)
+                                 and all(json_metadata.get(key) == value for key, value in metadata.items())):
+                continue
+            results.append(sinter.TaskStats(
+                strong_id=task_id,
+                decoder=task_decoder,
+                json_metadata=json_metadata,
+                shots=shots,
+                errors=errors,
+                discards=discards,
+                seconds=seconds,
+                custom_counts=custom_counts.get((task_id, task_decoder), Counter()),
+            ))
+        return results
+
+    def collect(self, *, tasks, decoders=None, print_progress=False, progress_callback=None, dem_cache=None,
+                **collect_options):
+        """
+        Run sinter.iter_collect, appending every delta to the store and resuming from the stored statistics.
+
+        Drop-in replacement for sinter.collect without its CSV options (existing_data_filepaths,
+        save_resume_filepath). The tasks are expanded per decoder and given their detector error
+        model (the one sinter would build, from dem_cache) to get their strong ids, only the stored
+        statistics of these ids are resumed from and returned. A database shared by several scripts
+        thus never mixes their tasks.
+
+        Args:
+            tasks (iterable): The sinter.Task to sample
+            decoders (list): Decoders of the tasks without a decoder
+            print_progress (bool): Print the status messages of sinter to stderr
+            progress_callback (function): Called with every sinter.Progress
+            dem_cache (DemCache): Cache of the detector error models of the tasks without one (default: DemCache())
+            **collect_options: Other keyword arguments of sinter.iter_collect (num_workers, max_shots, max_errors, ...)
+
+        Returns:
+            list: sinter.TaskStats per task and decoder of the run, the stored and the new statistics
+                  (like sinter.collect with a resume file)
+        """
+        if dem_cache is None:
+            dem_cache = DemCache()
+        expanded = []
+        for task in tasks:
+            if task.detector_error_model is None:
+                dem = dem_cache.sinter_detector_error_model(task.circuit)
+            else:
+                dem = task.detector_error_model
+            for decoder in ([task.decoder] if task.decoder is not None else decoders or []):
+                expanded.append(sinter.Task(
+                    circuit=task.circuit,
+                    decoder=decoder,
+                    detector_error_model=dem,
+                    postselection_mask=task.postselection_mask,
+                    postselected_observables_mask=task.postselected_observables_mask,
+                    json_metadata=task.json_metadata,
+                    collection_options=task.collection_options,
+                    circuit_path=task.circuit_path,
+                ))
+        strong_ids = list(dict.fromkeys(task.strong_id() for task in expanded))
+
+        # queried in chunks, older SQLite versions allow at most 999 parameters per statement
+        existing = []
+        for i in range(0, len(strong_ids), 500):
+            existing.extend(self.stats(strong_id=strong_ids[i:i + 500]))
+        totals = {stat.strong_id: stat for stat in existing}
+        for progress in sinter.iter_collect(tasks=expanded, additional_existing_data=existing, **collect_options):
+            if progress.new_stats:
+                self.append(progress.new_stats)
+                for stat in progress.new_stats:
+                    totals[stat.strong_id] = totals[stat.strong_id] + stat if stat.strong_id in totals else stat
+            if progress_callback is not None:
+                progress_callback(progress)
+            if print_progress:
+                print(progress.status_message, file=sys.stderr, flush=True)
+        return list(totals.values())